@@ -0,0 +1,34 @@
+# gunicorn.conf.py
+"""
+gunicorn settings for nutria (``gunicorn nutria.wsgi`` from this directory
+picks this file up automatically).
+
+The app is preloaded in the master, where nutria.wsgi imports views and
+compiles URLs and serializers once (nutria/warmup.py) before forking, so
+workers start with that work done and share the memory copy-on-write.
+Each worker then opens its own database connections in post_worker_init,
+before it accepts its first request.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+
+def pre_fork(server, worker):
+    # Never hand a connection opened in the master to a child
+    from django.db import connections
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    from nutria.warmup import enabled, warm_up
+    if enabled():
+        timings = warm_up()
+        worker.log.info(
+            "Worker %s warmed up in %.1f ms", worker.pid, sum(timings.values()) * 1000
+        )
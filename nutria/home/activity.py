@@ -0,0 +1,120 @@
+# home/activity.py
+"""
+Aggregated activity feed: "alice and 41 others liked your post".
+
+Likes, comments, saves and follows are merged on write into one
+ActivityGroup per (recipient, verb, target, time window), so a post going
+viral updates a handful of rows instead of adding one per like. A group
+keeps the total actor count and the few most recent actors to name.
+
+Each group is read or unread. A new group, or new activity in a group the
+user has already read, adds one to the user's ActivityCounter, which is
+what unread badges read instead of a COUNT(*).
+
+Only creation counts: an unlike doesn't take anyone out of a group. An
+actor already among the named recent ones isn't counted twice, but one who
+has dropped off that list and comes back is.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Post, Comment, Like, Follow, ActivityGroup, ActivityCounter
+
+# Most recent distinct actors kept per group
+MAX_ACTORS = 3
+
+PHRASES = {
+    'like': 'liked your post',
+    'comment': 'commented on your post',
+    'save': 'saved your post',
+    'follow': 'started following you',
+}
+
+
+def window_seconds():
+    return getattr(settings, 'ACTIVITY_WINDOW_HOURS', 24) * 3600
+
+
+def window_start(when):
+    seconds = window_seconds()
+    timestamp = int(when.timestamp())
+    return datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+
+
+def _post_author(instance):
+    post = instance.post
+    # Posts built by home/mutations.py only carry their ids
+    author = post.username or Post.objects.filter(pk=post.pk).values_list('username', flat=True).first()
+    return post.post_id, author
+
+
+def event_for(instance):
+    """(verb, recipient, actor, target, preview) for a new Like/Comment/SavedPost/Follow"""
+    if isinstance(instance, Follow):
+        return 'follow', instance.following, instance.follower, '', ''
+    post_id, author = _post_author(instance)
+    if isinstance(instance, Comment):
+        return 'comment', author, instance.username, post_id, instance.text[:200]
+    verb = 'like' if isinstance(instance, Like) else 'save'
+    return verb, author, instance.username, post_id, ''
+
+
+def _bump_unread(recipient):
+    counters = ActivityCounter.objects.filter(recipient=recipient)
+    if not counters.update(unread=F('unread') + 1):
+        _, created = ActivityCounter.objects.get_or_create(recipient=recipient, defaults={'unread': 1})
+        if not created:
+            counters.update(unread=F('unread') + 1)
+
+
+def record(verb, recipient, actor, target, when, preview=''):
+    """Merge one event into its group; no-op for a user's own actions"""
+    if not recipient or not actor or actor == recipient:
+        return
+    with transaction.atomic():
+        group, created = ActivityGroup.objects.select_for_update().get_or_create(
+            recipient=recipient, verb=verb, target=target, window=window_start(when),
+            defaults={'actor_count': 1, 'actors': [actor], 'preview': preview, 'updated_at': when},
+        )
+        if created:
+            _bump_unread(recipient)
+            return
+        if actor not in group.actors:
+            group.actor_count += 1
+        group.actors = [actor] + [name for name in group.actors if name != actor][:MAX_ACTORS - 1]
+        group.preview = preview or group.preview
+        group.updated_at = max(group.updated_at, when)
+        was_unread, group.unread = group.unread, True
+        group.save(update_fields=['actor_count', 'actors', 'preview', 'updated_at', 'unread'])
+        if not was_unread:
+            _bump_unread(recipient)
+
+
+def record_instance(instance):
+    verb, recipient, actor, target, preview = event_for(instance)
+    record(verb, recipient, actor, target, instance.created_at, preview)
+
+
+def describe(group):
+    """The feed line, e.g. "alice, bob and 40 others liked your post" """
+    actors = group.actors[:2]
+    others = group.actor_count - len(actors)
+    if others > 0:
+        who = f"{', '.join(actors)} and {others} {'other' if others == 1 else 'others'}"
+    else:
+        who = ' and '.join(actors)
+    return f"{who} {PHRASES.get(group.verb, group.verb)}"
+
+
+def unread_count(recipient):
+    return ActivityCounter.objects.filter(recipient=recipient).values_list('unread', flat=True).first() or 0
+
+
+def mark_read(recipient):
+    with transaction.atomic():
+        ActivityGroup.objects.filter(recipient=recipient, unread=True).update(unread=False)
+        ActivityCounter.objects.filter(recipient=recipient).update(unread=0)
+
@@ -1,18 +1,131 @@
 # admin.py
 from django.contrib import admin
-from .models import Post, Comment
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+from .models import Post, Comment, Job
+
+# Filtered changelists stop counting here and show "10000+" pages worth
+COUNT_CAP = 10000
+
+
+def estimated_count(queryset):
+    """
+    Row count of an unfiltered table without COUNT(*): SQLite's planner
+    statistics (after ANALYZE) if present, otherwise the highest primary key.
+    """
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone():
+                cursor.execute(
+                    "SELECT stat FROM sqlite_stat1 WHERE tbl = %s AND idx IS NULL",
+                    [model._meta.db_table],
+                )
+                row = cursor.fetchone()
+                if row:
+                    return int(row[0].split()[0])
+    return model._default_manager.using(queryset.db).aggregate(n=Max('pk'))['n'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Keeps changelist pages bounded on big tables: unfiltered lists use an
+    estimated row count, filtered ones count at most COUNT_CAP rows.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return estimated_count(queryset)
+        return queryset.order_by()[:COUNT_CAP].count()
+
+
+class IndexedSearchMixin:
+    """
+    Admin search that only uses indexes: exact matches on
+    ``exact_search_fields`` and prefix matches on ``prefix_search_fields``
+    (as a range, term <= value < term + U+10FFFF, so SQLite can seek the
+    index instead of scanning with LIKE). ``text_search_table`` names an
+    FTS5 trigram table keyed by the model's pk (see migration 0026), which
+    matches terms of three or more characters anywhere in
+    ``text_search_field``.
+    """
+    exact_search_fields = ()
+    prefix_search_fields = ()
+    text_search_field = None
+    text_search_table = None
+
+    def get_search_fields(self, request):
+        # Non-empty so the changelist shows the search box
+        fields = tuple(self.exact_search_fields) + tuple(self.prefix_search_fields)
+        return fields + ((self.text_search_field,) if self.text_search_field else ())
+
+    def text_search_condition(self, queryset, term):
+        """Q matching rows whose text contains ``term``, or None if the index can't answer it"""
+        # Trigrams can't match fewer than three characters
+        if not self.text_search_table or len(term) < 3:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'sqlite':
+            return None
+        table = connection.ops.quote_name(self.text_search_table)
+        # One quoted FTS5 string, so the term is matched literally
+        phrase = '"' + term.replace('"', '""') + '"'
+        matches = RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [phrase])
+        return Q(pk__in=matches)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        condition = Q()
+        for field in self.exact_search_fields:
+            if '__' in field:
+                # Match the related row by its own index, then the FK by pk;
+                # a join inside an OR would rule out index lookups
+                relation, related_field = field.split('__', 1)
+                related_model = queryset.model._meta.get_field(relation).related_model
+                matches = related_model._default_manager.filter(**{related_field: term}).values('pk')
+                condition |= Q(**{f'{relation}__in': matches})
+            else:
+                condition |= Q(**{field: term})
+        for field in self.prefix_search_fields:
+            condition |= Q(**{f'{field}__gte': term, f'{field}__lt': term + '\U0010ffff'})
+        text_condition = self.text_search_condition(queryset, term)
+        if text_condition is not None:
+            condition |= text_condition
+        return queryset.filter(condition), False
+
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('post_id', 'username', 'email', 'created_at', 'likes')
-    search_fields = ('post_id', 'username', 'email')
+    exact_search_fields = ('post_id', 'email')
+    prefix_search_fields = ('username',)
     readonly_fields = ('post_id',)  # Since it's auto-generated
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('post_id_display', 'username', 'text_preview', 'created_at')
     list_filter = ('created_at',)
-    search_fields = ('username', 'text', 'post__post_id')
+    list_select_related = ('post',)
+    exact_search_fields = ('post__post_id',)
+    prefix_search_fields = ('username',)
+    text_search_field = 'text'
+    text_search_table = 'home_comment_fts'
+    raw_id_fields = ('post',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def post_id_display(self, obj):
         return obj.post.post_id
@@ -20,4 +133,12 @@ class CommentAdmin(admin.ModelAdmin):
 
     def text_preview(self, obj):
         return obj.text[:50] + '...' if len(obj.text) > 50 else obj.text
-    text_preview.short_description = 'Comment Preview'
\ No newline at end of file
+    text_preview.short_description = 'Comment Preview'
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'priority', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('locked_by', 'locked_at', 'lease_token', 'last_error', 'created_at', 'finished_at')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
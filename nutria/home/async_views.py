@@ -0,0 +1,182 @@
+# home/async_views.py
+"""
+Async versions of the hot read endpoints, served under /api/async/.
+
+These are plain Django coroutine views (DRF's @api_view is sync-only), so
+under the ASGI app a slow query parks a coroutine instead of a worker thread.
+All ORM access goes through the async API (aget, acount, async for); the
+serializers only ever see fully-fetched instances, so rendering issues no
+further queries. Responses have the same shape as the sync endpoints.
+"""
+import asyncio
+import functools
+import json
+
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+
+from .models import Post, Story, Like, Follow, Recipe
+from .serializers import PostSerializer, StorySerializer, RecipeSerializer
+from .realtime import get_channel_layer, post_group, feed_group
+from .nutrition import filters as nutrition_filters
+
+MAX_WATCHED_POSTS = 200
+KEEPALIVE_SECONDS = 15
+
+
+def bad_params_are_400(view):
+    """Answer a serializer ValidationError (e.g. a bad ?expand=) with 400, as @api_view does"""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        except ValidationError as exc:
+            return JsonResponse(exc.detail, status=400)
+    return wrapper
+
+
+@require_GET
+@bad_params_are_400
+async def post_list(request):
+    """
+    GET /api/async/posts/?username=<username>
+    """
+    username = request.GET.get('username')
+    selected = PostSerializer.selected_fields({'request': request})
+
+    posts = [
+        post async for post in PostSerializer.setup_queryset(Post.objects.order_by('-created_at'), selected)
+    ]
+
+    liked_post_ids = set()
+    if username and 'liked_by_user' in selected:
+        liked_post_ids = {
+            post_id async for post_id in Like.objects.filter(username=username).values_list('post_id', flat=True)
+        }
+
+    serializer = PostSerializer(
+        posts, many=True,
+        context={'request': request, 'liked_post_ids': liked_post_ids},
+    )
+    return JsonResponse(serializer.data, safe=False)
+
+
+@require_GET
+@bad_params_are_400
+async def story_list(request):
+    """
+    GET /api/async/stories/
+    """
+    stories = [
+        story async for story in Story.objects.filter(expires_at__gt=timezone.now()).order_by('-created_at')
+    ]
+    serializer = StorySerializer(stories, many=True, context={'request': request})
+    return JsonResponse(serializer.data, safe=False)
+
+
+@require_GET
+async def user_stats(request, username):
+    """
+    GET /api/async/user-stats/<username>/?current_user=<username>
+    """
+    current_user = request.GET.get('current_user')
+
+    is_following = False
+    if current_user and current_user != username:
+        is_following = await Follow.objects.filter(follower=current_user, following=username).aexists()
+
+    return JsonResponse({
+        'username': username,
+        'followers_count': await Follow.objects.filter(following=username).acount(),
+        'following_count': await Follow.objects.filter(follower=username).acount(),
+        'posts_count': await Post.objects.filter(username=username).acount(),
+        'is_following': is_following,
+        'is_own_profile': current_user == username
+    })
+
+
+@require_GET
+async def followers_list(request, username):
+    """
+    GET /api/async/followers/<username>/
+    """
+    followers = [
+        follower async for follower in Follow.objects.filter(following=username).values_list('follower', flat=True)
+    ]
+    return JsonResponse({
+        'username': username,
+        'followers': followers,
+        'count': len(followers)
+    })
+
+
+@require_GET
+@bad_params_are_400
+async def search_recipes(request):
+    """
+    GET /api/async/recipes/search/?q=<query>&max_kcal=<kcal>
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        nutrition_lookups = nutrition_filters(request.GET)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    selected = RecipeSerializer.selected_fields({'request': request})
+    recipes = RecipeSerializer.setup_queryset(Recipe.objects.all(), selected)
+    if query:
+        recipes = recipes.filter(Q(title__icontains=query) | Q(ingredients__icontains=query))
+    if nutrition_lookups:
+        recipes = recipes.filter(**nutrition_lookups)
+
+    results = [recipe async for recipe in recipes.order_by('-created_at')]
+    serializer = RecipeSerializer(results, many=True, context={'request': request})
+    return JsonResponse(serializer.data, safe=False)
+
+
+@require_GET
+async def event_stream(request):
+    """
+    Server-Sent Events stream of likes, comments and new posts.
+    GET /api/events/?username=<username>&posts=POST-abc123,POST-def456
+
+    ``username`` subscribes to new posts from the people that user follows;
+    ``posts`` subscribes to like/comment deltas on the posts on screen.
+    """
+    username = request.GET.get('username')
+    post_ids = [p for p in request.GET.get('posts', '').split(',') if p][:MAX_WATCHED_POSTS]
+
+    groups = [post_group(post_id) for post_id in post_ids]
+    if username:
+        groups.append(feed_group(username))
+    if not groups:
+        return JsonResponse(
+            {'error': 'Subscribe with username and/or posts'},
+            status=400
+        )
+
+    async def stream():
+        subscription = get_channel_layer().subscribe(groups)
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await subscription.get(timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield (
+                    f"id: {event['id']}\n"
+                    f"event: {event['type']}\n"
+                    f"data: {json.dumps(event)}\n\n"
+                )
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,90 @@
+# home/batch.py
+"""
+In-process dispatch of /api/batch/ sub-requests.
+
+Each sub-request is resolved against the /api/ routes and handed straight
+to its view, skipping the HTTP round trip and the middleware stack. DRF
+views return their ``Response.data`` unrendered; the batch response is
+rendered once at the end.
+"""
+import asyncio
+import io
+import json
+from urllib.parse import urlencode
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import Http404
+from django.urls import Resolver404, resolve
+
+API_PREFIX = '/api/'
+
+MAX_SUBREQUESTS = 20
+
+METHODS = {'GET', 'POST', 'PUT', 'DELETE'}
+
+# Request headers a sub-request inherits from the batch request
+INHERITED_META = ('REMOTE_ADDR', 'SERVER_NAME', 'SERVER_PORT', 'HTTP_HOST', 'HTTP_COOKIE',
+                  'HTTP_AUTHORIZATION', 'HTTP_USER_AGENT', 'wsgi.url_scheme')
+
+
+class SubrequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_subrequest(spec):
+    """Validate one {"method", "path", "params", "body"} entry"""
+    if not isinstance(spec, dict):
+        raise SubrequestError(400, 'Each request must be an object')
+    method = str(spec.get('method', 'GET')).upper()
+    path, _, query = str(spec.get('path', '')).partition('?')
+    if method not in METHODS:
+        raise SubrequestError(405, f'Method {method} is not allowed in a batch')
+    if not path.startswith(API_PREFIX) or path.startswith(f'{API_PREFIX}batch/'):
+        raise SubrequestError(400, f'path must be an {API_PREFIX} route other than batch')
+    try:
+        match = resolve(path)
+    except Resolver404:
+        raise SubrequestError(404, f'No route for {path}')
+    if asyncio.iscoroutinefunction(match.func):
+        raise SubrequestError(400, f'{path} is an async route; call it directly')
+    return method, path, query, match, spec.get('params') or {}, spec.get('body')
+
+
+def build_request(parent, method, path, query, params, body):
+    params = '&'.join(filter(None, [query, urlencode(params, doseq=True)]))
+    payload = json.dumps(body).encode() if body is not None else b''
+    environ = {key: parent.META[key] for key in INHERITED_META if key in parent.META}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': params,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': io.BytesIO(payload),
+    })
+    environ.setdefault('SERVER_NAME', 'localhost')
+    environ.setdefault('SERVER_PORT', '80')
+    request = WSGIRequest(environ)
+    request.batched = True
+    return request
+
+
+def dispatch(parent, spec):
+    """Run one sub-request; returns (status, body)"""
+    method, path, query, match, params, body = parse_subrequest(spec)
+    request = build_request(parent, method, path, query, params, body)
+    request.resolver_match = match
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    except Http404:
+        return 404, {'error': 'Not found'}
+    if hasattr(response, 'data'):
+        return response.status_code, response.data
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    if response.get('Content-Type', '').startswith('application/json') and content:
+        return response.status_code, json.loads(content)
+    return response.status_code, content.decode(response.charset or 'utf-8', 'replace')
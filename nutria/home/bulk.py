@@ -0,0 +1,33 @@
+# home/bulk.py
+"""
+Helpers for commands that move many rows at once (seeding, import/export).
+"""
+from contextlib import contextmanager
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Let bulk_create keep the created_at values we set instead of
+    auto_now_add overwriting them with the current time.
+    """
+    fields = [model._meta.get_field('created_at') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def batched(iterable, size):
+    """Yield lists of up to ``size`` items without materialising the input."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
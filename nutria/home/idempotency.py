@@ -0,0 +1,87 @@
+# home/idempotency.py
+"""
+Idempotency-Key support for write endpoints.
+
+A client that retries a write (flaky network, double tap) sends the same
+``Idempotency-Key`` header with each attempt. The first response is cached
+under (method, path, key) and replayed for the retries, marked with
+``Idempotent-Replayed: true``, so the write runs once. Reusing a key with a
+different body is a client bug and gets a 422; a retry that arrives while
+the first attempt is still running gets a 409.
+
+Requests without the header are handled as before. The cache is Django's
+default cache: the built-in LocMemCache is per process, so deployments
+with several workers need a shared backend (Redis, Memcached) for replays
+to work across them.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+
+MAX_KEY_LENGTH = 255
+
+# How long an in-flight request holds its key
+LOCK_SECONDS = 30
+
+
+def _ttl():
+    return getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60)
+
+
+def _fingerprint(request):
+    try:
+        body = json.dumps(request.data, sort_keys=True, default=str)
+    except TypeError:
+        body = repr(request.data)
+    return hashlib.sha256(f"{request.META.get('QUERY_STRING', '')}\n{body}".encode()).hexdigest()
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated Idempotency-Key; use under @api_view"""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        digest = hashlib.sha256(f'{request.method} {request.path} {key}'.encode()).hexdigest()
+        cache_key = f'idempotency:{digest}'
+        fingerprint = _fingerprint(request)
+
+        stored = cache.get(cache_key)
+        if stored is None:
+            if not cache.add(f'{cache_key}:lock', fingerprint, LOCK_SECONDS):
+                return Response(
+                    {'error': f'A request with this {HEADER} is still in progress'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            try:
+                response = view(request, *args, **kwargs)
+                if response.status_code < 500 and hasattr(response, 'data'):
+                    stored = {'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data}
+                    cache.set(cache_key, stored, _ttl())
+                return response
+            finally:
+                cache.delete(f'{cache_key}:lock')
+
+        if stored['fingerprint'] != fingerprint:
+            return Response(
+                {'error': f'{HEADER} was already used with a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        response = Response(stored['data'], status=stored['status'])
+        response['Idempotent-Replayed'] = 'true'
+        return response
+    return wrapper
@@ -0,0 +1,184 @@
+# home/jobs.py
+"""
+A small database-backed job queue.
+
+Declare a task with the decorator and enqueue it from request code:
+
+    @task(priority=5, max_attempts=3)
+    def make_thumbnail(name):
+        ...
+
+    make_thumbnail.enqueue('users/alice/POST-abc123/photo.jpg')
+
+``enqueue`` inserts a Job row in the caller's transaction, so the job only
+becomes visible if the request commits; ``enqueue_once`` skips the insert
+when the same call is already waiting in the queue. ``manage.py runworker`` claims jobs
+by priority with a conditional UPDATE (safe with several workers), retries
+failures with exponential backoff and gives up after ``max_attempts``.
+A job still running after its lease (the worker's --lease, or the task's
+own ``lease`` for long-running tasks) is assumed dead and requeued. Each
+claim gets a fresh lease token, and a run only records its outcome while
+the job is still held under that token, so a worker that overran its lease
+can't mark done (or failed) a job another worker has since claimed.
+Tasks live in ``<app>/tasks.py`` modules, which workers import on start;
+arguments must be JSON-serialisable. ``manage.py prune_jobs`` deletes
+finished jobs.
+"""
+import logging
+import random
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class Task:
+    def __init__(self, func, name, priority, max_attempts, backoff, lease):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+
+    def __call__(self, *args, **kwargs):
+        # Calling the task directly runs it inline
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, priority=None, delay=0, **kwargs):
+        return Job.objects.create(
+            task=self.name,
+            args=list(args),
+            kwargs=kwargs,
+            priority=self.priority if priority is None else priority,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+    def enqueue_once(self, *args, priority=None, delay=0, **kwargs):
+        """enqueue(), unless the same call is already queued; then returns that job"""
+        queued = Job.objects.filter(
+            task=self.name, status=Job.QUEUED, args=list(args), kwargs=kwargs,
+        ).first()
+        return queued or self.enqueue(*args, priority=priority, delay=delay, **kwargs)
+
+    def retry_delay(self, attempts):
+        """Exponential backoff with jitter: ~backoff, 2x, 4x ... seconds"""
+        return self.backoff * (2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+
+
+def task(func=None, *, name=None, priority=0, max_attempts=5, backoff=10, lease=None):
+    """``lease``: seconds a run may take before it is requeued (default: the worker's --lease)"""
+    def decorator(func):
+        task_name = name or f"{func.__module__}.{func.__qualname__}"
+        registered = Task(func, task_name, priority, max_attempts, backoff, lease)
+        _registry[task_name] = registered
+        return registered
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def load_tasks():
+    """Import every installed app's tasks module so tasks are registered"""
+    autodiscover_modules('tasks')
+    return dict(_registry)
+
+
+def claim_job(worker_id):
+    """Atomically take the next due job, or return None"""
+    # On the primary: a replica may still show jobs that were just claimed
+    jobs = Job.objects.using(DEFAULT_DB_ALIAS)
+    while True:
+        now = timezone.now()
+        candidate = (
+            jobs.filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('-priority', 'run_at', 'id')
+            .values_list('id', flat=True)
+            .first()
+        )
+        if candidate is None:
+            return None
+        claimed = jobs.filter(id=candidate, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker_id, locked_at=now, lease_token=uuid.uuid4(),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return jobs.get(id=candidate)
+        # Another worker won the race; try the next one
+
+
+def _finish(job, **outcome):
+    """Record ``outcome`` if ``job`` is still held under its lease; False if it isn't"""
+    held = Job.objects.using(DEFAULT_DB_ALIAS).filter(
+        id=job.id, status=Job.RUNNING, locked_by=job.locked_by, lease_token=job.lease_token,
+    )
+    if held.update(**outcome):
+        return True
+    logger.warning(
+        "Job %s (%s) lost its lease while running on %s; outcome not recorded", job.id, job.task, job.locked_by,
+    )
+    return False
+
+
+def run_job(job):
+    """Execute a claimed job and record the outcome; True if it succeeded and was recorded"""
+    registered = _registry.get(job.task)
+    try:
+        if registered is None:
+            raise LookupError(f"Unknown task '{job.task}'")
+        registered.func(*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Job %s (%s) failed on attempt %s", job.id, job.task, job.attempts)
+        if registered is not None and job.attempts < job.max_attempts:
+            _finish(
+                job,
+                status=Job.QUEUED,
+                run_at=timezone.now() + timedelta(seconds=registered.retry_delay(job.attempts)),
+                locked_by='',
+                locked_at=None,
+                lease_token=None,
+                last_error=error,
+            )
+        else:
+            _finish(job, status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+        return False
+
+    return _finish(job, status=Job.DONE, finished_at=timezone.now())
+
+
+def requeue_stale(lease_seconds):
+    """Hand jobs held by a worker that died back to the queue"""
+    now = timezone.now()
+    own = {name: registered.lease for name, registered in _registry.items() if registered.lease}
+    expired = Q(locked_at__lt=now - timedelta(seconds=lease_seconds)) & ~Q(task__in=own)
+    for name, lease in own.items():
+        expired |= Q(task=name, locked_at__lt=now - timedelta(seconds=lease))
+    stale = Job.objects.using(DEFAULT_DB_ALIAS).filter(expired, status=Job.RUNNING)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished_at=timezone.now(), last_error='Worker lease expired', lease_token=None,
+    )
+    return stale.update(status=Job.QUEUED, locked_by='', locked_at=None, lease_token=None)
+
+
+def prune_finished(before, statuses=(Job.DONE,), batch_size=5000):
+    """Delete jobs in ``statuses`` that finished before ``before``; returns the count"""
+    removed = 0
+    finished = Job.objects.filter(status__in=statuses, finished_at__lt=before)
+    while True:
+        ids = list(finished.order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += Job.objects.filter(id__in=ids).delete()[0]
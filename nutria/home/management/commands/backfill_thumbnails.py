@@ -0,0 +1,66 @@
+"""
+Queue make_thumbnail jobs for posts that have no thumbnail yet.
+
+Posts uploaded before thumbnails existed (or loaded by seed_data and
+import_data, which skip the view that enqueues them) show the full image
+in the profile grid until their thumbnail is written and
+Post.has_thumbnail is set. Posts are read in primary-key batches and only
+unflagged ones are looked at; an image whose thumbnail is already in
+storage is just flagged, so the command can be rerun. --all queues every
+image post again. Jobs go in at a lower priority than fresh uploads so a
+running worker serves those first.
+
+    python manage.py backfill_thumbnails --dry-run
+    python manage.py backfill_thumbnails --batch-size 1000
+"""
+import os
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from home.models import Post
+from home.tasks import THUMBNAIL_EXTENSIONS, make_thumbnail, thumbnail_name
+
+
+class Command(BaseCommand):
+    help = "Enqueue make_thumbnail for every image post that lacks a thumbnail"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true', help="Regenerate thumbnails that already exist")
+        parser.add_argument('--priority', type=int, default=0, help="Job priority (uploads use 5)")
+        parser.add_argument('--dry-run', action='store_true', help="Count posts without queueing jobs")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all() if options['all'] else Post.objects.filter(has_thumbnail=False)
+        last_pk, scanned, queued, flagged = 0, 0, 0, 0
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', 'media_file')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            names, ready = [], []
+            for pk, name in batch:
+                if os.path.splitext(name)[1].lower() not in THUMBNAIL_EXTENSIONS:
+                    continue
+                if not options['all'] and default_storage.exists(thumbnail_name(name)):
+                    ready.append(pk)
+                else:
+                    names.append(name)
+            if not options['dry_run']:
+                with transaction.atomic():
+                    Post.objects.filter(pk__in=ready).update(has_thumbnail=True)
+                    for name in names:
+                        make_thumbnail.enqueue(name, priority=options['priority'])
+            last_pk = batch[-1][0]
+            scanned += len(batch)
+            queued += len(names)
+            flagged += len(ready)
+
+        verb = 'would queue' if options['dry_run'] else 'queued'
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} posts, {verb} {queued} thumbnails, found {flagged} already written"
+        ))
@@ -0,0 +1,253 @@
+"""
+Endpoint benchmark suite.
+
+Exercises every route in home.urls in-process (through the full middleware
+stack) and reports p50/p95/p99 latency, throughput and SQL queries per
+request as JSON, so runs before and after a change can be diffed:
+
+    python manage.py seed_data --users 5000 --posts 20000 --seed 1
+    python manage.py benchmark_api --iterations 100 --output before.json
+
+Write routes create rows (comments, recipes, seen stories, activity) on
+every iteration, so by default the run happens on a temporary copy of each
+SQLite database, which is thrown away afterwards. --in-place runs against
+the configured databases instead (and leaves the rows behind);
+--reads-only skips the write routes.
+"""
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from home import urls as home_urls
+from home.bench import summarize
+from home.models import Post, Follow, Recipe, ChangeLog, PostTag, Story
+from nutria.metrics import RequestStats
+
+# Routes that cannot be timed as request/response
+SKIPPED = {
+    'event_stream': 'long-lived Server-Sent Events stream',
+}
+
+
+def route_specs(sample):
+    """
+    url name -> (method, url kwargs, query/body). Add an entry here when a
+    route is added to home.urls; unknown routes are reported as skipped.
+    """
+    user, other, post_id = sample['user'], sample['other'], sample['post_id']
+    return {
+        'post-list-create': ('GET', {}, {'username': user}),
+        'post-like': ('POST', {'post_id': post_id}, {'username': user}),
+        'comment-create': ('POST', {}, {'post': post_id, 'username': user, 'text': 'benchmark'}),
+        'story-list-create': ('GET', {}, {'username': other}),
+        'add_recipe': ('POST', {}, {
+            'author_email': sample['email'], 'title': 'Benchmark bowl',
+            'ingredients': '1 cup rice\n100 g spinach', 'instructions': 'Mix.',
+        }),
+        'search_recipes': ('GET', {}, {'q': sample['recipe_term']}),
+        'similar_recipes': ('GET', {'recipe_id': sample['recipe_id']}, {}),
+        'toggle_follow': ('POST', {}, {'follower': other, 'following': user}),
+        'user_stats': ('GET', {'username': user}, {'current_user': other}),
+        'followers_list': ('GET', {'username': user}, {}),
+        'following_list': ('GET', {'username': other}, {}),
+        'check_follow_status': ('GET', {}, {'follower': other, 'following': user}),
+        'toggle_save_post': ('POST', {}, {'post_id': post_id, 'username': other}),
+        'saved_posts': ('GET', {'username': other}, {}),
+        'check_saved_status': ('GET', {}, {'post_id': post_id, 'username': other}),
+        'sync_changes': ('GET', {}, {'since': sample['sync_token'], 'username': user}),
+        'trending_posts': ('GET', {}, {'limit': 20, 'username': user}),
+        'post_analytics': ('GET', {'post_id': post_id}, {'period': 'hour'}),
+        'author_analytics': ('GET', {'username': sample['author']}, {'period': 'day'}),
+        'tag_feed': ('GET', {'tag': sample['tag']}, {'username': user}),
+        'mention_feed': ('GET', {'username': user}, {}),
+        'search_users': ('GET', {}, {'q': user[:3]}),
+        'profile_posts': ('GET', {'username': sample['author']}, {'limit': 30}),
+        'batch': ('POST', {}, {'requests': [
+            {'id': 'stats', 'path': f'/api/user-stats/{user}/', 'params': {'current_user': other}},
+            {'id': 'followers', 'path': f'/api/followers/{user}/'},
+            {'id': 'following', 'path': f'/api/following/{user}/'},
+            {'id': 'follow', 'path': '/api/check-follow/', 'params': {'follower': other, 'following': user}},
+            {'id': 'saved', 'path': f'/api/saved-posts/{other}/'},
+        ]}),
+        'mark_stories_seen': ('POST', {}, {'username': other, 'story_ids': sample['story_ids']}),
+        'activity_feed': ('GET', {'username': sample['author']}, {}),
+        'activity_unread': ('GET', {'username': sample['author']}, {}),
+        'activity_mark_read': ('POST', {'username': sample['author']}, {}),
+        # Repeated DELETEs time the idempotent no-op path
+        'like_state': ('DELETE', {'post_id': post_id, 'username': other}, {}),
+        'save_state': ('DELETE', {'post_id': post_id, 'username': other}, {}),
+        'follow_state': ('DELETE', {'follower': other, 'following': user}, {}),
+        'async_post_list': ('GET', {}, {'username': user}),
+        'async_story_list': ('GET', {}, {}),
+        'async_user_stats': ('GET', {'username': user}, {'current_user': other}),
+        'async_followers_list': ('GET', {'username': user}, {}),
+        'async_search_recipes': ('GET', {}, {'q': sample['recipe_term']}),
+    }
+
+
+@contextmanager
+def scratch_databases():
+    """Point every database alias at a temporary copy for the duration"""
+    with tempfile.TemporaryDirectory(prefix='nutria-bench-') as directory:
+        originals = {}
+        try:
+            for alias in connections:
+                connection = connections[alias]
+                if connection.vendor != 'sqlite':
+                    raise CommandError(
+                        f"Can only copy SQLite databases ({alias} is {connection.vendor}); use --in-place"
+                    )
+                copy = os.path.join(directory, f'{alias}.sqlite3')
+                connection.close()
+                source, target = sqlite3.connect(connection.settings_dict['NAME']), sqlite3.connect(copy)
+                try:
+                    source.backup(target)
+                finally:
+                    source.close()
+                    target.close()
+                originals[alias] = connection.settings_dict['NAME']
+                connection.settings_dict['NAME'] = copy
+            yield
+        finally:
+            for alias, name in originals.items():
+                connections[alias].close()
+                connections[alias].settings_dict['NAME'] = name
+
+
+class Command(BaseCommand):
+    help = "Benchmark every home.urls route and print latency/throughput/query stats as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help="Timed requests per route")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed requests per route")
+        parser.add_argument('--reads-only', action='store_true', help="Skip routes that write")
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help="Run against the configured databases instead of a throwaway copy",
+        )
+        parser.add_argument('--route', action='append', help="Only run these url names")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        if options['in_place'] or options['reads_only']:
+            self.run(options)
+        else:
+            with scratch_databases():
+                self.run(options)
+
+    def run(self, options):
+        sample = self.pick_sample()
+        specs = route_specs(sample)
+        iterations = options['iterations'] + options['iterations'] % 2
+        client = Client()
+
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'iterations': iterations,
+            'sample': sample,
+            'routes': {},
+            'skipped': {},
+        }
+
+        for pattern in home_urls.urlpatterns:
+            name = pattern.name
+            if options['route'] and name not in options['route']:
+                continue
+            if name in SKIPPED or name not in specs:
+                report['skipped'][name] = SKIPPED.get(name, 'no benchmark spec')
+                continue
+            method, kwargs, params = specs[name]
+            if options['reads_only'] and method != 'GET':
+                report['skipped'][name] = 'write route (--reads-only)'
+                continue
+
+            path = reverse(name, kwargs=kwargs)
+            for _ in range(options['warmup'] + options['warmup'] % 2):
+                self.request(client, method, path, params)
+            report['routes'][name] = self.run_route(client, method, path, params, iterations)
+            self.stderr.write(
+                f"{name:<24} p50={report['routes'][name]['p50_ms']:>8} ms  "
+                f"p99={report['routes'][name]['p99_ms']:>8} ms  "
+                f"q/req={report['routes'][name]['queries_per_request']}"
+            )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output)
+        else:
+            self.stdout.write(output)
+
+    def pick_sample(self):
+        post = Post.objects.order_by('-likes').first()
+        if post is None:
+            raise CommandError("No posts to benchmark against; run seed_data first.")
+        user = (
+            Follow.objects.values_list('following', flat=True).first() or post.username
+        )
+        other = (
+            Follow.objects.filter(following=user).values_list('follower', flat=True).first()
+            or f"{user}-bench"
+        )
+        recipe = Recipe.objects.select_related('author').first()
+        latest_change = ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        return {
+            'user': user,
+            'other': other,
+            'post_id': post.post_id,
+            'author': post.username,
+            'email': recipe.author.email if recipe else post.email,
+            'recipe_term': recipe.title.split()[0] if recipe else 'rice',
+            'recipe_id': recipe.pk if recipe else 1,
+            'tag': PostTag.objects.values_list('tag', flat=True).first() or 'keto',
+            'sync_token': max(ChangeLog.horizon(), latest_change - 500),
+            'story_ids': list(
+                Story.objects.filter(expires_at__gt=timezone.now()).values_list('story_id', flat=True)[:5]
+            ) or ['STORY-none'],
+        }
+
+    def request(self, client, method, path, params):
+        if method == 'GET':
+            response = client.get(path, params)
+        elif 'author_email' in params:
+            response = client.post(path, params)  # multipart, like the app
+        else:
+            send = getattr(client, method.lower())
+            response = send(path, params, content_type='application/json')
+        if response.streaming:
+            # Streamed bodies do their work while being read
+            b''.join(response.streaming_content)
+        return response
+
+    def run_route(self, client, method, path, params, iterations):
+        latencies, queries, errors = [], 0, 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            stats = RequestStats()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                request_started = time.perf_counter()
+                response = self.request(client, method, path, params)
+                latencies.append(time.perf_counter() - request_started)
+            queries += stats.queries
+            errors += response.status_code >= 400
+        elapsed = time.perf_counter() - started
+        return summarize(
+            latencies, elapsed,
+            method=method,
+            path=path,
+            queries_per_request=round(queries / iterations, 2),
+            errors=errors,
+        )
@@ -0,0 +1,92 @@
+"""
+Compare the async read endpoints under ASGI with their sync DRF
+counterparts under WSGI.
+
+Both paths are driven in-process through Django's test handlers: the WSGI
+side from a fixed pool of threads (like a threaded gunicorn worker), the
+ASGI side as concurrent coroutines on one event loop.
+
+    python manage.py benchmark_asgi --requests 500 --concurrency 50 --threads 4
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+
+from home.bench import summarize
+from home.models import Follow
+
+# (sync path, async path) pairs; {username} is filled from the data
+ENDPOINTS = [
+    ('/api/posts/', '/api/async/posts/'),
+    ('/api/stories/', '/api/async/stories/'),
+    ('/api/user-stats/{username}/', '/api/async/user-stats/{username}/'),
+    ('/api/followers/{username}/', '/api/async/followers/{username}/'),
+    ('/api/recipes/search/?q=a', '/api/async/recipes/search/?q=a'),
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark async (ASGI) vs sync (WSGI) read endpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint and mode")
+        parser.add_argument('--concurrency', type=int, default=32, help="In-flight ASGI requests")
+        parser.add_argument('--threads', type=int, default=4, help="WSGI worker threads")
+        parser.add_argument('--username', help="User for per-user endpoints (default: most followed)")
+
+    def handle(self, *args, **options):
+        username = options['username'] or (
+            Follow.objects.values_list('following', flat=True).first() or 'nobody'
+        )
+        report = {}
+        for sync_path, async_path in ENDPOINTS:
+            sync_path = sync_path.format(username=username)
+            async_path = async_path.format(username=username)
+            report[async_path] = {
+                'wsgi': self._run_wsgi(sync_path, options['requests'], options['threads']),
+                'asgi': asyncio.run(
+                    self._run_asgi(async_path, options['requests'], options['concurrency'])
+                ),
+            }
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def _run_wsgi(self, path, total, threads):
+        def one(_):
+            started = time.perf_counter()
+            response = Client().get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - started
+        return summarize(
+            [latency for latency, _ in results], elapsed,
+            concurrency=threads,
+            errors=sum(1 for _, code in results if code >= 400),
+        )
+
+    async def _run_asgi(self, path, total, concurrency):
+        client = AsyncClient()
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with gate:
+                started = time.perf_counter()
+                response = await client.get(path)
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+        return summarize(
+            [latency for latency, _ in results], elapsed,
+            concurrency=concurrency,
+            errors=sum(1 for _, code in results if code >= 400),
+        )
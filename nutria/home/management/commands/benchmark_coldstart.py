@@ -0,0 +1,140 @@
+"""
+Cold-start benchmark: how slow is a fresh worker?
+
+Starts new Python processes the way a gunicorn worker starts (import
+nutria.wsgi, then serve), with and without the warm-up in
+nutria/warmup.py, and reports import time, warm-up time and the latency of
+the process's very first request (to a cheap route) and of the first and
+second request to each GET route in home.urls. The gap between first and
+second request is what users see right after a deploy.
+
+    python manage.py benchmark_coldstart --runs 5 --output coldstart.json
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from home import urls as home_urls
+from home.management.commands.benchmark_api import Command as BenchmarkApi, SKIPPED, route_specs
+
+# Runs in the child process; prints one JSON line
+CHILD = r'''
+import io, json, sys, time
+started = time.perf_counter()
+from nutria.wsgi import application
+imported = time.perf_counter()
+warm = sys.argv[1] == '1'
+if warm:
+    from nutria.warmup import warm_up
+    warm_up()  # what gunicorn's post_worker_init does
+ready = time.perf_counter()
+
+def call(path):
+    path, _, query = path.partition('?')
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost', 'SERVER_PORT': '8000', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http', 'wsgi.multithread': False, 'wsgi.multiprocess': True,
+        'wsgi.run_once': False, 'wsgi.version': (1, 0),
+    }
+    t = time.perf_counter()
+    response = application(environ, lambda status, headers, exc_info=None: None)
+    for _ in response:
+        pass
+    response.close()
+    return time.perf_counter() - t
+
+paths = json.loads(sys.argv[2])
+probe = paths[sys.argv[3]]
+very_first = (call(probe), call(probe))
+routes = {}
+for name, path in paths.items():
+    routes[name] = (call(path), call(path))
+print(json.dumps({
+    'import': imported - started,
+    'warm_up': ready - imported,
+    'very_first': very_first,
+    'routes': routes,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = "Measure worker import time and first-request latency, cold vs warmed up"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help="Fresh processes per mode")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        paths = self.route_paths()
+        report = {'runs': options['runs'], 'modes': {}}
+
+        for mode, warm in (('cold', False), ('warm', True)):
+            runs = [self.run_child(warm, paths) for _ in range(options['runs'])]
+            routes = {}
+            for name in paths:
+                first = [run['routes'][name][0] for run in runs]
+                second = [run['routes'][name][1] for run in runs]
+                routes[name] = {
+                    'first_ms': round(statistics.median(first) * 1000, 2),
+                    'second_ms': round(statistics.median(second) * 1000, 2),
+                }
+            report['modes'][mode] = {
+                'import_ms': round(statistics.median(run['import'] for run in runs) * 1000, 1),
+                'warm_up_ms': round(statistics.median(run['warm_up'] for run in runs) * 1000, 1),
+                'very_first_request_ms': round(statistics.median(run['very_first'][0] for run in runs) * 1000, 2),
+                'same_request_again_ms': round(statistics.median(run['very_first'][1] for run in runs) * 1000, 2),
+                'first_requests_total_ms': round(sum(r['first_ms'] for r in routes.values()), 1),
+                'second_requests_total_ms': round(sum(r['second_ms'] for r in routes.values()), 1),
+                'routes': routes,
+            }
+            summary = report['modes'][mode]
+            self.stderr.write(
+                f"{mode:<5} import={summary['import_ms']} ms  warm_up={summary['warm_up_ms']} ms  "
+                f"very first request={summary['very_first_request_ms']} ms "
+                f"(again: {summary['same_request_again_ms']} ms)  "
+                f"first per route={summary['first_requests_total_ms']} ms  "
+                f"second per route={summary['second_requests_total_ms']} ms"
+            )
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output)
+        else:
+            self.stdout.write(output)
+
+    def route_paths(self):
+        """url name -> path with query string, for every GET route"""
+        specs = route_specs(BenchmarkApi().pick_sample())
+        paths = {}
+        for pattern in home_urls.urlpatterns:
+            if pattern.name in SKIPPED or pattern.name not in specs:
+                continue
+            method, kwargs, params = specs[pattern.name]
+            if method == 'GET':
+                query = urlencode(params)
+                paths[pattern.name] = reverse(pattern.name, kwargs=kwargs) + (f'?{query}' if query else '')
+        return paths
+
+    def probe(self, paths):
+        # A cheap route for the process's very first request, so the cold
+        # overhead is not lost in the noise of a heavy endpoint
+        return 'user_stats' if 'user_stats' in paths else next(iter(paths))
+
+    def run_child(self, warm, paths):
+        env = dict(os.environ, NUTRIA_WARMUP='1' if warm else '0')
+        result = subprocess.run(
+            [sys.executable, '-c', CHILD, '1' if warm else '0', json.dumps(paths), self.probe(paths)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
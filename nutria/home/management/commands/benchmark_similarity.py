@@ -0,0 +1,131 @@
+"""
+Recipe similarity benchmark on a synthetic catalogue.
+
+Generates ``--recipes`` recipes from a fixed vocabulary (no database
+needed), then times what home/similarity.py does: vectorizing, the full
+top-K build, folding ``--added`` new recipes into the index, and serving a
+precomputed list from a scratch SQLite table laid out like RecipeSimilar.
+
+    python manage.py benchmark_similarity --recipes 100000 --added 100
+"""
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+CUISINES = ['indian', 'italian', 'mexican', 'thai', 'japanese', 'greek', 'french', 'chinese',
+            'korean', 'lebanese', 'spanish', 'american', 'ethiopian', 'vietnamese', 'turkish']
+
+INGREDIENTS = (
+    'rice chicken paneer tofu spinach tomato onion garlic ginger cumin turmeric coriander chickpea lentil '
+    'basil oregano mozzarella parmesan pasta beef pork shrimp salmon tuna avocado lime cilantro jalapeno '
+    'bean corn tortilla coconut lemongrass chili peanut noodle soy miso seaweed sesame cucumber feta olive '
+    'yogurt mint eggplant zucchini pepper mushroom potato carrot celery thyme rosemary butter cream egg '
+    'flour sugar honey almond cashew quinoa oat banana mango pineapple apple berry kale broccoli cabbage '
+    'kimchi gochujang tahini sumac harissa saffron paprika chorizo cinnamon cardamom fennel leek pea'
+).split()
+
+TITLE_WORDS = 'quick easy spicy creamy healthy vegan keto protein bowl curry salad soup stew wrap ' \
+              'grilled roasted baked fried stir smoothie tacos pasta risotto skewers'.split()
+
+UNITS = ['cup', 'g', 'tbsp', 'tsp', 'ml', 'pinch']
+
+
+def synthetic_recipes(count, seed=7):
+    rng = random.Random(seed)
+    recipes = []
+    for _ in range(count):
+        cuisine = rng.choice(CUISINES)
+        # Each cuisine favours its own slice of the vocabulary
+        offset = CUISINES.index(cuisine) * 5
+        pool = INGREDIENTS[offset:offset + 25] + rng.sample(INGREDIENTS, 10)
+        ingredients = rng.sample(pool, rng.randint(4, 10)) + ['salt', 'oil']
+        lines = '\n'.join(f"{rng.randint(1, 300)} {rng.choice(UNITS)} {name}" for name in ingredients)
+        title = ' '.join(rng.sample(TITLE_WORDS, 2) + [ingredients[0]])
+        recipes.append((title, lines, cuisine))
+    return recipes
+
+
+class Command(BaseCommand):
+    help = "Time TF-IDF vectorizing, top-K build, incremental updates and lookups for recipe similarity"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--added', type=int, default=100, help="Recipes folded in incrementally")
+        parser.add_argument('--top-k', type=int, default=10)
+        parser.add_argument('--lookups', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+            from home import similarity
+        except ImportError as exc:
+            raise CommandError(f"Recipe similarity needs numpy and scipy: {exc}")
+
+        k, count, added = options['top_k'], options['recipes'], options['added']
+        docs = synthetic_recipes(count + added)
+        report = {'recipes': count, 'added': added, 'top_k': k}
+
+        started = time.perf_counter()
+        counts = similarity.term_matrix(docs[:count])
+        report['vectorize_s'] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        weights = similarity.weigh(counts)
+        neighbours = similarity.top_k(weights, weights, k, query_rows=np.arange(count))
+        report['top_k_build_s'] = round(time.perf_counter() - started, 3)
+        report['nnz_per_recipe'] = round(counts.nnz / count, 1)
+
+        # Same cuisine is the signal the generator plants; how often is the
+        # best match from the same cuisine?
+        same = sum(docs[row][2] == docs[columns[0]][2] for row, (columns, _) in enumerate(neighbours) if len(columns))
+        report['top1_same_cuisine'] = round(same / count, 3)
+
+        index = similarity.Index(np.arange(count, dtype=np.int64), counts, similarity.document_frequency(counts))
+        started = time.perf_counter()
+        new_counts = similarity.term_matrix(docs[count:])
+        _, fresh = similarity.fold_in(index, np.arange(count, count + added, dtype=np.int64), new_counts, k)
+        report['fold_in_s'] = round(time.perf_counter() - started, 3)
+        kth = np.array([scores[-1] if len(scores) == k else 0 for _, scores in neighbours], dtype=np.float32)
+        report['existing_lists_changed'] = int((fresh.max(axis=1).toarray().ravel() > kth).sum())
+
+        report['lookup'] = self.time_lookups(neighbours, options['lookups'])
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def time_lookups(self, neighbours, lookups):
+        """Serve precomputed lists from an indexed table, like the endpoint does"""
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(os.path.join(tmp, 'bench.sqlite3'))
+            conn.execute(
+                "CREATE TABLE recipe_similar (recipe_id INTEGER, similar_id INTEGER, score REAL, "
+                "rank INTEGER, PRIMARY KEY (recipe_id, rank))"
+            )
+            conn.executemany(
+                "INSERT INTO recipe_similar VALUES (?, ?, ?, ?)",
+                (
+                    (row, int(column), float(score), rank)
+                    for row, (columns, scores) in enumerate(neighbours)
+                    for rank, (column, score) in enumerate(zip(columns, scores))
+                ),
+            )
+            conn.commit()
+            rng = random.Random(11)
+            latencies = []
+            for _ in range(lookups):
+                recipe_id = rng.randrange(len(neighbours))
+                started = time.perf_counter()
+                conn.execute(
+                    "SELECT similar_id, score FROM recipe_similar WHERE recipe_id = ? ORDER BY rank", (recipe_id,)
+                ).fetchall()
+                latencies.append(time.perf_counter() - started)
+            conn.close()
+        latencies.sort()
+        return {
+            'p50_ms': round(statistics.median(latencies) * 1000, 3),
+            'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+        }
@@ -0,0 +1,131 @@
+"""
+Multi-process SQLite write benchmark.
+
+Runs the same like-a-post transaction (read the post, insert the like,
+bump the counter) from several processes at once against a scratch database,
+first with SQLite's defaults and then with the concurrent-writer options from
+``settings.SQLITE_CONCURRENT_OPTIONS``, and reports throughput and lock errors for each.
+
+    python manage.py benchmark_sqlite_writes --processes 8 --ops 500
+"""
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+BASELINE = {
+    'timeout': 5,  # Python's sqlite3 default, which Django inherits
+    'transaction_mode': 'DEFERRED',
+    'init_command': '',
+}
+
+SCHEMA = """
+CREATE TABLE post (id INTEGER PRIMARY KEY, likes INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE post_like (
+    id INTEGER PRIMARY KEY,
+    post_id INTEGER NOT NULL REFERENCES post (id),
+    username TEXT NOT NULL,
+    UNIQUE (post_id, username)
+);
+"""
+
+
+def _connect(path, options):
+    conn = sqlite3.connect(path, timeout=options.get('timeout', 5), isolation_level=None)
+    for pragma in options.get('init_command', '').split(';'):
+        if pragma.strip():
+            conn.execute(pragma)
+    return conn
+
+
+def _worker(path, options, worker_id, ops, posts, results):
+    conn = _connect(path, options)
+    begin = f"BEGIN {options.get('transaction_mode') or 'DEFERRED'}"
+    committed = locked = 0
+    latencies = []
+    for i in range(ops):
+        post_id = (worker_id * 7919 + i) % posts + 1
+        started = time.perf_counter()
+        try:
+            conn.execute(begin)
+            conn.execute("SELECT likes FROM post WHERE id = ?", (post_id,)).fetchone()
+            conn.execute(
+                "INSERT OR IGNORE INTO post_like (post_id, username) VALUES (?, ?)",
+                (post_id, f"user{worker_id}-{i}"),
+            )
+            conn.execute("UPDATE post SET likes = likes + 1 WHERE id = ?", (post_id,))
+            conn.execute("COMMIT")
+            committed += 1
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError:
+            locked += 1
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+    conn.close()
+    results.put({'committed': committed, 'locked': locked, 'latencies': latencies})
+
+
+def run_benchmark(options, processes, ops, posts):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.sqlite3')
+        setup = _connect(path, options)
+        setup.executescript(SCHEMA)
+        setup.executemany("INSERT INTO post (id) VALUES (?)", [(i,) for i in range(1, posts + 1)])
+        setup.close()
+
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_worker, args=(path, options, n, ops, posts, results))
+            for n in range(processes)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        collected = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+    committed = sum(r['committed'] for r in collected)
+    latencies = sorted(l for r in collected for l in r['latencies'])
+    p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0.0
+    return {
+        'committed': committed,
+        'locked_errors': sum(r['locked'] for r in collected),
+        'seconds': round(elapsed, 3),
+        'commits_per_sec': round(committed / elapsed, 1) if elapsed else 0.0,
+        'p99_ms': round(p99 * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare multi-process write throughput with default vs concurrent SQLite settings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--ops', type=int, default=300, help="Transactions per process")
+        parser.add_argument('--posts', type=int, default=50)
+        parser.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    def handle(self, *args, **options):
+        concurrent = settings.SQLITE_CONCURRENT_OPTIONS
+        report = {}
+        for label, sqlite_options in (('default', BASELINE), ('concurrent', concurrent)):
+            report[label] = run_benchmark(
+                sqlite_options, options['processes'], options['ops'], options['posts']
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for label, result in report.items():
+            self.stdout.write(
+                f"{label:>10}: {result['commits_per_sec']:>8} commits/s  "
+                f"committed={result['committed']}  locked={result['locked_errors']}  "
+                f"p99={result['p99_ms']} ms"
+            )
@@ -0,0 +1,56 @@
+"""
+Compact the delta-sync change log.
+
+1. Drops entries superseded by a later entry for the same entity (sync only
+   ever returns the latest state, so this never changes a sync result).
+2. Drops everything older than --keep-days and records the highest removed
+   id as the new horizon; clients with an older token get ``reset: true``
+   and refetch in full.
+
+    python manage.py compact_changelog --keep-days 30
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from home.models import ChangeLog, ChangeLogCompaction
+
+
+class Command(BaseCommand):
+    help = "Remove superseded and expired change log entries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=30)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        superseded = self.drop_superseded(options['batch_size'])
+
+        cutoff = timezone.now() - timedelta(days=options['keep_days'])
+        expired = ChangeLog.objects.filter(created_at__lt=cutoff)
+        through = expired.aggregate(through=Max('id'))['through']
+        removed = 0
+        if through is not None:
+            with transaction.atomic():
+                removed, _ = ChangeLog.objects.filter(id__lte=through).delete()
+                ChangeLogCompaction.objects.create(compacted_through=through, removed=removed)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Removed {superseded} superseded and {removed} expired entries; "
+            f"horizon is now #{ChangeLog.horizon()}"
+        ))
+
+    def drop_superseded(self, batch_size):
+        # Latest id per entity; anything else for that entity is redundant
+        latest = ChangeLog.objects.values('entity', 'entity_key').annotate(latest=Max('id')).values('latest')
+        total = 0
+        while True:
+            ids = list(
+                ChangeLog.objects.exclude(id__in=latest).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return total
+            total += ChangeLog.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,49 @@
+"""
+Work out calories and macros for recipes from their ingredients.
+
+Needed once for existing recipes, after bulk loads (seed_data,
+import_data) that bypass the signal handlers, and after editing
+home/data/nutrients.csv or bumping nutrition.COMPUTE_VERSION. Only recipes whose ingredients or the table
+changed since their last computation are recomputed, one matrix product
+per batch.
+
+    python manage.py compute_nutrition --batch-size 2000
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from home import nutrition
+from home.bulk import batched
+from home.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Compute per-recipe nutrition totals from the bundled nutrient table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--force', action='store_true', help="Recompute every recipe")
+
+    def handle(self, *args, **options):
+        if nutrition.np is None:
+            raise CommandError("Nutrition needs numpy")
+        size = options['batch_size']
+        started = time.perf_counter()
+        seen = updated = 0
+        recipes = Recipe.objects.order_by('pk').only('pk', 'ingredients', 'nutrition_key')
+        for batch in batched(recipes.iterator(chunk_size=size), size):
+            if options['force']:
+                for recipe in batch:
+                    recipe.nutrition_key = ''
+            stale = nutrition.apply(batch)
+            if stale:
+                # One executemany; bulk_update's CASE expressions cost more than the maths
+                with transaction.atomic():
+                    nutrition.store(stale)
+            seen += len(batch)
+            updated += len(stale)
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {updated} of {seen} recipes in {time.perf_counter() - started:.2f}s"
+        ))
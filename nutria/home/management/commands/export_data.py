@@ -0,0 +1,47 @@
+"""
+Stream posts, comments, likes, follows, saved posts and recipes to JSONL.
+
+Rows are read with QuerySet.iterator(chunk_size=...) and written one line
+at a time, so memory use does not depend on the size of the database.
+
+    python manage.py export_data --output dump.jsonl
+    python manage.py export_data --models post comment > posts.jsonl
+"""
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.transfer import EXPORT_FIELDS, MODEL_ORDER, to_record
+
+
+class Command(BaseCommand):
+    help = "Export social data as streaming JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="File to write (default: stdout)")
+        parser.add_argument('--models', nargs='+', choices=MODEL_ORDER, default=MODEL_ORDER)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        out = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        started = time.perf_counter()
+        try:
+            for name in MODEL_ORDER:
+                if name not in options['models']:
+                    continue
+                model, fields = EXPORT_FIELDS[name]
+                rows = model.objects.order_by('pk').values(*fields).iterator(
+                    chunk_size=options['chunk_size']
+                )
+                count = 0
+                for row in rows:
+                    out.write(json.dumps(to_record(name, row), ensure_ascii=False))
+                    out.write('\n')
+                    count += 1
+                self.stderr.write(f"  {name}: {count}")
+        finally:
+            if out is not sys.stdout:
+                out.close()
+        self.stderr.write(self.style.SUCCESS(f"Exported in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,164 @@
+"""
+Delete media files that no row refers to.
+
+Deleted posts, stories and recipes (before delete_media_files existed, or
+when the worker was down) and failed add_recipe saves leave files under
+MEDIA_ROOT forever. This walks users/, recipe_photos/ and thumbs/ with
+os.scandir, checks each batch of paths against Post.media_file,
+Story.media_file and Recipe.image with indexed IN lookups, and deletes (or,
+with --dry-run, lists) files nobody references. A thumbnail is kept while
+tasks.thumbnail_name() of some referenced image maps to it; sources are
+found by stem, so photo.JPG keeps thumbs/.../photo.jpg. Memory stays
+bounded by --batch-size however many files there are.
+
+Files younger than --min-age-hours are never touched: an upload is written
+to disk before its row is committed.
+
+    python manage.py gc_media --dry-run -v 2
+    python manage.py gc_media --min-age-hours 48
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from home.bulk import batched
+from home.models import Post, Story, Recipe
+from home.tasks import THUMBNAIL_EXTENSIONS, thumbnail_name
+
+MEDIA_DIRS = ('users', 'recipe_photos', 'thumbs')
+
+# (model, file field) pairs whose values are paths relative to MEDIA_ROOT
+REFERENCES = ((Post, 'media_file'), (Story, 'media_file'), (Recipe, 'image'))
+
+THUMBS_PREFIX = 'thumbs/'
+
+# Stems per range query: SQLite caps expression trees at depth 1000
+STEMS_PER_QUERY = 200
+
+
+def walk_files(root, top):
+    """Yield os.DirEntry for every file under ``root/top``, depth first"""
+    stack = [os.path.join(root, top)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except FileNotFoundError:
+            continue
+
+
+def referenced_thumbnails(thumbs):
+    """
+    The subset of ``thumbs`` (thumbs/... names) that thumbnail_name() of a
+    referenced image produces. Sources are looked up by stem with a range
+    per thumbnail, since their extension may be in any case.
+    """
+    stems = sorted({os.path.splitext(name[len(THUMBS_PREFIX):])[0] for name in thumbs})
+    found = set()
+    for chunk in batched(stems, STEMS_PER_QUERY):
+        for model, field in REFERENCES:
+            ranges = Q(
+                *(Q(**{f'{field}__gte': f'{stem}.', f'{field}__lt': f'{stem}.\U0010ffff'}) for stem in chunk),
+                _connector=Q.OR,
+            )
+            for source in model.objects.filter(ranges).values_list(field, flat=True):
+                if os.path.splitext(source)[1].lower() in THUMBNAIL_EXTENSIONS:
+                    found.add(thumbnail_name(source))
+    return found.intersection(thumbs)
+
+
+def referenced(names):
+    """The subset of ``names`` stored in any media column"""
+    found = set()
+    for model, field in REFERENCES:
+        found.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    return found
+
+
+class Command(BaseCommand):
+    help = "Find and delete media files not referenced by any Post, Story or Recipe"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report orphans without deleting")
+        parser.add_argument(
+            '--min-age-hours', type=float, default=24,
+            help="Leave files modified more recently than this alone",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Paths per database lookup")
+        parser.add_argument(
+            '--dir', action='append', choices=MEDIA_DIRS,
+            help="Only scan these directories under MEDIA_ROOT (default: all)",
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, FileSystemStorage):
+            raise CommandError("gc_media only works with local file system storage")
+        root = os.path.abspath(settings.MEDIA_ROOT)
+        cutoff = time.time() - options['min_age_hours'] * 3600
+        dry_run = options['dry_run']
+
+        stats = dict.fromkeys(('scanned', 'scanned_bytes', 'too_new', 'orphans', 'orphan_bytes', 'deleted'), 0)
+        started = time.perf_counter()
+
+        for top in options['dir'] or MEDIA_DIRS:
+            for batch in batched(walk_files(root, top), options['batch_size']):
+                files = {}
+                for entry in batch:
+                    info = entry.stat(follow_symlinks=False)
+                    stats['scanned'] += 1
+                    stats['scanned_bytes'] += info.st_size
+                    if info.st_mtime > cutoff:
+                        stats['too_new'] += 1
+                        continue
+                    name = os.path.relpath(entry.path, root).replace(os.sep, '/')
+                    files[name] = (entry.path, info.st_size)
+
+                for name in self.orphans(files):
+                    path, size = files[name]
+                    stats['orphans'] += 1
+                    stats['orphan_bytes'] += size
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(f"{'would delete' if dry_run else 'delete'} {name} ({size} bytes)")
+                    if not dry_run:
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            continue
+                        stats['deleted'] += 1
+                        self.prune_empty_dirs(os.path.dirname(path), root)
+
+        elapsed = time.perf_counter() - started
+        outcome = 'none deleted (dry run)' if dry_run else f"{stats['deleted']} deleted"
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {stats['scanned']} files ({stats['scanned_bytes'] / 1e6:.1f} MB) in {elapsed:.1f}s "
+            f"({stats['scanned'] / elapsed if elapsed else 0:.0f} files/s); "
+            f"{stats['orphans']} orphans ({stats['orphan_bytes'] / 1e6:.1f} MB), "
+            f"{outcome}, "
+            f"{stats['too_new']} skipped as newer than {options['min_age_hours']}h"
+        ))
+
+    def orphans(self, files):
+        """Names in ``files`` that no row references"""
+        thumbs = [name for name in files if name.startswith(THUMBS_PREFIX)]
+        others = [name for name in files if not name.startswith(THUMBS_PREFIX)]
+        found = referenced(others) if others else set()
+        if thumbs:
+            found |= referenced_thumbnails(thumbs)
+        return [name for name in files if name not in found]
+
+    def prune_empty_dirs(self, directory, root):
+        # users/<user>/<POST-id>/ folders empty out once their file is gone
+        while directory != root and os.path.dirname(directory) != root:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
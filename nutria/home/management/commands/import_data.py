@@ -0,0 +1,96 @@
+"""
+Load a JSONL dump written by export_data.
+
+Lines are read one at a time and inserted with bulk_create in batches, each
+batch in its own transaction. After every committed batch the line number
+is written to a checkpoint file next to the input; rerunning with --resume
+skips everything up to it, so an interrupted import continues where it
+stopped. Rows whose natural key (home.transfer.NATURAL_KEYS) is already in
+the database are left out, so replaying a batch after a crash between its
+commit and the checkpoint, or rerunning the whole import, adds nothing
+twice.
+
+    python manage.py import_data dump.jsonl
+    python manage.py import_data dump.jsonl --resume
+"""
+import json
+import os
+import time
+from itertools import groupby
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from home.bulk import batched, explicit_timestamps
+from home.transfer import EXPORT_FIELDS, build_objects, drop_existing
+
+
+class Command(BaseCommand):
+    help = "Import social data from streaming JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--resume', action='store_true', help="Continue from the last checkpoint")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <path>.checkpoint)")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        checkpoint = options['checkpoint'] or f"{path}.checkpoint"
+        start_line = self.read_checkpoint(checkpoint) if options['resume'] else 0
+        if start_line:
+            self.stdout.write(f"Resuming after line {start_line}")
+
+        started = time.perf_counter()
+        totals = {}
+        skipped = present = 0
+        models = [model for model, _ in EXPORT_FIELDS.values()]
+
+        with open(path, encoding='utf-8') as fh, explicit_timestamps(*models):
+            lines = (
+                (number, json.loads(line))
+                for number, line in enumerate(fh, start=1)
+                if number > start_line and line.strip()
+            )
+            # Consecutive lines for the same model form runs; batch within runs
+            for name, run in groupby(lines, key=lambda item: item[1]['model']):
+                if name not in EXPORT_FIELDS:
+                    raise CommandError(f"Unknown model '{name}' in {path}")
+                model, _ = EXPORT_FIELDS[name]
+                for batch in batched(run, options['batch_size']):
+                    records = [record['fields'] for _, record in batch]
+                    with transaction.atomic():
+                        objects, missing = build_objects(name, records)
+                        objects, duplicates = drop_existing(name, objects)
+                        model.objects.bulk_create(objects, ignore_conflicts=True)
+                    self.write_checkpoint(checkpoint, batch[-1][0])
+                    totals[name] = totals.get(name, 0) + len(objects)
+                    skipped += missing
+                    present += duplicates
+
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        for name, count in totals.items():
+            self.stdout.write(f"  {name}: {count}")
+        if present:
+            self.stdout.write(f"  already present: {present}")
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f"  skipped {skipped} records whose post or author is missing"
+            ))
+        self.stdout.write(self.style.SUCCESS(f"Imported in {time.perf_counter() - started:.1f}s"))
+
+    def read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint) as fh:
+                return int(fh.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, checkpoint, line_number):
+        tmp = f"{checkpoint}.tmp"
+        with open(tmp, 'w') as fh:
+            fh.write(str(line_number))
+        os.replace(tmp, checkpoint)
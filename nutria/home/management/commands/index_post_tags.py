@@ -0,0 +1,53 @@
+"""
+Backfill the hashtag and mention tables from existing captions.
+
+Needed once for posts created before tag indexing existed, and after bulk
+loads (seed_data, import_data) that bypass the signal handlers. Posts are
+read in primary-key batches; rows that already exist are left alone, so the
+command can be interrupted and rerun.
+
+    python manage.py index_post_tags --batch-size 2000
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from home.models import Post, PostTag, PostMention
+from home.tags import tag_rows, mention_rows
+
+
+class Command(BaseCommand):
+    help = "Extract hashtags and @mentions from every post caption"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Delete all tag and mention rows first (e.g. after changing the parser)",
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            PostTag.objects.all().delete()
+            PostMention.objects.all().delete()
+
+        last_pk, posts, tags, mentions = 0, 0, 0, 0
+        while True:
+            batch = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk')
+                .only('pk', 'caption', 'created_at')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            new_tags = [row for post in batch for row in tag_rows(post)]
+            new_mentions = [row for post in batch for row in mention_rows(post)]
+            with transaction.atomic():
+                PostTag.objects.bulk_create(new_tags, ignore_conflicts=True)
+                PostMention.objects.bulk_create(new_mentions, ignore_conflicts=True)
+            last_pk = batch[-1].pk
+            posts += len(batch)
+            tags += len(new_tags)
+            mentions += len(new_mentions)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {posts} posts: {tags} hashtags, {mentions} mentions"
+        ))
@@ -0,0 +1,86 @@
+"""
+Build the user search index from GoogleUsers and post authors.
+
+Needed once for existing accounts, and after bulk loads (seed_data,
+import_data) that bypass the signal handlers. Accounts are written in
+batches; existing rows and tokens are kept, so the command can be rerun.
+Follower counts (and their copies on the tokens) are recomputed at the
+end.
+
+    python manage.py index_users --batch-size 5000
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+
+from authentication.models import GoogleUser
+from home.bulk import batched
+from home.models import Post, Follow, UserIndex, UserSearchToken
+from home.usersearch import user_tokens
+
+
+class Command(BaseCommand):
+    help = "Index usernames, names and emails for /api/users/search/"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Delete the index first (e.g. after changing the tokenizer)",
+        )
+
+    def handle(self, *args, **options):
+        size = options['batch_size']
+        if options['rebuild']:
+            UserSearchToken.objects.all().delete()
+            UserIndex.objects.all().delete()
+
+        accounts = GoogleUser.objects.order_by('pk').values_list('name', 'email', 'photo_url')
+        indexed = self.index(
+            (UserIndex(username=name, name=name, email=email, photo_url=photo_url)
+             for name, email, photo_url in accounts.iterator(chunk_size=size)),
+            size,
+        )
+        # Authors who post under a username with no GoogleUser behind it
+        authors = (
+            Post.objects.exclude(username__in=UserIndex.objects.values('username'))
+            .values_list('username').annotate(email=Max('email')).order_by('username')
+        )
+        indexed += self.index(
+            (UserIndex(username=username, email=email)
+             for username, email in authors.iterator(chunk_size=size)),
+            size,
+        )
+
+        counts = Follow.objects.values_list('following').annotate(n=Count('id')).order_by()
+        for batch in batched(counts.iterator(chunk_size=size), size):
+            users = UserIndex.objects.in_bulk([username for username, _ in batch], field_name='username')
+            for username, n in batch:
+                if username in users:
+                    users[username].followers = n
+            with transaction.atomic():
+                UserIndex.objects.bulk_update(users.values(), ['followers'])
+                UserSearchToken.objects.filter(user__in=users.values()).update(
+                    followers=Subquery(UserIndex.objects.filter(pk=OuterRef('user')).values('followers')[:1])
+                )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} accounts ({UserSearchToken.objects.count()} tokens)"
+        ))
+
+    def index(self, entries, size):
+        total = 0
+        for batch in batched(entries, size):
+            with transaction.atomic():
+                UserIndex.objects.bulk_create(batch, ignore_conflicts=True)
+                users = UserIndex.objects.in_bulk([entry.username for entry in batch], field_name='username')
+                UserSearchToken.objects.bulk_create(
+                    [
+                        UserSearchToken(user=user, token=token, weight=weight, followers=user.followers)
+                        for user in users.values()
+                        for token, weight in user_tokens(user.username, user.name, user.email).items()
+                    ],
+                    ignore_conflicts=True,
+                )
+            total += len(batch)
+        return total
@@ -0,0 +1,36 @@
+"""
+Delete finished background jobs.
+
+Every thumbnail, media delete and similarity update leaves a Job row
+behind; without pruning the table and its indexes grow forever. Done jobs
+are kept for --keep-days, failed ones (which hold the traceback) for
+--keep-failed-days. Run it from cron, e.g. daily:
+
+    python manage.py prune_jobs --keep-days 7 --keep-failed-days 30
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from home.jobs import prune_finished
+from home.models import Job
+
+
+class Command(BaseCommand):
+    help = "Remove old done and failed jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=7)
+        parser.add_argument('--keep-failed-days', type=int, default=30)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        done = prune_finished(
+            now - timedelta(days=options['keep_days']), (Job.DONE,), options['batch_size'],
+        )
+        failed = prune_finished(
+            now - timedelta(days=options['keep_failed_days']), (Job.FAILED,), options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Removed {done} done and {failed} failed jobs"))
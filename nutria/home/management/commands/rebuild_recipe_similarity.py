@@ -0,0 +1,32 @@
+"""
+Recompute every recipe's similar-recipe list from scratch.
+
+Needed once after enabling recommendations on existing data, after bulk
+loads (seed_data, import_data) that bypass the signal handlers, and now and
+then to pick up edited recipes and refresh the IDF weights that
+incremental updates let drift. ``--incremental`` only folds in recipes
+added since the last run, like the background task does.
+
+    python manage.py rebuild_recipe_similarity --top-k 10
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed similar recipes (TF-IDF nearest neighbours)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None, help="Neighbours kept per recipe")
+        parser.add_argument('--incremental', action='store_true', help="Only add recipes new since the last run")
+
+    def handle(self, *args, **options):
+        try:
+            from home import similarity
+        except ImportError as exc:
+            raise CommandError(f"Recipe similarity needs numpy and scipy: {exc}")
+
+        k = options['top_k'] or similarity.TOP_K
+        stats = similarity.update(k) if options['incremental'] else similarity.rebuild(k)
+        self.stdout.write(self.style.SUCCESS(
+            ', '.join(f'{key}={value}' for key, value in stats.items())
+        ))
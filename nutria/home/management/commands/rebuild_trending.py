@@ -0,0 +1,55 @@
+"""
+Rebuild the trending index from scratch.
+
+Needed once after enabling trending on existing data, or after bulk loads
+(seed_data, import_data) that bypass the signal handlers. Events are
+streamed per table and folded into per-post scores in memory, then written
+in batches.
+
+    python manage.py rebuild_trending --days 30
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from home.bulk import batched
+from home.models import Post, Like, Comment, SavedPost, TrendingScore
+from home.trending import event_score, log_add
+
+
+class Command(BaseCommand):
+    help = "Recompute trending scores from posts, likes, comments and saves"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help="Only index posts created in the last N days (older ones have decayed away)",
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days'])
+        chunk = options['batch_size']
+        scores = {}
+
+        def add(post_pk, kind, when):
+            x = event_score(kind, when)
+            scores[post_pk] = log_add(scores[post_pk], x) if post_pk in scores else x
+
+        posts = Post.objects.filter(created_at__gte=since)
+        for pk, created_at in posts.values_list('pk', 'created_at').iterator(chunk_size=chunk):
+            add(pk, 'post', created_at)
+        for model, kind in ((Like, 'like'), (Comment, 'comment'), (SavedPost, 'save')):
+            rows = model.objects.filter(post__created_at__gte=since).values_list('post_id', 'created_at')
+            for post_pk, created_at in rows.iterator(chunk_size=chunk):
+                add(post_pk, kind, created_at)
+
+        with transaction.atomic():
+            TrendingScore.objects.all().delete()
+            for batch in batched(scores.items(), chunk):
+                TrendingScore.objects.bulk_create(
+                    [TrendingScore(post_id=pk, score=score) for pk, score in batch]
+                )
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(scores)} posts"))
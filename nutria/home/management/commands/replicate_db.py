@@ -0,0 +1,55 @@
+"""
+Replication stand-in for local development.
+
+Copies the primary SQLite database onto every replica alias with SQLite's
+online backup API, either once or every ``--interval`` seconds, so the
+read/write router can be exercised with two SQLite files.
+"""
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from nutria.db_router import PRIMARY_DB, get_replicas
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database onto the configured replicas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help="Repeat every N seconds (simulates replication lag). 0 = run once.",
+        )
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError(
+                "No replicas configured. Set NUTRIA_DB_REPLICAS to one or more SQLite paths."
+            )
+        for alias in [PRIMARY_DB, *replicas]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"'{alias}' is not a SQLite database")
+
+        while True:
+            started = time.perf_counter()
+            for alias in replicas:
+                self._copy(settings.DATABASES[PRIMARY_DB]['NAME'], settings.DATABASES[alias]['NAME'])
+            self.stdout.write(
+                f"Replicated to {', '.join(replicas)} in {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def _copy(self, source_path, target_path):
+        source = sqlite3.connect(str(source_path))
+        target = sqlite3.connect(str(target_path))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
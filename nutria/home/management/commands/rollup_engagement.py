@@ -0,0 +1,36 @@
+"""
+Fold new likes, comments and saves into the hourly/daily analytics rollups.
+
+Safe to run as often as you like (cron, or --interval to keep it running);
+each run only reads rows past the stored high-water marks.
+
+    python manage.py rollup_engagement --interval 60
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from home.rollups import run_rollups
+
+
+class Command(BaseCommand):
+    help = "Update engagement rollups from rows added since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help="Repeat every N seconds. 0 = run once.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            counted = run_rollups(options['batch_size'])
+            self.stdout.write(
+                f"Rolled up {', '.join(f'{n} {source}s' for source, n in counted.items())} "
+                f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,99 @@
+"""
+Run background jobs from the database queue (see home/jobs.py).
+
+    python manage.py runworker --threads 4
+    python manage.py runworker --processes 2 --threads 2
+    python manage.py runworker --once      # drain the queue and exit
+"""
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from home.jobs import claim_job, load_tasks, requeue_stale, run_job
+
+
+def work(worker_id, poll_interval, lease, once, stop):
+    """Claim-and-run loop for one thread"""
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            requeue_stale(lease)
+            job = claim_job(worker_id)
+            if job is None:
+                if once:
+                    return
+                stop.wait(poll_interval)
+                continue
+            run_job(job)
+    finally:
+        connections.close_all()
+
+
+def run_threads(prefix, threads, poll_interval, lease, once):
+    load_tasks()
+    stop = threading.Event()
+    workers = [
+        threading.Thread(
+            target=work,
+            args=(f"{prefix}-{n}", poll_interval, lease, once, stop),
+            name=f"runworker-{n}",
+            daemon=True,
+        )
+        for n in range(threads)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+
+class Command(BaseCommand):
+    help = "Process queued background jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Worker threads per process")
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between polls when idle")
+        parser.add_argument(
+            '--lease', type=int, default=300,
+            help="Requeue jobs running longer than this (s) unless the task sets its own lease",
+        )
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+
+    def handle(self, *args, **options):
+        prefix = f"{socket.gethostname()}-{os.getpid()}"
+        tasks = load_tasks()
+        self.stdout.write(
+            f"Worker {prefix}: {options['processes']} process(es) x {options['threads']} thread(s), "
+            f"{len(tasks)} task(s) registered"
+        )
+        run_args = (options['threads'], options['poll_interval'], options['lease'], options['once'])
+
+        if options['processes'] <= 1:
+            run_threads(prefix, *run_args)
+            return
+
+        # Children must not inherit the parent's open database connections
+        connections.close_all()
+        children = [
+            multiprocessing.Process(target=run_threads, args=(f"{prefix}-p{n}", *run_args))
+            for n in range(options['processes'])
+        ]
+        for child in children:
+            child.start()
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                child.terminate()
@@ -0,0 +1,226 @@
+"""
+Generate realistic synthetic data at a configurable scale.
+
+Creates GoogleUsers, a power-law follow graph (a few accounts have most of
+the followers), posts whose likes/comments/saves also follow a power law,
+active and expired stories, and recipes. Everything is inserted with
+bulk_create in batches, so seeding a million rows takes seconds rather than
+hours. Media fields point at placeholder paths; no files are written.
+
+    python manage.py seed_data --users 10000 --posts 50000 --seed 42
+"""
+import random
+import string
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from authentication.models import GoogleUser
+from home.bulk import explicit_timestamps
+from home.models import Post, Like, Comment, Follow, SavedPost, Story, Recipe
+
+FIRST_NAMES = [
+    'ajmal', 'maria', 'arjun', 'fatima', 'liam', 'noah', 'emma', 'olivia', 'ava', 'mia',
+    'lucas', 'anika', 'rahul', 'sara', 'omar', 'zoe', 'ivan', 'yuki', 'leila', 'tom',
+]
+LAST_NAMES = [
+    'shams', 'gasper', 'nair', 'khan', 'smith', 'garcia', 'chen', 'kumar', 'ali', 'rossi',
+    'silva', 'müller', 'kim', 'das', 'joseph', 'thomas', 'wilson', 'ito', 'haddad', 'roy',
+]
+WORDS = [
+    'healthy', 'breakfast', 'protein', 'vegan', 'keto', 'salad', 'smoothie', 'homemade',
+    'spicy', 'quick', 'lunch', 'dinner', 'meal', 'prep', 'fresh', 'organic', 'lowcarb',
+    'gym', 'gains', 'yummy', 'sweet', 'bowl', 'curry', 'oats', 'fruit', 'greens',
+]
+CUISINES = ['Indian', 'Italian', 'Mexican', 'Chinese', 'Japanese', 'Thai', 'Mediterranean', 'American', '']
+INGREDIENTS = [
+    '200 g chicken breast', '1 cup rice', '2 tbsp olive oil', '1 onion', '2 cloves garlic',
+    '1 tsp salt', '1/2 tsp black pepper', '2 eggs', '1 cup milk', '100 g spinach',
+    '1 tomato', '1 cup oats', '1 banana', '2 tbsp honey', '150 g paneer', '1 cup lentils',
+    '50 g butter', '1 cup flour', '200 g pasta', '1 avocado', '1 tbsp soy sauce',
+    '100 g broccoli', '1 potato', '1/2 cup yogurt', '30 g almonds', '1 apple',
+]
+
+
+def power_law_weights(n, alpha):
+    """Zipf-like cumulative weights: item i gets weight 1 / (i + 1) ** alpha."""
+    return list(accumulate(1.0 / (i + 1) ** alpha for i in range(n)))
+
+
+class Command(BaseCommand):
+    help = "Seed the database with synthetic users, follows, posts, engagement, stories and recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--avg-follows', type=int, default=30, help="Mean follows per user")
+        parser.add_argument('--avg-likes', type=int, default=20, help="Mean likes per post")
+        parser.add_argument('--avg-comments', type=int, default=3, help="Mean comments per post")
+        parser.add_argument('--avg-saves', type=int, default=2, help="Mean saves per post")
+        parser.add_argument('--stories', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=90, help="Spread content over this many days")
+        parser.add_argument('--alpha', type=float, default=1.1, help="Power-law exponent")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, help="Random seed for reproducible data")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.days = options['days']
+        started = time.perf_counter()
+
+        with transaction.atomic(), explicit_timestamps(
+            GoogleUser, Post, Like, Comment, Follow, SavedPost, Story, Recipe
+        ):
+            users = self.create_users(options['users'])
+            usernames = [user.name for user in users]
+            # Popularity rank: the first users in this order are the "celebrities"
+            popularity = power_law_weights(len(usernames), options['alpha'])
+
+            self.create_follows(usernames, popularity, options['avg_follows'])
+            posts = self.create_posts(users, popularity, options['posts'])
+            self.create_engagement(posts, usernames, options)
+            self.create_stories(users, options['stories'])
+            self.create_recipes(users, options['recipes'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded in {time.perf_counter() - started:.1f}s"
+        ))
+
+    # --- helpers -----------------------------------------------------------
+
+    def random_time(self):
+        return self.now - timedelta(seconds=self.rng.randint(0, self.days * 86400))
+
+    def random_text(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words))
+
+    def unique_ids(self, prefix, count, existing):
+        ids = set()
+        alphabet = string.ascii_letters + string.digits
+        while len(ids) < count:
+            candidate = f"{prefix}-{''.join(self.rng.choices(alphabet, k=6))}"
+            if candidate not in existing:
+                ids.add(candidate)
+        return list(ids)
+
+    def bulk(self, model, objects):
+        created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.stdout.write(f"  {model.__name__}: {len(created)}")
+        return created
+
+    # --- generators --------------------------------------------------------
+
+    def create_users(self, count):
+        start = GoogleUser.objects.count()
+        users = []
+        for i in range(start, start + count):
+            display = f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)} {i}"
+            users.append(GoogleUser(
+                name=slugify(display),
+                email=f"{slugify(display).replace('-', '.')}@example.com",
+                photo_url=f"https://example.com/avatars/{i}.jpg",
+                created_at=self.random_time(),
+            ))
+        return self.bulk(GoogleUser, users)
+
+    def create_follows(self, usernames, popularity, avg_follows):
+        follows = []
+        seen = set()
+        for follower in usernames:
+            wanted = min(len(usernames) - 1, int(self.rng.paretovariate(1.5) * avg_follows / 3))
+            for following in self.rng.choices(usernames, cum_weights=popularity, k=wanted):
+                if following != follower and (follower, following) not in seen:
+                    seen.add((follower, following))
+                    follows.append(Follow(
+                        follower=follower, following=following, created_at=self.random_time()
+                    ))
+        self.bulk(Follow, follows)
+
+    def create_posts(self, users, popularity, count):
+        existing = set(Post.objects.values_list('post_id', flat=True))
+        post_ids = self.unique_ids('POST', count, existing)
+        authors = self.rng.choices(users, cum_weights=popularity, k=count)
+        posts = [
+            Post(
+                post_id=post_id,
+                username=author.name,
+                email=author.email,
+                caption=f"{self.random_text(6)} #{self.rng.choice(WORDS)} #{self.rng.choice(WORDS)}",
+                media_file=f"users/{author.name}/{post_id}/seed.jpg",
+                created_at=self.random_time(),
+            )
+            for post_id, author in zip(post_ids, authors)
+        ]
+        return self.bulk(Post, posts)
+
+    def create_engagement(self, posts, usernames, options):
+        likes, comments, saves = [], [], []
+        for post in posts:
+            # Heavy-tailed engagement: most posts get little, a few go viral
+            boost = self.rng.paretovariate(1.8) / 2.25
+            like_count = min(len(usernames), int(options['avg_likes'] * boost))
+            likers = self.rng.sample(usernames, like_count)
+            post.likes = like_count
+            likes.extend(
+                Like(post=post, username=username, created_at=self.random_after(post.created_at))
+                for username in likers
+            )
+            for _ in range(int(options['avg_comments'] * boost)):
+                comments.append(Comment(
+                    post=post, username=self.rng.choice(usernames),
+                    text=self.random_text(self.rng.randint(2, 12)),
+                    created_at=self.random_after(post.created_at),
+                ))
+            saver_count = min(len(usernames), int(options['avg_saves'] * boost))
+            saves.extend(
+                SavedPost(post=post, username=username, created_at=self.random_after(post.created_at))
+                for username in self.rng.sample(usernames, saver_count)
+            )
+        self.bulk(Like, likes)
+        self.bulk(Comment, comments)
+        self.bulk(SavedPost, saves)
+        Post.objects.bulk_update(posts, ['likes'], batch_size=self.batch_size)
+
+    def random_after(self, moment):
+        span = max(1, int((self.now - moment).total_seconds()))
+        return moment + timedelta(seconds=self.rng.randint(0, span))
+
+    def create_stories(self, users, count):
+        existing = set(Story.objects.values_list('story_id', flat=True))
+        stories = []
+        for story_id in self.unique_ids('STORY', count, existing):
+            author = self.rng.choice(users)
+            # About half are still live (expiry in the future)
+            created_at = self.now - timedelta(seconds=self.rng.randint(0, 48 * 3600))
+            stories.append(Story(
+                story_id=story_id,
+                username=author.name,
+                email=author.email,
+                media_file=f"users/{author.name}/{story_id}/seed.jpg",
+                created_at=created_at,
+                expires_at=created_at + timedelta(hours=24),
+            ))
+        self.bulk(Story, stories)
+
+    def create_recipes(self, users, count):
+        recipes = []
+        for _ in range(count):
+            ingredients = self.rng.sample(INGREDIENTS, self.rng.randint(3, 9))
+            recipes.append(Recipe(
+                title=f"{self.rng.choice(WORDS).title()} {self.rng.choice(WORDS)} {self.rng.choice(['bowl', 'curry', 'salad', 'soup', 'wrap'])}",
+                ingredients='\n'.join(ingredients),
+                instructions=self.random_text(30),
+                cuisine=self.rng.choice(CUISINES),
+                total_time_mins=self.rng.choice([10, 15, 20, 30, 45, 60, 90]),
+                author=self.rng.choice(users),
+                created_at=self.random_time(),
+            ))
+        self.bulk(Recipe, recipes)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0017_engagement_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostMention',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='home.post')),
+            ],
+            options={
+                'ordering': ['-created_at', '-post'],
+                'indexes': [models.Index(fields=['username', '-created_at', '-post'], name='home_postme_usernam_7a91d8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'username'), name='unique_post_mention')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to='home.post')),
+            ],
+            options={
+                'ordering': ['-created_at', '-post'],
+                'indexes': [models.Index(fields=['tag', '-created_at', '-post'], name='home_postta_tag_73f32f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'tag'), name='unique_post_tag')],
+            },
+        ),
+    ]
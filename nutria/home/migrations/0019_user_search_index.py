@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0018_post_tags_mentions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=100, unique=True)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('photo_url', models.URLField(blank=True, null=True)),
+                ('followers', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=254)),
+                ('weight', models.SmallIntegerField(default=1)),
+                ('followers', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens', to='home.userindex')),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['token', 'user', 'weight'], name='home_userse_token_8a9961_idx'),
+                    models.Index(fields=['weight', 'token', '-followers', 'user'], name='home_usersearch_rank_idx'),
+                    models.Index(fields=['weight', '-followers', 'user', 'token'], name='home_usersearch_walk_idx'),
+                ],
+                'constraints': [models.UniqueConstraint(fields=('user', 'token'), name='unique_user_search_token')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:41
+
+import home.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0019_user_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='media_file',
+            field=models.FileField(db_index=True, upload_to=home.models.user_media_path),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to=home.models.recipe_image_path),
+        ),
+        migrations.AlterField(
+            model_name='story',
+            name='media_file',
+            field=models.FileField(db_index=True, upload_to=home.models.user_media_path),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0020_media_file_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='home_post_usernam_4c1b34_idx',
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['username', '-created_at', '-id'], name='home_post_usernam_404b14_idx'),
+        ),
+    ]
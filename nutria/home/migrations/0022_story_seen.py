@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0021_profile_grid_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorySeen',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=100, unique=True)),
+                ('story_pks', models.JSONField(default=list)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0022_story_seen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.CharField(max_length=100, unique=True)),
+                ('unread', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ActivityGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.CharField(max_length=100)),
+                ('verb', models.CharField(max_length=20)),
+                ('target', models.CharField(blank=True, max_length=255)),
+                ('window', models.DateTimeField()),
+                ('actor_count', models.IntegerField(default=0)),
+                ('actors', models.JSONField(default=list)),
+                ('preview', models.CharField(blank=True, max_length=200)),
+                ('unread', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recipient', '-updated_at', '-id'], name='home_activi_recipie_af35d4_idx')],
+                'constraints': [models.UniqueConstraint(fields=('recipient', 'verb', 'target', 'window'), name='unique_activity_group')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0023_activity_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.SmallIntegerField()),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_recipes', to='home.recipe')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='home.recipe')),
+            ],
+            options={
+                'ordering': ['recipe', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('recipe', 'rank'), name='unique_recipe_similar_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0024_recipe_similar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='carbs_g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fat_g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='fiber_g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='kcal',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='nutrition_key',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='protein_g',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
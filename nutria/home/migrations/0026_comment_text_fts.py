@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:15
+
+from django.db import migrations
+
+# Full-text index over Comment.text for the admin search (see
+# IndexedSearchMixin.text_search_table). An external-content FTS5 table with
+# the trigram tokenizer, so it answers the same case-insensitive substring
+# queries the old `text__icontains` search did; triggers keep it in step
+# with home_comment. SQLite only. A later migration that makes Django rebuild
+# home_comment drops the triggers with the old table and must recreate them.
+CREATE = [
+    "CREATE VIRTUAL TABLE home_comment_fts USING fts5("
+    "text, content='home_comment', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER home_comment_fts_insert AFTER INSERT ON home_comment BEGIN "
+    "INSERT INTO home_comment_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER home_comment_fts_delete AFTER DELETE ON home_comment BEGIN "
+    "INSERT INTO home_comment_fts(home_comment_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER home_comment_fts_update AFTER UPDATE OF text ON home_comment BEGIN "
+    "INSERT INTO home_comment_fts(home_comment_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO home_comment_fts(rowid, text) VALUES (new.id, new.text); END",
+    # Index the comments that already exist
+    "INSERT INTO home_comment_fts(home_comment_fts) VALUES ('rebuild')",
+]
+
+DROP = [
+    "DROP TRIGGER IF EXISTS home_comment_fts_update",
+    "DROP TRIGGER IF EXISTS home_comment_fts_delete",
+    "DROP TRIGGER IF EXISTS home_comment_fts_insert",
+    "DROP TABLE IF EXISTS home_comment_fts",
+]
+
+
+def run(statements):
+    def forwards(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return forwards
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0025_recipe_nutrition'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0026_comment_text_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='has_thumbnail',
+            field=models.BooleanField(default=False),
+        ),
+    ]
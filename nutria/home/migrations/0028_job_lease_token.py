@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0027_post_has_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='lease_token',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+    ]
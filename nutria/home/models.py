@@ -29,16 +29,19 @@ class Post(models.Model):
     username = models.CharField(max_length=100)
     email = models.EmailField()
     caption = models.TextField(blank=True)
-    media_file = models.FileField(upload_to=user_media_path)
+    media_file = models.FileField(upload_to=user_media_path, db_index=True)  # Indexed for gc_media lookups
     created_at = models.DateTimeField(auto_now_add=True)
     likes = models.IntegerField(default=0)
+    has_thumbnail = models.BooleanField(default=False)  # Set once make_thumbnail has written thumbs/...
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['-created_at']),
-            models.Index(fields=['username']),
+            # Profile grid: a user's posts newest first, paged by (created_at, id)
+            models.Index(fields=['username', '-created_at', '-id']),
             models.Index(fields=['post_id']),
+            models.Index(fields=['email']),
         ]
 
     def save(self, *args, **kwargs):
@@ -70,7 +73,7 @@ class Story(models.Model):
     story_id = models.CharField(max_length=12, unique=True, editable=False)  # STORY-xxxxxx
     username = models.CharField(max_length=100)
     email = models.EmailField()
-    media_file = models.FileField(upload_to=user_media_path)
+    media_file = models.FileField(upload_to=user_media_path, db_index=True)  # Indexed for gc_media lookups
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()  # Optional: auto-delete after 24h
 
@@ -106,6 +109,8 @@ class Comment(models.Model):
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['post', 'created_at']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['username']),
         ]
 
     def __str__(self):
@@ -134,10 +139,18 @@ class Recipe(models.Model):
     instructions = models.TextField()
     cuisine = models.CharField(max_length=100, blank=True)
     total_time_mins = models.IntegerField(default=45)
-    image = models.ImageField(upload_to=recipe_image_path, blank=True, null=True)
+    image = models.ImageField(upload_to=recipe_image_path, blank=True, null=True, db_index=True)
     author = models.ForeignKey('authentication.GoogleUser', on_delete=models.CASCADE, related_name='recipes')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Whole-recipe totals worked out from the ingredients (see home/nutrition.py)
+    kcal = models.FloatField(null=True, blank=True, db_index=True)
+    protein_g = models.FloatField(null=True, blank=True)
+    carbs_g = models.FloatField(null=True, blank=True)
+    fat_g = models.FloatField(null=True, blank=True)
+    fiber_g = models.FloatField(null=True, blank=True)
+    nutrition_key = models.CharField(max_length=16, blank=True, editable=False)  # Ingredients the totals are for
+
     # Temporary storage for email during creation
     _temp_author_email = None
 
@@ -241,4 +254,317 @@ class SavedPost(models.Model):
     @classmethod
     def get_saved_posts(cls, username):
         """Get all saved posts for a user"""
-        return cls.objects.filter(username=username).select_related('post').order_by('-created_at')
\ No newline at end of file
+        return cls.objects.filter(username=username).select_related('post').order_by('-created_at')
+
+
+# === Change log for incremental (delta) sync ===
+class ChangeLog(models.Model):
+    """
+    Append-only record of changes to Post, Comment, Like, SavedPost and
+    Follow. The auto-increment id doubles as the client's sync token:
+    /api/sync/?since=<id> returns everything that changed after it.
+    Written by the signal handlers in home/signals.py.
+    """
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTION_CHOICES = [(UPSERT, 'Upsert'), (DELETE, 'Delete')]
+
+    entity = models.CharField(max_length=20)  # post, comment, like, savedpost, follow
+    entity_key = models.CharField(max_length=255)  # Natural key, e.g. "POST-abc123"
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    ref = models.JSONField(default=dict)  # Key fields, enough to apply a tombstone
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['entity', 'entity_key']),
+            models.Index(fields=['created_at']),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.action} {self.entity} {self.entity_key}"
+
+    @classmethod
+    def record(cls, entity, entity_key, action, **ref):
+        return cls.objects.create(entity=entity, entity_key=entity_key, action=action, ref=ref)
+
+    @classmethod
+    def horizon(cls):
+        """Oldest token that can still be synced incrementally"""
+        return ChangeLogCompaction.objects.aggregate(
+            horizon=models.Max('compacted_through')
+        )['horizon'] or 0
+
+
+class ChangeLogCompaction(models.Model):
+    """
+    One row per compaction run. Entries up to ``compacted_through`` may have
+    been removed, so clients holding an older token must do a full refetch.
+    """
+    compacted_through = models.BigIntegerField()
+    removed = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Compacted through #{self.compacted_through}"
+
+
+# === Background jobs (see home/jobs.py) ===
+class Job(models.Model):
+    """
+    A unit of deferred work, stored in the database so no broker is needed.
+    Created by ``<task>.enqueue(...)`` and executed by ``manage.py runworker``.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    task = models.CharField(max_length=200)  # Registered task name
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    priority = models.IntegerField(default=0)  # Higher runs first
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField()  # Not before this time (retry backoff)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    lease_token = models.UUIDField(null=True, blank=True)  # New per claim; outcomes are only recorded under it
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at']),
+            models.Index(fields=['status', 'locked_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.id} ({self.status})"
+
+
+# === Trending index (see home/trending.py) ===
+class TrendingScore(models.Model):
+    """
+    Time-decayed engagement score per post, updated incrementally as likes,
+    comments and saves arrive. Reading the top K is an index scan on score.
+    """
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    score = models.FloatField(default=0)  # log2 of decayed engagement, see trending.py
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-score']
+        indexes = [
+            models.Index(fields=['-score']),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id}: {self.score:.3f}"
+
+
+# === Engagement rollups for analytics (see home/rollups.py) ===
+PERIOD_CHOICES = [('hour', 'Hour'), ('day', 'Day')]
+
+
+class PostEngagement(models.Model):
+    """Likes, comments and saves a post received per hour or day (UTC buckets)"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='engagement')
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()  # Start of the hour/day
+    likes = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+    saves = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'period', 'bucket'], name='unique_post_engagement_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} {self.period} {self.bucket:%Y-%m-%d %H:00}"
+
+
+class AuthorEngagement(models.Model):
+    """Engagement across all of an author's posts per hour or day (UTC buckets)"""
+    username = models.CharField(max_length=100)  # Post author
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    likes = models.IntegerField(default=0)
+    comments = models.IntegerField(default=0)
+    saves = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['username', 'period', 'bucket'], name='unique_author_engagement_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.username} {self.period} {self.bucket:%Y-%m-%d %H:00}"
+
+
+class RollupCheckpoint(models.Model):
+    """High-water mark: the last source row id folded into the rollups"""
+    source = models.CharField(max_length=20, unique=True)  # like, comment, save
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} through #{self.last_id}"
+
+
+# === Hashtags and mentions (see home/tags.py) ===
+class PostTag(models.Model):
+    """A #hashtag in a post's caption, lowercased. created_at mirrors the post's."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='tags')
+    tag = models.CharField(max_length=100)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-post']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'tag'], name='unique_post_tag'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', '-created_at', '-post']),
+        ]
+
+    def __str__(self):
+        return f"#{self.tag} on {self.post_id}"
+
+
+class PostMention(models.Model):
+    """An @username in a post's caption. created_at mirrors the post's."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='mentions')
+    username = models.CharField(max_length=100)  # Mentioned user
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-post']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'username'], name='unique_post_mention'),
+        ]
+        indexes = [
+            models.Index(fields=['username', '-created_at', '-post']),
+        ]
+
+    def __str__(self):
+        return f"@{self.username} in {self.post_id}"
+
+
+# === User search index (see home/usersearch.py) ===
+class UserIndex(models.Model):
+    """
+    One searchable account: a GoogleUser and/or a post author. In this app
+    GoogleUser.name doubles as the username posts are made under.
+    """
+    username = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100, blank=True)
+    email = models.EmailField(blank=True)
+    photo_url = models.URLField(blank=True, null=True)
+    followers = models.IntegerField(default=0)  # Kept in step by the Follow signals; breaks ranking ties
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.username
+
+
+class UserSearchToken(models.Model):
+    """Normalized word from a user's username, name or email"""
+    user = models.ForeignKey(UserIndex, on_delete=models.CASCADE, related_name='tokens')
+    token = models.CharField(max_length=254)
+    weight = models.SmallIntegerField(default=1)  # Higher for username/name words than email
+    followers = models.IntegerField(default=0)  # Copy of UserIndex.followers, so ranking needs no join
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'token'], name='unique_user_search_token'),
+        ]
+        indexes = [
+            # Prefix lookups are range scans on token; user and weight make it covering
+            models.Index(fields=['token', 'user', 'weight']),
+            # Single-word ranking: exact and rare-prefix matches of one weight, most followed first
+            models.Index(fields=['weight', 'token', '-followers', 'user'], name='home_usersearch_rank_idx'),
+            # Common prefixes: walk one weight by followers until enough tokens match
+            models.Index(fields=['weight', '-followers', 'user', 'token'], name='home_usersearch_walk_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.user_id}"
+
+
+# === Story seen-state (see home/storyseen.py) ===
+class StorySeen(models.Model):
+    """The stories one user has watched"""
+    username = models.CharField(max_length=100, unique=True)
+    story_pks = models.JSONField(default=list)  # Sorted Story pks
+    expires_at = models.DateTimeField()  # Latest expiry of a story in the set; ignored after that
+
+    def __str__(self):
+        return f"{self.username}: {len(self.story_pks)} stories"
+
+
+# === Aggregated activity feed (see home/activity.py) ===
+class ActivityGroup(models.Model):
+    """
+    Everything one verb did to one target of a user within one time
+    window, e.g. every like on a post that day. New events merge into the
+    group instead of adding rows.
+    """
+    recipient = models.CharField(max_length=100)
+    verb = models.CharField(max_length=20)  # like, comment, follow, save
+    target = models.CharField(max_length=255, blank=True)  # post_id; empty for follows
+    window = models.DateTimeField()  # Start of the time window
+    actor_count = models.IntegerField(default=0)
+    actors = models.JSONField(default=list)  # Most recent distinct actors, newest first
+    preview = models.CharField(max_length=200, blank=True)  # Latest comment text
+    unread = models.BooleanField(default=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipient', 'verb', 'target', 'window'], name='unique_activity_group'),
+        ]
+        indexes = [
+            models.Index(fields=['recipient', '-updated_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient}: {self.actor_count} {self.verb} {self.target}"
+
+
+class ActivityCounter(models.Model):
+    """Unread activity groups per user, so badges need no COUNT(*)"""
+    recipient = models.CharField(max_length=100, unique=True)
+    unread = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.recipient}: {self.unread} unread"
+
+
+# === Similar recipes (see home/similarity.py) ===
+class RecipeSimilar(models.Model):
+    """One of a recipe's precomputed nearest neighbours"""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='similar_recipes')
+    similar = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()  # Cosine similarity of the TF-IDF vectors
+    rank = models.SmallIntegerField()  # 0 = most similar
+
+    class Meta:
+        ordering = ['recipe', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'rank'], name='unique_recipe_similar_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} ~ {self.similar_id} ({self.score:.2f})"
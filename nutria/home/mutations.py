@@ -0,0 +1,174 @@
+# home/mutations.py
+"""
+Idempotent set/unset of likes, follows and saves.
+
+Each operation is one INSERT ... ON CONFLICT DO NOTHING (or DELETE) with
+RETURNING, which says whether the row actually changed, plus at most one
+counter UPDATE ... RETURNING for the new total (likes on the Post,
+followers on the UserIndex row). Repeating an operation is a no-op, so
+double taps and retries can't flip the state back, and the result is known
+without reading anything back. RETURNING needs SQLite 3.35+ or PostgreSQL.
+
+Raw statements bypass model signals, so post_save/post_delete are sent by
+hand for rows that changed; the change log, trending index, rollups and
+activity feed stay in step as if the ORM had written them. Follow signals
+carry counted=True so the handler doesn't count the follow a second time.
+"""
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+from .models import Post, Like, Follow, SavedPost
+from .usersearch import adjust_followers
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _column(model, field):
+    return connection.ops.quote_name(model._meta.get_field(field).column)
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()
+
+
+def _insert_for_post(model, post_id, username, now, existing=False):
+    """
+    INSERT (post, username) for the post with ``post_id``; (id, post pk,
+    created_at) or None. With ``existing`` a row that is already there is
+    returned too (the conflict becomes a no-op update), so None means there
+    is no such post; compare created_at to ``now`` to tell the two apart.
+    """
+    conflict = (
+        f"DO UPDATE SET {_column(model, 'username')} = excluded.{_column(model, 'username')}"
+        if existing else "DO NOTHING"
+    )
+    sql = (
+        f"INSERT INTO {_table(model)} ({_column(model, 'post')}, {_column(model, 'username')}, "
+        f"{_column(model, 'created_at')}) "
+        f"SELECT {_column(Post, 'id')}, %s, %s FROM {_table(Post)} WHERE {_column(Post, 'post_id')} = %s "
+        f"ON CONFLICT ({_column(model, 'post')}, {_column(model, 'username')}) {conflict} "
+        f"RETURNING {_column(model, 'id')}, {_column(model, 'post')}, {_column(model, 'created_at')}"
+    )
+    return _execute(sql, [username, connection.ops.adapt_datetimefield_value(now), post_id])
+
+
+def _delete_for_post(model, post_id, username):
+    """DELETE (post, username); (id, post pk, created_at) or None"""
+    sql = (
+        f"DELETE FROM {_table(model)} WHERE {_column(model, 'username')} = %s AND {_column(model, 'post')} = "
+        f"(SELECT {_column(Post, 'id')} FROM {_table(Post)} WHERE {_column(Post, 'post_id')} = %s) "
+        f"RETURNING {_column(model, 'id')}, {_column(model, 'post')}, {_column(model, 'created_at')}"
+    )
+    return _execute(sql, [username, post_id])
+
+
+def _created_at(value):
+    # RETURNING hands back the raw column value (a string on SQLite)
+    column = Like._meta.get_field('created_at').get_col(Like._meta.db_table)
+    for converter in connection.ops.get_db_converters(column):
+        value = converter(value, column, connection)
+    return value
+
+
+def _send(model, row_id, changed_to, signal_kwargs=None, **values):
+    instance = model(id=row_id, **values)
+    instance._state.adding = False
+    if changed_to:
+        post_save.send(sender=model, instance=instance, created=True, update_fields=None,
+                       raw=False, using=connection.alias, **(signal_kwargs or {}))
+    else:
+        post_delete.send(sender=model, instance=instance, using=connection.alias, origin=instance,
+                         **(signal_kwargs or {}))
+    return instance
+
+
+def set_like(post_id, username, liked):
+    """
+    Make ``username``'s like on the post ``liked``.
+    Returns (likes, changed); raises Post.DoesNotExist.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        if liked:
+            row = _insert_for_post(Like, post_id, username, now)
+            delta = 1 if row else 0
+        else:
+            row = _delete_for_post(Like, post_id, username)
+            delta = -1 if row else 0
+        counter = _column(Post, 'likes')
+        result = _execute(
+            f"UPDATE {_table(Post)} SET {counter} = CASE WHEN {counter} + %s < 0 THEN 0 ELSE {counter} + %s END "
+            f"WHERE {_column(Post, 'post_id')} = %s RETURNING {_column(Post, 'id')}, {counter}",
+            [delta, delta, post_id],
+        )
+        if result is None:
+            raise Post.DoesNotExist(post_id)
+        post_pk, likes = result
+        if row:
+            post = Post(id=post_pk, post_id=post_id, likes=likes)
+            created_at = now if liked else _created_at(row[2])
+            _send(Like, row[0], liked, post=post, username=username, created_at=created_at)
+        return likes, bool(row)
+
+
+def set_saved(post_id, username, saved):
+    """
+    Make the post saved (or not) for ``username``.
+    Returns changed; saving raises Post.DoesNotExist. Unsaving a post that
+    doesn't exist is a no-op, since telling that from "not saved" would
+    take another read.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        if saved:
+            row = _insert_for_post(SavedPost, post_id, username, now, existing=True)
+            if row is None:
+                raise Post.DoesNotExist(post_id)
+            created_at = _created_at(row[2])
+            if created_at != now:
+                return False
+        else:
+            row = _delete_for_post(SavedPost, post_id, username)
+            if row is None:
+                return False
+            created_at = _created_at(row[2])
+        post = Post(id=row[1], post_id=post_id)
+        _send(SavedPost, row[0], saved, post=post, username=username, created_at=created_at)
+        return True
+
+
+def set_follow(follower, following, on):
+    """
+    Make ``follower`` follow ``following`` (or not).
+    Returns (followers_count, changed). The count is the one kept on the
+    user search index (see usersearch.adjust_followers).
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        if on:
+            row = _execute(
+                f"INSERT INTO {_table(Follow)} ({_column(Follow, 'follower')}, {_column(Follow, 'following')}, "
+                f"{_column(Follow, 'created_at')}) VALUES (%s, %s, %s) "
+                f"ON CONFLICT ({_column(Follow, 'follower')}, {_column(Follow, 'following')}) DO NOTHING "
+                f"RETURNING {_column(Follow, 'id')}",
+                [follower, following, connection.ops.adapt_datetimefield_value(now)],
+            )
+        else:
+            row = _execute(
+                f"DELETE FROM {_table(Follow)} WHERE {_column(Follow, 'follower')} = %s "
+                f"AND {_column(Follow, 'following')} = %s "
+                f"RETURNING {_column(Follow, 'id')}, {_column(Follow, 'created_at')}",
+                [follower, following],
+            )
+        followers_count = adjust_followers(following, (1 if on else -1) if row else 0)
+        if row is None:
+            return followers_count, False
+        created_at = now if on else _created_at(row[1])
+        _send(Follow, row[0], on, signal_kwargs={'counted': True},
+              follower=follower, following=following, created_at=created_at)
+        return followers_count, True
@@ -0,0 +1,260 @@
+# home/nutrition.py
+"""
+Per-recipe calories and macros from the ingredient list.
+
+Each line of ``Recipe.ingredients`` ("1 1/2 cups rolled oats", "200g
+chicken breast", "2 cloves garlic, minced") is parsed into quantity, unit
+and a food from the bundled reference table in data/nutrients.csv
+(values per 100 g, with grams per piece and per cup for count and volume
+units). Lines that name no known food, or give no amount ("salt to
+taste"), add nothing; a recipe none of whose lines adds anything gets NULL
+rather than zero, so it is unknown, not "0 kcal", and nutrition filters
+leave it out.
+
+Totals for many recipes are one matrix product: a (recipes x foods) matrix
+of grams / 100 times the (foods x nutrients) table. Results are stored on
+the recipe with ``nutrition_key``, a hash of the ingredients, the table
+and COMPUTE_VERSION, so a recipe is only recomputed when one of them
+changes (``manage.py compute_nutrition`` for existing rows, a pre_save
+handler for new and edited ones). Values are whole-recipe totals; recipes have no
+serving count.
+"""
+import csv
+import hashlib
+import math
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+TABLE_PATH = os.path.join(os.path.dirname(__file__), 'data', 'nutrients.csv')
+
+NUTRIENTS = ('kcal', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g')
+
+# Query parameter -> Recipe lookup, for search_recipes
+FILTERS = {
+    'max_kcal': 'kcal__lte',
+    'min_kcal': 'kcal__gte',
+    'min_protein': 'protein_g__gte',
+    'max_carbs': 'carbs_g__lte',
+    'max_fat': 'fat_g__lte',
+    'min_fiber': 'fiber_g__gte',
+}
+
+MASS_UNITS = {
+    'g': 1, 'gm': 1, 'gram': 1, 'kg': 1000, 'kilogram': 1000, 'mg': 0.001,
+    'oz': 28.35, 'ounce': 28.35, 'lb': 453.6, 'pound': 453.6,
+    'can': 400, 'tin': 400, 'handful': 30, 'scoop': 30,
+}
+
+# In cups
+VOLUME_UNITS = {
+    'cup': 1, 'c': 1, 'tbsp': 1 / 16, 'tablespoon': 1 / 16, 'tbs': 1 / 16, 'tsp': 1 / 48,
+    'teaspoon': 1 / 48, 'ml': 1 / 240, 'millilitre': 1 / 240, 'milliliter': 1 / 240,
+    'l': 1000 / 240, 'litre': 1000 / 240, 'liter': 1000 / 240, 'pinch': 1 / 768, 'dash': 1 / 384,
+}
+
+COUNT_UNITS = {'piece', 'clove', 'slice', 'whole', 'medium', 'large', 'small', 'each', 'stalk', 'fillet'}
+
+# Part of nutrition_key: bump when compute() changes so stored totals are redone
+COMPUTE_VERSION = 2
+
+# Grams per cup when the table has no density (roughly water)
+DEFAULT_GRAMS_PER_CUP = 240
+
+FRACTIONS = {'½': ' 1/2', '⅓': ' 1/3', '⅔': ' 2/3', '¼': ' 1/4', '¾': ' 3/4', '⅛': ' 1/8'}
+
+AMOUNT_RE = re.compile(
+    r'^\s*(?:(?P<whole>\d+)\s+(?P<num>\d+)/(?P<den>\d+)'
+    r'|(?P<fnum>\d+)/(?P<fden>\d+)'
+    r'|(?P<low>\d+(?:\.\d+)?)\s*(?:-|to)\s*(?P<high>\d+(?:\.\d+)?)'
+    r'|(?P<number>\d+(?:\.\d+)?))'
+)
+
+WORD_RE = re.compile(r'[a-z]+')
+
+Ingredient = namedtuple('Ingredient', 'quantity unit food grams')
+
+Table = namedtuple('Table', 'foods aliases values grams_each grams_per_cup version')
+
+
+def singular(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 4 and word.endswith(('oes', 'shes', 'ches')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def _words(text):
+    return tuple(singular(word) for word in WORD_RE.findall(text.lower()))
+
+
+@lru_cache(maxsize=1)
+def table():
+    """The reference table, loaded once per process"""
+    with open(TABLE_PATH, 'rb') as fh:
+        raw = fh.read()
+    foods, aliases, values, grams_each, grams_per_cup = [], {}, [], [], []
+    for index, row in enumerate(csv.DictReader(raw.decode('utf-8').splitlines())):
+        foods.append(row['food'])
+        for name in [row['food'], *filter(None, row['aliases'].split('|'))]:
+            aliases.setdefault(_words(name), index)
+        values.append([float(row[name]) for name in NUTRIENTS])
+        grams_each.append(float(row['grams_each']) if row['grams_each'] else None)
+        grams_per_cup.append(float(row['grams_per_cup']) if row['grams_per_cup'] else DEFAULT_GRAMS_PER_CUP)
+    version = hashlib.sha1(raw).hexdigest()[:12]
+    return Table(foods, aliases, values, grams_each, grams_per_cup, version)
+
+
+def _amount(line):
+    """(quantity or None, rest of the line)"""
+    match = AMOUNT_RE.match(line)
+    if not match:
+        return None, line
+    parts = match.groupdict()
+    if parts['whole']:
+        quantity = int(parts['whole']) + int(parts['num']) / max(int(parts['den']), 1)
+    elif parts['fnum']:
+        quantity = int(parts['fnum']) / max(int(parts['fden']), 1)
+    elif parts['low']:
+        quantity = (float(parts['low']) + float(parts['high'])) / 2
+    else:
+        quantity = float(parts['number'])
+    return quantity, line[match.end():]
+
+
+def _food(words, aliases):
+    """Index of the longest (then earliest) table name among ``words``"""
+    for size in (3, 2, 1):
+        for start in range(len(words) - size + 1):
+            index = aliases.get(words[start:start + size])
+            if index is not None:
+                return index
+    return None
+
+
+@lru_cache(maxsize=2 ** 16)
+def parse_line(line):
+    """
+    An Ingredient for one line; food is None if nothing matched, grams None
+    without an amount. Cached: the same lines recur across many recipes.
+    """
+    foods = table()
+    text = line.lower()
+    for symbol, replacement in FRACTIONS.items():
+        text = text.replace(symbol, replacement)
+    text = re.sub(r'\([^)]*\)', ' ', text.split(',')[0]).strip(' -*•\t')
+    quantity, rest = _amount(text)
+    words = WORD_RE.findall(rest)
+    unit = None
+    for candidate in words[:1] + [singular(word) for word in words[:1]]:
+        if candidate in MASS_UNITS or candidate in VOLUME_UNITS or candidate in COUNT_UNITS:
+            unit, words = candidate, words[1:]
+            break
+    index = _food(tuple(singular(word) for word in words if word != 'of'), foods.aliases)
+    if index is None:
+        return Ingredient(quantity, unit, None, None)
+
+    grams = None
+    if quantity is not None:
+        if unit in MASS_UNITS:
+            grams = quantity * MASS_UNITS[unit]
+        elif unit in VOLUME_UNITS:
+            grams = quantity * VOLUME_UNITS[unit] * foods.grams_per_cup[index]
+        elif foods.grams_each[index] is not None:
+            grams = quantity * foods.grams_each[index]
+    return Ingredient(quantity, unit, foods.foods[index], grams)
+
+
+def parse(ingredients):
+    return [parse_line(line) for line in ingredients.splitlines() if line.strip()]
+
+
+def nutrition_key(ingredients):
+    return hashlib.sha1(f"{table().version}\n{COMPUTE_VERSION}\n{ingredients}".encode()).hexdigest()[:16]
+
+
+def compute(ingredient_lists):
+    """
+    (len(ingredient_lists) x len(NUTRIENTS)) array of totals, one row per
+    ``Recipe.ingredients`` text; NaN for texts where no line gave grams.
+    """
+    if np is None:
+        raise ImportError("Nutrition needs numpy")
+    foods = table()
+    food_index = {name: index for index, name in enumerate(foods.foods)}
+    rows, columns, grams = [], [], []
+    for row, ingredients in enumerate(ingredient_lists):
+        for ingredient in parse(ingredients):
+            if ingredient.grams:
+                rows.append(row)
+                columns.append(food_index[ingredient.food])
+                grams.append(ingredient.grams)
+    amounts = np.zeros((len(ingredient_lists), len(foods.foods)))
+    # add.at sums repeated foods within a recipe
+    np.add.at(amounts, (rows, columns), np.asarray(grams) / 100)
+    totals = (amounts @ np.asarray(foods.values)).round(1)
+    known = np.zeros(len(ingredient_lists), dtype=bool)
+    known[rows] = True
+    totals[~known] = np.nan
+    return totals
+
+
+def apply(recipes):
+    """
+    Fill the nutrition fields of the recipes whose key is stale; returns
+    the ones that changed.
+    """
+    stale = [recipe for recipe in recipes if recipe.nutrition_key != nutrition_key(recipe.ingredients)]
+    if stale:
+        totals = compute([recipe.ingredients for recipe in stale])
+        for recipe, values in zip(stale, totals):
+            for name, value in zip(NUTRIENTS, values.tolist()):
+                setattr(recipe, name, None if math.isnan(value) else value)
+            recipe.nutrition_key = nutrition_key(recipe.ingredients)
+    return stale
+
+
+def store(recipes):
+    """
+    Write the nutrition fields of ``recipes``, one executemany. Sends no
+    signals: Recipe is not in the ChangeLog (signals.SYNCED_MODELS) and
+    its other handlers don't look at these fields. Record entries here if
+    recipes are ever synced.
+    """
+    from django.db import connection
+
+    from .models import Recipe
+
+    quote = connection.ops.quote_name
+    columns = [*NUTRIENTS, 'nutrition_key']
+    sql = (
+        f"UPDATE {quote(Recipe._meta.db_table)} SET "
+        f"{', '.join(f'{quote(name)} = %s' for name in columns)} WHERE {quote('id')} = %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [[getattr(recipe, name) for name in columns] + [recipe.pk] for recipe in recipes])
+
+
+def filters(params):
+    """Recipe filter kwargs from ?max_kcal=... style params; ValueError if one isn't a finite number"""
+    lookups = {}
+    for param, lookup in FILTERS.items():
+        value = params.get(param)
+        if value not in (None, ''):
+            try:
+                number = float(value)
+            except ValueError:
+                number = math.nan
+            if not math.isfinite(number):
+                raise ValueError(f'{param} must be a number')
+            lookups[lookup] = number
+    return lookups
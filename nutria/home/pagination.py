@@ -0,0 +1,66 @@
+# home/pagination.py
+"""
+Keyset (cursor) pagination for feeds ordered newest first.
+
+Pages are selected with ``WHERE (created_at, id) < (cursor)`` on an index
+that starts with the feed's filter column, so page 1000 costs the same as
+page 1. The cursor is the last row's (created_at, id), base64-encoded so
+clients treat it as opaque.
+"""
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(created_at, pk):
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, pk) from a cursor; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        when, pk = raw.rsplit('|', 1)
+        created_at = parse_datetime(when)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Invalid cursor') from exc
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return created_at, pk
+
+
+def page_size(request):
+    try:
+        limit = int(request.query_params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(queryset, cursor, limit, pk_field='pk', time_field='created_at'):
+    """
+    One page of ``queryset`` ordered by (time_field, pk_field) descending,
+    starting after ``cursor``. Returns (rows, next_cursor); next_cursor is
+    None on the last page. Raises ValueError for a bad cursor.
+    """
+    queryset = queryset.order_by(f'-{time_field}', f'-{pk_field}')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{time_field}__lt': created_at})
+            | Q(**{time_field: created_at, f'{pk_field}__lt': pk})
+        )
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_cursor(last[time_field], last[pk_field])
+    return rows, encode_cursor(getattr(last, time_field), getattr(last, pk_field))
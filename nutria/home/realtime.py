@@ -0,0 +1,178 @@
+# home/realtime.py
+"""
+Real-time push for likes, comments and new posts.
+
+Views publish small delta events to named groups:
+
+    post.<post_id>    like count changes and new comments on one post
+    feed.<username>   new posts from people <username> follows
+
+and the Server-Sent Events endpoint (/api/events/) subscribes a client to
+the groups it cares about. Delivery goes through a pluggable channel layer
+chosen by settings.NUTRIA_CHANNEL_LAYER; the default InMemoryChannelLayer is
+process-local, so run the events endpoint and the publishing views in the
+same ASGI process (or plug in a layer backed by a shared broker).
+"""
+import asyncio
+import itertools
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+DEFAULT_CHANNEL_LAYER = 'home.realtime.InMemoryChannelLayer'
+
+FEED_PREFIX = 'feed.'
+
+# Subscribed feeds checked against the follow table per query
+FAN_OUT_BATCH = 500
+
+
+class BaseChannelLayer:
+    """
+    Interface for channel layers.
+
+    publish() may be called from any thread (sync views run in a thread
+    pool under ASGI); subscribe() is used from the event loop.
+    """
+
+    def publish(self, group, event):
+        raise NotImplementedError
+
+    def subscribe(self, groups):
+        """Return a Subscription receiving events sent to any of ``groups``."""
+        raise NotImplementedError
+
+    def has_subscribers(self, group=None):
+        """Cheap check so publishers can skip work nobody will see."""
+        return True
+
+    def groups(self, prefix=''):
+        """Names of the groups starting with ``prefix`` that have subscribers."""
+        raise NotImplementedError
+
+
+class Subscription:
+    def __init__(self, layer, groups, max_queue=256):
+        self.layer = layer
+        self.groups = list(groups)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def deliver(self, event):
+        # Slow consumers drop events rather than grow without bound; every
+        # event carries absolute values, so the next one resynchronises.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.layer.unsubscribe(self)
+
+
+class InMemoryChannelLayer(BaseChannelLayer):
+    """Process-local fan-out to subscribers' asyncio queues."""
+
+    def __init__(self):
+        self._groups = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def publish(self, group, event):
+        with self._lock:
+            subscribers = list(self._groups.get(group, ()))
+        if not subscribers:
+            return
+        event = dict(event, id=next(self._ids))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    def subscribe(self, groups):
+        subscription = Subscription(self, groups)
+        with self._lock:
+            for group in subscription.groups:
+                self._groups.setdefault(group, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for group in subscription.groups:
+                members = self._groups.get(group)
+                if members:
+                    members.discard(subscription)
+                    if not members:
+                        del self._groups[group]
+
+    def has_subscribers(self, group=None):
+        with self._lock:
+            if group is None:
+                return bool(self._groups)
+            return group in self._groups
+
+    def groups(self, prefix=''):
+        with self._lock:
+            return [group for group in self._groups if group.startswith(prefix)]
+
+
+_layer = None
+_layer_lock = threading.Lock()
+
+
+def get_channel_layer():
+    global _layer
+    if _layer is None:
+        with _layer_lock:
+            if _layer is None:
+                path = getattr(settings, 'NUTRIA_CHANNEL_LAYER', DEFAULT_CHANNEL_LAYER)
+                _layer = import_string(path)()
+    return _layer
+
+
+def post_group(post_id):
+    return f'post.{post_id}'
+
+
+def feed_group(username):
+    return f'{FEED_PREFIX}{username}'
+
+
+def publish_post_event(post_id, event):
+    """Send a delta about one post to everyone watching it, after commit."""
+    layer = get_channel_layer()
+    group = post_group(post_id)
+    transaction.on_commit(lambda: layer.publish(group, event))
+
+
+def publish_new_post(post, payload):
+    """
+    Send a new post to the feeds of the author's followers, after commit.
+
+    Only feeds someone is subscribed to right now are looked up, so the
+    cost follows the number of connected clients rather than the author's
+    follower count.
+    """
+    layer = get_channel_layer()
+    if not layer.has_subscribers():
+        return
+
+    from .models import Follow
+
+    author = post.username
+    event = {'type': 'feed.post', 'post': payload}
+
+    def fan_out():
+        watching = [group[len(FEED_PREFIX):] for group in layer.groups(FEED_PREFIX)]
+        recipients = [author] if author in watching else []
+        for start in range(0, len(watching), FAN_OUT_BATCH):
+            recipients += Follow.objects.filter(
+                following=author, follower__in=watching[start:start + FAN_OUT_BATCH]
+            ).values_list('follower', flat=True)
+        for username in recipients:
+            layer.publish(feed_group(username), event)
+
+    transaction.on_commit(fan_out)
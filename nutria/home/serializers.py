@@ -1,8 +1,93 @@
 # serializers.py
 from rest_framework import serializers
+from nutria.metrics import serialization_timer
 from .models import Post, Comment, Story
 import hashlib
 
+
+class TimedListSerializer(serializers.ListSerializer):
+    """Counts many=True serialization towards the request's serialize time"""
+    @property
+    def data(self):
+        with serialization_timer():
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Counts single-object serialization towards the request's serialize time"""
+    @property
+    def data(self):
+        with serialization_timer():
+            return super().data
+
+
+def _param_list(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return {item.strip() for item in value or () if item.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets and expansion control for read responses.
+
+    ?fields=post_id,media_url  returns only those fields
+    ?expand=comments           adds expandable (nested or costly) fields
+
+    Without ?fields= the usual fields are returned, plus any expandable
+    fields listed in ``default_expand``. Asking to expand a name that isn't
+    in ``expandable_fields`` is a ValidationError (400), so a typo doesn't
+    silently return the short form. Fields that are dropped are removed
+    before serialization, so their SerializerMethodFields never run; views
+    use selected_fields() to skip the matching prefetches and lookups.
+    The values can also be passed in the serializer context as
+    ``fields``/``expand``.
+    """
+    # name -> serializer class for a nested representation, or None when the
+    # field is already declared and only needs opting in
+    expandable_fields = {}
+    default_expand = ()
+
+    @classmethod
+    def _field_params(cls, context):
+        request = context.get('request')
+        params = getattr(request, 'query_params', None) or getattr(request, 'GET', {})
+        requested = _param_list(context.get('fields', params.get('fields')))
+        expand = _param_list(context.get('expand', params.get('expand')))
+        unknown = expand - set(cls.expandable_fields)
+        if unknown:
+            allowed = ', '.join(sorted(cls.expandable_fields)) or 'none'
+            raise serializers.ValidationError(
+                {'expand': [f"Cannot expand {', '.join(sorted(unknown))} (expandable: {allowed})"]}
+            )
+        return requested, expand
+
+    @classmethod
+    def selected_fields(cls, context):
+        """Names of the fields a serializer with this context will output"""
+        requested, expand = cls._field_params(context)
+        opt_in = {name for name, nested in cls.expandable_fields.items() if nested is None}
+        if requested:
+            selected = requested & set(cls.Meta.fields)
+        else:
+            selected = (set(cls.Meta.fields) - opt_in) | (set(cls.default_expand) & opt_in)
+        return selected | expand
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'data' in kwargs:
+            return  # Input serializers keep every field
+        selected = self.selected_fields(self.context)
+        for name in list(self.fields):
+            if name not in selected and not self.fields[name].write_only:
+                self.fields.pop(name)
+        _, expand = self._field_params(self.context)
+        for name in expand:
+            nested = self.expandable_fields[name]
+            if nested is not None:
+                self.fields[name] = nested(read_only=True)
+
+
 class CommentSerializer(serializers.ModelSerializer):
     post_id = serializers.CharField(source='post.post_id', read_only=True)
     
@@ -17,7 +102,7 @@ from rest_framework import serializers
 from .models import Post, Comment, Story, Like
 import hashlib
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     comments = CommentSerializer(many=True, read_only=True)
     media_url = serializers.SerializerMethodField()
     avatar_url = serializers.SerializerMethodField()
@@ -34,6 +119,17 @@ class PostSerializer(serializers.ModelSerializer):
             'created_at', 'comments', 'liked_by_user'
         ]
         read_only_fields = ['created_at', 'post_id']
+        list_serializer_class = TimedListSerializer
+
+    expandable_fields = {'comments': None}
+    default_expand = ('comments',)
+
+    @classmethod
+    def setup_queryset(cls, queryset, selected):
+        """Prefetch only what the selected fields will read"""
+        if 'comments' in selected:
+            queryset = queryset.prefetch_related('comments')
+        return queryset
 
     def get_media_url(self, obj):
         if not obj.media_file:
@@ -48,6 +144,11 @@ class PostSerializer(serializers.ModelSerializer):
         return f"https://www.gravatar.com/avatar/{email_hash}?d=mp&s=150"
     
     def get_liked_by_user(self, obj):
+        # Views that already fetched the user's likes pass them in context
+        liked_post_ids = self.context.get('liked_post_ids')
+        if liked_post_ids is not None:
+            return obj.pk in liked_post_ids
+
         # Get username from request context
         request = self.context.get('request')
         username = None
@@ -75,13 +176,14 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at']
 
 
-class StorySerializer(serializers.ModelSerializer):
+class StorySerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     media_url = serializers.SerializerMethodField()
     avatar_url = serializers.SerializerMethodField()
     media_file = serializers.FileField(write_only=True)
     story_id = serializers.CharField(read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
     expires_at = serializers.DateTimeField(read_only=True)
+    seen = serializers.SerializerMethodField()
 
     class Meta:
         model = Story
@@ -93,9 +195,14 @@ class StorySerializer(serializers.ModelSerializer):
             'media_url',
             'avatar_url',
             'created_at',
-            'expires_at'
+            'expires_at',
+            'seen'
         ]
         read_only_fields = ['created_at', 'story_id', 'expires_at']
+        list_serializer_class = TimedListSerializer
+
+    # The author is plain username/email on the row: nothing to expand
+    expandable_fields = {}
 
     def get_media_url(self, obj):
         if not obj.media_file:
@@ -108,14 +215,26 @@ class StorySerializer(serializers.ModelSerializer):
     def get_avatar_url(self, obj):
         email_hash = hashlib.md5(obj.email.lower().encode('utf-8')).hexdigest()
         return f"https://www.gravatar.com/avatar/{email_hash}?d=mp&s=150"
-    
+
+    def get_seen(self, obj):
+        # Set by storyseen.tray_order when the listing has a viewer
+        return getattr(obj, 'seen', None)
+
 
 
 
 from rest_framework import serializers
 from .models import Recipe
+from authentication.models import GoogleUser
 
-class RecipeSerializer(serializers.ModelSerializer):
+
+class RecipeAuthorSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = GoogleUser
+        fields = ['id', 'name', 'email', 'photo_url']
+
+
+class RecipeSerializer(TimedSerializerMixin, SparseFieldsMixin, serializers.ModelSerializer):
     author_name = serializers.ReadOnlyField(source='author.name')
     author_email = serializers.ReadOnlyField(source='author.email')
     image_url = serializers.SerializerMethodField()
@@ -125,9 +244,21 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'ingredients', 'instructions',
             'cuisine', 'total_time_mins', 'image', 'image_url',
-            'author', 'author_name', 'author_email', 'created_at'
+            'author', 'author_name', 'author_email', 'created_at',
+            'kcal', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g'
         ]
-        read_only_fields = ['author']
+        read_only_fields = ['author', 'kcal', 'protein_g', 'carbs_g', 'fat_g', 'fiber_g']
+        list_serializer_class = TimedListSerializer
+
+    # ?expand=author replaces the author id with the author object
+    expandable_fields = {'author': RecipeAuthorSerializer}
+
+    @classmethod
+    def setup_queryset(cls, queryset, selected):
+        """Join the author only when an author field is selected"""
+        if selected & {'author', 'author_name', 'author_email'}:
+            queryset = queryset.select_related('author')
+        return queryset
 
     def get_image_url(self, obj):
         if obj.image:
@@ -0,0 +1,168 @@
+# home/signals.py
+"""
+Model signal handlers, connected in HomeConfig.ready().
+
+Every create/update/delete of Post, Comment, Like, SavedPost and Follow
+appends a ChangeLog entry for delta sync (except saves limited to a
+counter, like Post.likes); new posts, likes, comments and saves (and
+their removal) update the trending index; saving a Post re-indexes its
+hashtags and mentions (unless the caption was left out of update_fields);
+new accounts, post authors and follows keep the user search index
+current; new likes, comments, saves and follows are merged into the
+recipient's activity feed; recipes get their nutrition recomputed when the
+ingredients change, and new ones queue a similar-recipes update;
+deleting a Post, Story or Recipe queues removal of its media files. Bulk
+operations (bulk_create, QuerySet.update) bypass signals.
+"""
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from authentication.models import GoogleUser
+
+from .models import Post, Comment, Like, SavedPost, Follow, Story, Recipe, ChangeLog, UserIndex
+from .tasks import delete_media_files, update_recipe_similarity
+from . import activity, nutrition, trending
+from .tags import index_post
+from .usersearch import index_user, adjust_followers
+
+
+def change_ref(instance):
+    """(entity, natural key, ref fields) for a synced instance"""
+    if isinstance(instance, Post):
+        return 'post', instance.post_id, {'post_id': instance.post_id}
+    if isinstance(instance, Comment):
+        return 'comment', str(instance.pk), {'id': instance.pk, 'post_id': instance.post.post_id}
+    if isinstance(instance, Like):
+        ref = {'post_id': instance.post.post_id, 'username': instance.username}
+        return 'like', f"{ref['post_id']}:{instance.username}", ref
+    if isinstance(instance, SavedPost):
+        ref = {'post_id': instance.post.post_id, 'username': instance.username}
+        return 'savedpost', f"{ref['post_id']}:{instance.username}", ref
+    ref = {'follower': instance.follower, 'following': instance.following}
+    return 'follow', f"{instance.follower}:{instance.following}", ref
+
+
+SYNCED_MODELS = (Post, Comment, Like, SavedPost, Follow)
+
+# Denormalised counters: a save that only touches these is not a change to
+# sync (the like itself has its own entry)
+COUNTER_FIELDS = {Post: {'likes'}}
+
+
+def _deleting_posts(origin):
+    return isinstance(origin, Post) or (isinstance(origin, QuerySet) and origin.model is Post)
+
+
+@receiver(post_save)
+def log_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if sender in SYNCED_MODELS and not raw:
+        if update_fields is not None and update_fields <= COUNTER_FIELDS.get(sender, set()):
+            return
+        entity, key, ref = change_ref(instance)
+        ChangeLog.record(entity, key, ChangeLog.UPSERT, **ref)
+
+
+@receiver(post_delete)
+def log_delete(sender, instance, origin=None, **kwargs):
+    if sender in SYNCED_MODELS:
+        if sender is not Post and _deleting_posts(origin):
+            # Cascade from a post delete: the post's tombstone covers its
+            # comments, likes and saves
+            return
+        entity, key, ref = change_ref(instance)
+        ChangeLog.record(entity, key, ChangeLog.DELETE, **ref)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Story)
+def delete_upload(sender, instance, **kwargs):
+    if instance.media_file:
+        delete_media_files.enqueue([instance.media_file.name])
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image(sender, instance, **kwargs):
+    if instance.image:
+        delete_media_files.enqueue([instance.image.name])
+
+
+TRENDING_EVENTS = {Post: 'post', Like: 'like', Comment: 'comment', SavedPost: 'save'}
+
+
+@receiver(post_save)
+def trending_on_save(sender, instance, created=False, raw=False, **kwargs):
+    kind = TRENDING_EVENTS.get(sender)
+    if kind and created and not raw:
+        post_id = instance.pk if sender is Post else instance.post_id
+        trending.record_event(post_id, kind, instance.created_at)
+
+
+@receiver(post_delete)
+def trending_on_delete(sender, instance, origin=None, **kwargs):
+    kind = TRENDING_EVENTS.get(sender)
+    if kind and sender is not Post and not _deleting_posts(origin):
+        trending.record_event(instance.post_id, kind, instance.created_at, retract=True)
+
+
+@receiver(post_save, sender=Post)
+def index_post_tags(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw and (update_fields is None or 'caption' in update_fields):
+        index_post(instance)
+
+
+@receiver(post_save, sender=GoogleUser)
+def index_google_user(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_user(instance.name, instance.name, instance.email, instance.photo_url)
+
+
+@receiver(post_delete, sender=GoogleUser)
+def unindex_google_user(sender, instance, **kwargs):
+    # Authors keep showing up in search for as long as they have posts
+    if not Post.objects.filter(username=instance.name).exists():
+        UserIndex.objects.filter(username=instance.name).delete()
+
+
+@receiver(post_save, sender=Post)
+def index_post_author(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw and not UserIndex.objects.filter(username=instance.username).exists():
+        index_user(instance.username, email=instance.email)
+
+
+# counted=True: the sender (mutations.set_follow) has adjusted the count itself
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created=False, raw=False, counted=False, **kwargs):
+    if created and not raw and not counted:
+        adjust_followers(instance.following, 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_unfollow(sender, instance, counted=False, **kwargs):
+    if not counted:
+        adjust_followers(instance.following, -1)
+
+
+ACTIVITY_MODELS = (Like, Comment, SavedPost, Follow)
+
+
+@receiver(post_save)
+def activity_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if sender in ACTIVITY_MODELS and created and not raw:
+        activity.record_instance(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def queue_recipe_similarity(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        # Delayed so a burst of new recipes is folded in by one run, which
+        # also picks up recipes added while it waits in the queue
+        update_recipe_similarity.enqueue_once(delay=10)
+
+
+@receiver(pre_save, sender=Recipe)
+def fill_recipe_nutrition(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'ingredients' not in update_fields):
+        return
+    if nutrition.np is not None:
+        nutrition.apply([instance])
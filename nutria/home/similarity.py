@@ -0,0 +1,346 @@
+# home/similarity.py
+"""
+"More like this" for recipes.
+
+Each recipe becomes a sparse TF-IDF vector over the words of its title and
+ingredients plus its cuisine. Words are hashed into N_FEATURES columns
+(crc32, stable across processes) instead of kept in a vocabulary, so
+recipes added later map into the same space. Rows are L2-normalised; the
+cosine similarity of a block of recipes against all of them is one matrix
+product, and the top K of each row is picked out without sorting it.
+
+The K nearest neighbours of every recipe are stored in RecipeSimilar and
+served from there. ``rebuild()`` recomputes everything
+(``manage.py rebuild_recipe_similarity``); ``update()`` runs after a recipe
+is added (the ``update_recipe_similarity`` task): it vectorizes only the
+new recipes, appends them to the term matrix saved in
+RECIPE_SIMILARITY_INDEX, stores their neighbours and splices them into the
+lists of existing recipes they now beat. IDF weights drift a little
+between rebuilds; edits to a recipe, and the gaps deleted recipes leave in
+other lists, are only picked up by a rebuild.
+
+Both read, extend and rewrite the index file, so they hold an exclusive
+lock on ``<index>.lock`` for the whole run: a second worker (or a manual
+rebuild) waits, then finds the recipes already folded in. The lock is
+released by the kernel if the process dies.
+
+Needs NumPy and SciPy; import this module lazily.
+"""
+import fcntl
+import os
+import re
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from scipy import sparse
+
+from .models import Recipe, RecipeSimilar
+
+N_FEATURES = 2 ** 20
+
+TOP_K = 10
+
+# Scores computed at once (rows x recipes); bounds memory use
+SCORE_BLOCK_CELLS = 2 ** 25
+
+# Largest recipes x used-features float32 matrix scored with dense products
+DENSE_CORPUS_BYTES = 256 * 2 ** 20
+
+FIELD_WEIGHTS = {'title': 2.0, 'ingredients': 1.0, 'cuisine': 3.0}
+
+# Features in more than this share of recipes (salt, oil, water) say nothing
+MAX_DF = 0.5
+
+WORD_RE = re.compile(r'[a-z]+')
+
+STOPWORDS = {
+    'and', 'for', 'the', 'with', 'into', 'cup', 'cups', 'tbsp', 'tsp', 'tablespoon', 'tablespoons',
+    'teaspoon', 'teaspoons', 'gram', 'grams', 'kg', 'ml', 'litre', 'liter', 'ounce', 'ounces', 'lb',
+    'lbs', 'pinch', 'handful', 'large', 'small', 'medium', 'chopped', 'sliced', 'diced', 'minced',
+    'fresh', 'optional', 'taste', 'piece', 'pieces', 'clove', 'cloves',
+}
+
+
+def index_path():
+    return getattr(settings, 'RECIPE_SIMILARITY_INDEX', os.path.join(settings.BASE_DIR, 'recipe_similarity.npz'))
+
+
+def words(text):
+    return [word for word in WORD_RE.findall(text.lower()) if len(word) > 2 and word not in STOPWORDS]
+
+
+def _column(feature):
+    return zlib.crc32(feature.encode()) % N_FEATURES
+
+
+def features(title, ingredients, cuisine):
+    """{column: weighted term count} for one recipe"""
+    counts = Counter()
+    for field, text in (('title', title), ('ingredients', ingredients)):
+        for word in words(text):
+            counts[_column(word)] += FIELD_WEIGHTS[field]
+    if cuisine.strip():
+        counts[_column(f'cuisine:{cuisine.strip().lower()}')] += FIELD_WEIGHTS['cuisine']
+    return counts
+
+
+def term_matrix(docs):
+    """Raw term counts (CSR, one row per (title, ingredients, cuisine) doc)"""
+    indptr, indices, data = [0], [], []
+    for title, ingredients, cuisine in docs:
+        counts = features(title, ingredients, cuisine)
+        indices.extend(counts.keys())
+        data.extend(counts.values())
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(indptr) - 1, N_FEATURES),
+    )
+    matrix.sort_indices()
+    return matrix
+
+
+def document_frequency(counts):
+    return np.bincount(counts.indices, minlength=N_FEATURES).astype(np.int64)
+
+
+def weigh(counts, df=None):
+    """TF-IDF rows (sublinear tf, smoothed idf), L2-normalised"""
+    total = counts.shape[0]
+    df = document_frequency(counts) if df is None else df
+    idf = np.log((1 + total) / (1 + df)).astype(np.float32) + 1
+    if total >= 20:
+        idf[df > MAX_DF * total] = 0
+    weighted = counts.copy()
+    weighted.data = np.log1p(weighted.data) * idf[weighted.indices]
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags((1 / norms).astype(np.float32)) @ weighted).tocsr()
+
+
+def _best(scores, k):
+    """Top ``k`` positive entries of each row of a dense score block"""
+    rows_count, width = scores.shape
+    floor = np.zeros(rows_count, dtype=scores.dtype)
+    if width > k:
+        # The k-th best of a column sample is a lower bound for the k-th
+        # best overall, so only the few entries above it need sorting
+        sample = scores[:, ::max(1, width // (k * 200))]
+        if sample.shape[1] > k:
+            floor = np.partition(sample, -k, axis=1)[:, -k]
+    floor = np.maximum(floor, np.finfo(scores.dtype).tiny)
+    rows, columns = np.nonzero(scores >= floor[:, None])
+    values = scores[rows, columns]
+    order = np.lexsort((-values, rows))
+    rows, columns, values = rows[order], columns[order], values[order]
+    bounds = np.searchsorted(rows, np.arange(rows_count + 1))
+    return [(columns[lo:min(hi, lo + k)], values[lo:min(hi, lo + k)]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def top_k(queries, corpus, k=TOP_K, query_rows=None):
+    """
+    For each row of ``queries``, the ``k`` most similar rows of ``corpus``
+    as (row indices, scores) arrays, best first; rows scoring 0 are left
+    out. ``query_rows`` gives each query's own row in ``corpus`` so it is
+    skipped.
+
+    When the corpus restricted to the features it uses fits in
+    DENSE_CORPUS_BYTES, scores are dense BLAS products; otherwise sparse
+    products, block by block.
+    """
+    used = np.unique(corpus.indices)
+    queries, corpus = queries[:, used], corpus[:, used]
+    count = corpus.shape[0]
+    dense = count * len(used) * 4 <= DENSE_CORPUS_BYTES
+    corpus_t = np.ascontiguousarray(corpus.T.toarray()) if dense else corpus.T.tocsr()
+    block_rows = max(1, SCORE_BLOCK_CELLS // max(count, 1))
+    results = []
+    for start in range(0, queries.shape[0], block_rows):
+        block = queries[start:start + block_rows]
+        scores = block.toarray() @ corpus_t if dense else (block @ corpus_t).toarray()
+        if query_rows is not None:
+            scores[np.arange(scores.shape[0]), query_rows[start:start + block_rows]] = 0
+        results.extend(_best(scores, k))
+    return results
+
+
+class Index:
+    """Recipe ids, raw term counts and document frequencies, kept on disk"""
+
+    def __init__(self, ids, counts, df):
+        self.ids, self.counts, self.df = ids, counts, df
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or index_path()
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as stored:
+            counts = sparse.csr_matrix(
+                (stored['data'], stored['indices'], stored['indptr']), shape=(len(stored['ids']), N_FEATURES),
+            )
+            return cls(stored['ids'], counts, stored['df'])
+
+    def save(self, path=None):
+        path = path or index_path()
+        temp = f'{path}.tmp.npz'
+        np.savez(temp, ids=self.ids, data=self.counts.data, indices=self.counts.indices,
+                 indptr=self.counts.indptr, df=self.df)
+        os.replace(temp, path)  # Readers never see a half-written file
+
+    def keep(self, mask):
+        self.ids, self.counts = self.ids[mask], self.counts[mask]
+        self.df = document_frequency(self.counts)
+
+    def append(self, ids, counts):
+        self.ids = np.concatenate([self.ids, ids])
+        self.counts = sparse.vstack([self.counts, counts], format='csr')
+        self.df = self.df + document_frequency(counts)
+
+    def weights(self):
+        return weigh(self.counts, self.df)
+
+
+def fold_in(index, new_ids, new_counts, k=TOP_K):
+    """
+    Append new recipes to ``index``. Returns the new recipes' top ``k``
+    (as from top_k(), over all rows) and the CSR similarity of every
+    existing recipe (rows) to each new one (columns).
+    """
+    old_count = len(index.ids)
+    index.append(new_ids, new_counts)
+    weights = index.weights()
+    new_rows = np.arange(old_count, len(index.ids))
+    neighbours = top_k(weights[new_rows], weights, k, query_rows=new_rows)
+    return neighbours, (weights[:old_count] @ weights[new_rows].T).tocsr()
+
+
+def _docs(queryset):
+    ids, docs = [], []
+    for pk, title, ingredients, cuisine in queryset.values_list('pk', 'title', 'ingredients', 'cuisine').iterator():
+        ids.append(pk)
+        docs.append((title, ingredients, cuisine))
+    return np.asarray(ids, dtype=np.int64), docs
+
+
+def _neighbour_rows(recipe_id, ids, columns, scores):
+    return [
+        RecipeSimilar(recipe_id=recipe_id, similar_id=int(ids[column]), score=float(score), rank=rank)
+        for rank, (column, score) in enumerate(zip(columns, scores)) if score > 0
+    ]
+
+
+def _replace(lists, batch_size=2000, clear=False):
+    """Store {recipe id: [RecipeSimilar]} in place of each recipe's current rows"""
+    recipe_ids = list(lists)
+    rows = [row for recipe_rows in lists.values() for row in recipe_rows]
+    with transaction.atomic():
+        if clear:
+            RecipeSimilar.objects.all().delete()
+        else:
+            for start in range(0, len(recipe_ids), batch_size):
+                RecipeSimilar.objects.filter(recipe_id__in=recipe_ids[start:start + batch_size]).delete()
+        RecipeSimilar.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+@contextmanager
+def _locked():
+    """Hold the index lock; blocks while another process has it"""
+    with open(f'{index_path()}.lock', 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def rebuild(k=TOP_K):
+    """Recompute every recipe's neighbours and rewrite the index; returns stats"""
+    with _locked():
+        return _rebuild(k)
+
+
+def update(k=TOP_K):
+    """Add recipes created since the index was saved; returns stats"""
+    with _locked():
+        index = Index.load()
+        if index is None:
+            return _rebuild(k)
+        return _update(index, k)
+
+
+def _rebuild(k):
+    started = time.perf_counter()
+    ids, docs = _docs(Recipe.objects.order_by('pk'))
+    counts = term_matrix(docs)
+    index = Index(ids, counts, document_frequency(counts))
+    vectorized = time.perf_counter()
+
+    weights = index.weights()
+    neighbours = top_k(weights, weights, k, query_rows=np.arange(len(ids)))
+    ranked = time.perf_counter()
+
+    stored = _replace({
+        int(recipe_id): _neighbour_rows(int(recipe_id), ids, columns, scores)
+        for recipe_id, (columns, scores) in zip(ids, neighbours)
+    }, clear=True)
+    index.save()
+    return {
+        'recipes': len(ids),
+        'rows': stored,
+        'vectorize_s': round(vectorized - started, 3),
+        'top_k_s': round(ranked - vectorized, 3),
+        'store_s': round(time.perf_counter() - ranked, 3),
+    }
+
+
+def _update(index, k):
+    existing = np.fromiter(Recipe.objects.values_list('pk', flat=True).iterator(), dtype=np.int64)
+    alive = np.isin(index.ids, existing)
+    if not alive.all():
+        index.keep(alive)  # Drop deleted recipes
+    new_ids, docs = _docs(Recipe.objects.filter(pk__in=np.setdiff1d(existing, index.ids).tolist()).order_by('pk'))
+    if not len(new_ids):
+        if not alive.all():
+            index.save()
+        return {'recipes': len(index.ids), 'added': 0}
+
+    neighbours, similarity = fold_in(index, new_ids, term_matrix(docs), k)
+    lists = {
+        int(recipe_id): _neighbour_rows(int(recipe_id), index.ids, columns, scores)
+        for recipe_id, (columns, scores) in zip(new_ids, neighbours)
+    }
+
+    # Existing recipes whose lists a new one gets into: those whose best
+    # new score beats their current k-th (or that have fewer than k)
+    best_new = similarity.max(axis=1).toarray().ravel()
+    touched = np.flatnonzero(best_new > 0)
+    kth = dict(
+        RecipeSimilar.objects.filter(recipe_id__in=index.ids[touched].tolist(), rank=k - 1)
+        .values_list('recipe_id', 'score')
+    )
+    beaten = [row for row in touched if best_new[row] > kth.get(int(index.ids[row]), 0)]
+    current = {}
+    rows = RecipeSimilar.objects.filter(recipe_id__in=index.ids[beaten].tolist()).order_by('rank')
+    for recipe_id, similar_id, score in rows.values_list('recipe_id', 'similar_id', 'score'):
+        current.setdefault(recipe_id, []).append((similar_id, score))
+    for row in beaten:
+        recipe_id = int(index.ids[row])
+        lo, hi = similarity.indptr[row], similarity.indptr[row + 1]
+        candidates = current.get(recipe_id, []) + [
+            (int(new_ids[column]), float(score))
+            for column, score in zip(similarity.indices[lo:hi], similarity.data[lo:hi])
+        ]
+        lists[recipe_id] = [
+            RecipeSimilar(recipe_id=recipe_id, similar_id=similar_id, score=score, rank=rank)
+            for rank, (similar_id, score) in enumerate(sorted(candidates, key=lambda item: -item[1])[:k])
+        ]
+    stored = _replace(lists)
+    index.save()
+    return {'recipes': len(index.ids), 'added': len(new_ids), 'updated': len(lists), 'rows': stored}
@@ -0,0 +1,61 @@
+# home/tags.py
+"""
+Hashtag and @mention extraction.
+
+``index_post()`` keeps a post's PostTag and PostMention rows in step with
+its caption; the signal handler calls it on every save and the
+index_post_tags command backfills existing posts. Feeds then read the
+(tag, created_at) / (username, created_at) indexes instead of scanning
+captions.
+"""
+import re
+import unicodedata
+
+from .models import PostTag, PostMention
+
+# "#keto", "#HighProtein" -> keto, highprotein; not "&#39;" or "abc#def"
+HASHTAG_RE = re.compile(r'(?<![\w&#])#(\w{1,100})')
+# "@olivia-haddad-13" -> olivia-haddad-13; not emails ("me@x.com")
+MENTION_RE = re.compile(r'(?<![\w@.])@([\w.-]{1,100})')
+
+
+def normalize_tag(tag):
+    return unicodedata.normalize('NFKC', tag).casefold()
+
+
+def extract_tags(text):
+    """Distinct normalized hashtags in ``text``, in order of appearance"""
+    return list(dict.fromkeys(normalize_tag(tag) for tag in HASHTAG_RE.findall(text or '')))
+
+
+def extract_mentions(text):
+    """Distinct mentioned usernames in ``text`` (trailing punctuation dropped)"""
+    names = (name.rstrip('.-') for name in MENTION_RE.findall(text or ''))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def tag_rows(post):
+    return [PostTag(post=post, tag=tag, created_at=post.created_at) for tag in extract_tags(post.caption)]
+
+
+def mention_rows(post):
+    return [
+        PostMention(post=post, username=name, created_at=post.created_at)
+        for name in extract_mentions(post.caption)
+    ]
+
+
+def index_post(post):
+    """Sync one post's tag and mention rows with its current caption"""
+    for model, field, rows in (
+        (PostTag, 'tag', tag_rows(post)),
+        (PostMention, 'username', mention_rows(post)),
+    ):
+        wanted = {getattr(row, field): row for row in rows}
+        existing = set(model.objects.filter(post=post).values_list(field, flat=True))
+        stale = existing - wanted.keys()
+        if stale:
+            model.objects.filter(post=post, **{f'{field}__in': stale}).delete()
+        new = [row for value, row in wanted.items() if value not in existing]
+        if new:
+            model.objects.bulk_create(new, ignore_conflicts=True)
@@ -0,0 +1,61 @@
+# home/tasks.py
+"""
+Background tasks for the home app, run by ``manage.py runworker``.
+"""
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .jobs import task
+from .models import Post
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+
+
+def thumbnail_name(name):
+    """Storage path of the thumbnail for a media file"""
+    return f"thumbs/{os.path.splitext(name)[0]}.jpg"
+
+
+@task(priority=5, max_attempts=3)
+def make_thumbnail(name):
+    """Write a small JPEG preview of an uploaded image and flag its post (videos are skipped)"""
+    if os.path.splitext(name)[1].lower() not in THUMBNAIL_EXTENSIONS:
+        return
+    if not default_storage.exists(name):
+        return
+
+    from io import BytesIO
+    from PIL import Image
+
+    with default_storage.open(name, 'rb') as fh:
+        image = Image.open(fh)
+        image.thumbnail(THUMBNAIL_SIZE)
+        buffer = BytesIO()
+        image.convert('RGB').save(buffer, 'JPEG', quality=80, optimize=True)
+
+    target = thumbnail_name(name)
+    if default_storage.exists(target):
+        default_storage.delete(target)
+    default_storage.save(target, ContentFile(buffer.getvalue()))
+    Post.objects.filter(media_file=name, has_thumbnail=False).update(has_thumbnail=True)
+
+
+@task(priority=-5)
+def delete_media_files(names):
+    """Remove files (and their thumbnails) left behind by deleted rows"""
+    for name in names:
+        for path in (name, thumbnail_name(name)):
+            if path and default_storage.exists(path):
+                default_storage.delete(path)
+
+
+# A cold index means a full rebuild: ~100 s at 100k recipes on one core
+@task(priority=-2, max_attempts=3, lease=1800)
+def update_recipe_similarity():
+    """Fold recipes added since the last run into the similar-recipe lists"""
+    from . import similarity
+
+    similarity.update()
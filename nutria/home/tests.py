@@ -1,3 +1,1022 @@
-from django.test import TestCase
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Count, F, QuerySet
+from django.db.models.signals import post_save
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from authentication.models import GoogleUser
+from nutria import db_router, warmup
+
+from . import activity, admin as home_admin, idempotency, jobs, nutrition, realtime, rollups, similarity, storyseen, trending, usersearch
+from .models import ActivityGroup, Post, Comment, Like, Follow, SavedPost, Story, StorySeen, Recipe, RecipeSimilar, ChangeLog, Job, RollupCheckpoint, TrendingScore, UserIndex
+from .mutations import set_saved
+from .tasks import make_thumbnail, update_recipe_similarity
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], DATABASE_STICKY_SECONDS=5)
+class PrimaryStickinessTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = db_router.PrimaryReplicaRouter()
+        # Writes outside a request (fixtures in other tests) pin the context
+        self.addCleanup(db_router._pinned.reset, db_router._pinned.set(False))
+
+    def run_view(self, request, view):
+        seen = {}
+
+        def get_response(request):
+            seen['before'] = self.router.db_for_read(Post)
+            view()
+            seen['after'] = self.router.db_for_read(Post)
+            return HttpResponse()
+
+        response = db_router.PrimaryStickinessMiddleware(get_response)(request)
+        return response, seen
+
+    def test_get_reads_from_replica(self):
+        response, seen = self.run_view(self.factory.get('/api/posts/'), lambda: None)
+        self.assertEqual(seen, {'before': 'replica1', 'after': 'replica1'})
+        self.assertNotIn(db_router.STICKY_COOKIE, response.cookies)
+
+    def test_write_pins_rest_of_request_and_sets_cookie(self):
+        response, seen = self.run_view(
+            self.factory.get('/api/posts/'), lambda: self.router.db_for_write(Post)
+        )
+        self.assertEqual(seen, {'before': 'replica1', 'after': 'default'})
+        self.assertGreater(float(response.cookies[db_router.STICKY_COOKIE].value), time.time())
+
+    def test_unsafe_method_is_pinned(self):
+        _, seen = self.run_view(self.factory.post('/api/posts/'), lambda: None)
+        self.assertEqual(seen['before'], 'default')
+
+    def test_sticky_cookie_pins_reads(self):
+        request = self.factory.get('/api/posts/')
+        request.COOKIES[db_router.STICKY_COOKIE] = str(time.time() + 5)
+        _, seen = self.run_view(request, lambda: None)
+        self.assertEqual(seen['before'], 'default')
+
+    def test_expired_cookie_reads_from_replica(self):
+        request = self.factory.get('/api/posts/')
+        request.COOKIES[db_router.STICKY_COOKIE] = str(time.time() - 1)
+        _, seen = self.run_view(request, lambda: None)
+        self.assertEqual(seen['before'], 'replica1')
+
+    def test_state_does_not_leak_between_requests(self):
+        self.run_view(self.factory.post('/api/posts/'), lambda: self.router.db_for_write(Post))
+        self.assertFalse(db_router.is_pinned())
+        _, seen = self.run_view(self.factory.get('/api/posts/'), lambda: None)
+        self.assertEqual(seen['before'], 'replica1')
+
+    def test_async_view_write_in_thread_pins_and_sets_cookie(self):
+        seen = {}
+
+        async def get_response(request):
+            seen['before'] = self.router.db_for_read(Post)
+            # The async ORM runs queries through sync_to_async like this
+            await sync_to_async(self.router.db_for_write)(Post)
+            seen['after'] = await sync_to_async(self.router.db_for_read)(Post)
+            return HttpResponse()
+
+        middleware = db_router.PrimaryStickinessMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(self.factory.get('/api/async/posts/')))
+        self.assertEqual(seen, {'before': 'replica1', 'after': 'default'})
+        self.assertIn(db_router.STICKY_COOKIE, response.cookies)
+        self.assertFalse(db_router.is_pinned())
+
+
+class SqliteConcurrentModeTests(SimpleTestCase):
+    def wrapper(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'db.sqlite3')
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict, 'NAME': self.path, 'OPTIONS': settings.SQLITE_CONCURRENT_OPTIONS,
+        }, alias='concurrent')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def other(self):
+        other = sqlite3.connect(self.path, timeout=0, isolation_level=None)
+        self.addCleanup(other.close)
+        return other
+
+    def test_fresh_connection_uses_wal_and_immediate_transactions(self):
+        wrapper = self.wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+        # Start a transaction the way atomic() does; the write lock is taken
+        # at BEGIN, before anything is written
+        wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        self.addCleanup(wrapper.set_autocommit, True)
+        self.addCleanup(wrapper.rollback)
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+            self.other().execute('BEGIN IMMEDIATE')
+
+    def test_read_snapshot_does_not_take_the_write_lock(self):
+        wrapper = self.wrapper()
+        connections['concurrent'] = wrapper
+        self.addCleanup(connections.__delitem__, 'concurrent')
+        other = self.other()
+        other.execute('CREATE TABLE t (x)')
+        with db_router.read_snapshot('concurrent'), wrapper.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM t')
+            self.assertEqual(cursor.fetchone()[0], 0)
+            other.execute('BEGIN IMMEDIATE')
+            other.execute('INSERT INTO t VALUES (1)')
+            other.execute('COMMIT')
+            # Still the snapshot taken by the first read
+            cursor.execute('SELECT COUNT(*) FROM t')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+
+
+class RequestMetricsTests(TestCase):
+    ROUTE = 'route="api/users/<str:username>/posts/",method="GET"'
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def sample(self, samples, name, extra=''):
+        return samples.get(f'{name}{{{self.ROUTE}{extra}}}', 0)
+
+    def test_view_is_counted_and_exported(self):
+        Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/p.jpg')
+        before = self.scrape()
+        response = self.client.get('/api/users/ana/posts/', HTTP_X_SERVER_TIMING='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, total;dur=[\d.]+$')
+        after = self.scrape()
+
+        def delta(name, extra=''):
+            return self.sample(after, name, extra) - self.sample(before, name, extra)
+
+        for name in ('nutria_request_duration_seconds', 'nutria_sql_queries', 'nutria_response_size_bytes'):
+            self.assertEqual(delta(f'{name}_count'), 1)
+            self.assertEqual(delta(f'{name}_bucket', ',le="+Inf"'), 1)
+        # The view reads the page of posts and their comment counts
+        self.assertGreaterEqual(delta('nutria_sql_queries_sum'), 2)
+        self.assertEqual(delta('nutria_response_size_bytes_sum'), len(response.content))
+        self.assertGreater(delta('nutria_request_duration_seconds_sum'), 0)
+        # Buckets are cumulative
+        buckets = [value for name, value in after.items()
+                   if name.startswith(f'nutria_sql_queries_bucket{{{self.ROUTE}')]
+        self.assertEqual(buckets, sorted(buckets))
+
+    def test_server_timing_is_opt_in(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/users/ana/posts/'))
+
+
+class WarmUpTests(TestCase):
+    def test_steps_run_without_errors(self):
+        nutrition.table.cache_clear()
+        with self.assertNoLogs('nutria.warmup', 'ERROR'):
+            self.assertEqual(list(warmup.warm_up(databases=False)), ['imports', 'urls', 'serializers', 'reference'])
+        self.assertEqual(nutrition.table.cache_info().currsize, 1)
+
+    def test_primes_trending_feed_and_user_search(self):
+        Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/p.jpg')
+        with self.assertNoLogs('nutria.warmup', 'ERROR'), CaptureQueriesContext(connection) as queries:
+            timings = warmup.warm_up()
+        self.assertEqual(list(timings)[-2:], ['databases', 'queries'])
+        sql = [query['sql'] for query in queries.captured_queries]
+        for table in ('home_trendingscore', 'home_post', 'home_usersearchtoken'):
+            self.assertTrue(any(f'FROM "{table}"' in statement for statement in sql), table)
+        self.assertTrue(any('ORDER BY "home_post"."created_at" DESC' in statement for statement in sql))
+
+
+class ImportResumeTests(TestCase):
+    def setUp(self):
+        author = GoogleUser.objects.create(name='Ana', email='ana@example.com')
+        now = timezone.now()
+        for index in range(3):
+            post = Post.objects.create(username='ana', email=author.email, media_file=f'users/ana/p{index}.jpg')
+            Like.objects.create(post=post, username='ben')
+            for _ in range(2):
+                Comment.objects.create(post=post, username='ben', text='same text')
+        Follow.objects.create(follower='ben', following='ana')
+        for index in range(2):
+            Recipe.objects.create(
+                title='Soup', ingredients='1 cup rice', instructions='Boil.', author=author,
+                created_at=now - timedelta(days=index),
+            )
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'dump.jsonl')
+        call_command('export_data', output=self.path, stdout=StringIO(), stderr=StringIO())
+        self.expected = self.counts()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def counts(self):
+        return {model.__name__: model.objects.count() for model in (Post, Comment, Like, Follow, Recipe)}
+
+    def import_data(self, *args):
+        out = StringIO()
+        call_command('import_data', self.path, '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_rerun_adds_nothing(self):
+        output = self.import_data()
+        self.assertEqual(self.counts(), self.expected)
+        self.assertIn(f"already present: {sum(self.expected.values())}", output)
+        self.assertNotIn('comment: 6', output)
+
+    def test_import_into_empty_database(self):
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        Recipe.objects.all().delete()
+        output = self.import_data()
+        self.assertEqual(self.counts(), self.expected)
+        self.assertIn('comment: 6', output)
+        self.assertNotIn('already present', output)
+
+    def test_resume_replaying_committed_batch(self):
+        Comment.objects.all().delete()
+        Recipe.objects.all().delete()
+        self.import_data()
+        # A crash after a batch commits but before its checkpoint is written
+        with open(f'{self.path}.checkpoint', 'w') as fh:
+            fh.write('5')
+        self.import_data('--resume')
+        self.assertEqual(self.counts(), self.expected)
+        self.assertFalse(os.path.exists(f'{self.path}.checkpoint'))
+
+
+class ListStreamingTests(TestCase):
+    def setUp(self):
+        for index in range(3):
+            Post.objects.create(username='ana', email='ana@example.com', media_file=f'users/ana/p{index}.jpg')
+
+    def test_short_list_is_not_streamed(self):
+        response = self.client.get('/api/posts/')
+        self.assertFalse(response.streaming)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_stream_opt_in(self):
+        response = self.client.get('/api/posts/', {'stream': '1'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 3)
+
+    @override_settings(STREAM_MIN_ROWS=2)
+    def test_long_list_is_streamed(self):
+        self.assertTrue(self.client.get('/api/posts/').streaming)
+
+
+class ChangeLogTests(TestCase):
+    def test_counter_only_save_is_not_logged(self):
+        post = Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/p.jpg')
+        logged = ChangeLog.objects.count()
+        post.likes = 5
+        post.save(update_fields=['likes'])
+        self.assertEqual(ChangeLog.objects.count(), logged)
+        post.caption = 'Edited'
+        post.save()
+        self.assertEqual(ChangeLog.objects.count(), logged + 1)
+
+
+class JobLeaseAndPruneTests(TestCase):
+    def running(self, task, seconds_ago):
+        return Job.objects.create(
+            task=task, status=Job.RUNNING, attempts=1, run_at=timezone.now(),
+            locked_by='w', locked_at=timezone.now() - timedelta(seconds=seconds_ago),
+        )
+
+    def test_task_lease_overrides_worker_lease(self):
+        jobs.load_tasks()
+        long_job = self.running(update_recipe_similarity.name, 400)
+        short_job = self.running(make_thumbnail.name, 400)
+        self.assertEqual(jobs.requeue_stale(300), 1)
+        long_job.refresh_from_db()
+        short_job.refresh_from_db()
+        self.assertEqual((long_job.status, short_job.status), (Job.RUNNING, Job.QUEUED))
+
+    def test_overrun_worker_cannot_finish_a_reclaimed_job(self):
+        calls = []
+        noop = jobs.task(name='home.tests.noop')(lambda: calls.append(1))
+        noop.enqueue()
+        first = jobs.claim_job('w1')
+        Job.objects.filter(pk=first.pk).update(locked_at=timezone.now() - timedelta(seconds=400))
+        self.assertEqual(jobs.requeue_stale(300), 1)
+        # The same worker claims it again: only the lease token tells the runs apart
+        second = jobs.claim_job('w1')
+        self.assertEqual((second.pk, second.attempts), (first.pk, 2))
+        self.assertNotEqual(second.lease_token, first.lease_token)
+
+        with self.assertLogs('home.jobs', 'WARNING'):
+            self.assertFalse(jobs.run_job(first))
+        job = Job.objects.get(pk=first.pk)
+        self.assertEqual((job.status, job.lease_token), (Job.RUNNING, second.lease_token))
+        self.assertTrue(jobs.run_job(second))
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.DONE)
+        self.assertEqual(len(calls), 2)
+
+    def test_prune_keeps_recent_and_queued_jobs(self):
+        now = timezone.now()
+        for status, days in [(Job.DONE, 10), (Job.DONE, 1), (Job.FAILED, 10), (Job.QUEUED, 10)]:
+            Job.objects.create(
+                task='t', status=status, run_at=now,
+                finished_at=None if status == Job.QUEUED else now - timedelta(days=days),
+            )
+        call_command('prune_jobs', '--keep-days', '7', '--keep-failed-days', '30', stdout=StringIO())
+        self.assertEqual(
+            sorted(Job.objects.values_list('status', flat=True)), [Job.DONE, Job.FAILED, Job.QUEUED]
+        )
+
+
+class RollupCheckpointTests(TestCase):
+    def test_empty_run_refreshes_checkpoint(self):
+        rollups.run_rollups()
+        RollupCheckpoint.objects.update(updated_at=timezone.now() - timedelta(days=1))
+        rollups.run_rollups()
+        self.assertGreater(rollups.last_rolled_up(), timezone.now() - timedelta(minutes=1))
+
+
+class CommentAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        post = Post.objects.create(username='ana', email='ana@example.com', media_file='users/a.jpg')
+        self.comments = [
+            Comment.objects.create(post=post, username=username, text=text)
+            for username, text in [
+                ('ben', 'Loved the Tomato soup'), ('cy', 'tomatoes again?'), ('tomas', 'nice'), ('dee', 'meh'),
+            ]
+        ]
+
+    def changelist(self, **params):
+        return self.client.get('/admin/home/comment/', params).context['cl']
+
+    def found(self, term):
+        return {comment.username for comment in self.changelist(q=term).result_list}
+
+    def test_unfiltered_count_is_estimated(self):
+        # MAX(pk) stands in for COUNT(*), so a deleted row still counts
+        Comment.objects.filter(pk=self.comments[1].pk).delete()
+        self.assertEqual(self.changelist().result_count, self.comments[-1].pk)
+        self.assertEqual(self.changelist().paginator.count, self.comments[-1].pk)
+
+    def test_filtered_count_is_capped(self):
+        with mock.patch.object(home_admin, 'COUNT_CAP', 1):
+            self.assertEqual(self.changelist(q='tom').result_count, 1)
+
+    def test_search_matches_text_anywhere_and_username_prefix(self):
+        self.assertEqual(self.found('TOMATO'), {'ben', 'cy'})
+        self.assertEqual(self.found('tom'), {'ben', 'cy', 'tomas'})
+        # Too short for the trigram index: username prefix only
+        self.assertEqual(self.found('me'), set())
+        self.assertEqual(self.found('de'), {'dee'})
+
+    def test_text_index_follows_edits_and_deletes(self):
+        Comment.objects.filter(pk=self.comments[3].pk).update(text='tomato, finally')
+        self.comments[0].delete()
+        self.assertEqual(self.found('tomato'), {'cy', 'dee'})
+        self.assertEqual(self.found('"soup'), set())
+
+
+class PostLikeQueryTests(TestCase):
+    def test_like_does_not_reindex_tags(self):
+        post = Post.objects.create(
+            username='ana', email='ana@example.com', media_file='users/ana/p.jpg', caption='#soup @ben',
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f'/api/posts/{post.post_id}/like/', {'username': 'ben'}, content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries if 'home_posttag' in q['sql'] or 'home_postmention' in q['sql']])
+        self.assertEqual(Post.objects.get(pk=post.pk).likes, 1)
+
+
+class UserSearchRankingTests(TestCase):
+    def setUp(self):
+        for index in range(usersearch.CANDIDATE_LIMIT + 10):
+            usersearch.index_user(f'sam-{index:03d}')
+        # Alphabetically last, so outside the first CANDIDATE_LIMIT tokens
+        usersearch.adjust_followers(f'sam-{usersearch.CANDIDATE_LIMIT + 9:03d}', 50)
+
+    def test_most_followed_match_ranks_first(self):
+        users, has_more = usersearch.search_users('sam', 0, 5)
+        self.assertEqual(users[0].username, f'sam-{usersearch.CANDIDATE_LIMIT + 9:03d}')
+        self.assertTrue(has_more)
+
+    def test_pages_past_candidate_limit(self):
+        users, has_more = usersearch.search_users('sam', usersearch.CANDIDATE_LIMIT, 20)
+        self.assertEqual(len(users), 10)
+        self.assertFalse(has_more)
+
+    def test_exact_beats_prefix_beats_email(self):
+        usersearch.index_user('liam')
+        usersearch.index_user('liamson')
+        usersearch.index_user('zed', email='liam@example.com')
+        usersearch.index_user('kit', email='liamkit@example.com')
+        usersearch.adjust_followers('liamson', 10)
+        users, _ = usersearch.search_users('liam', 0, 10)
+        self.assertEqual([user.username for user in users], ['liam', 'liamson', 'zed', 'kit'])
+
+    def test_common_prefix_walk_matches_sorted_ranking(self):
+        for index in range(30):
+            usersearch.index_user(f'mia{index:02d}')
+            usersearch.adjust_followers(f'mia{index:02d}', index % 7)
+        expected = [
+            user.username for user in
+            UserIndex.objects.filter(username__startswith='mia').order_by('-followers', 'pk')
+        ]
+        for sort_limit in (usersearch.RANGE_SORT_LIMIT, 1):
+            with self.subTest(sort_limit=sort_limit), mock.patch.object(usersearch, 'RANGE_SORT_LIMIT', sort_limit):
+                first, more = usersearch.search_users('mi', 0, 20)
+                rest, last = usersearch.search_users('mi', 20, 20)
+                self.assertEqual([user.username for user in first + rest], expected)
+                self.assertEqual((more, last), (True, False))
+
+
+class TrendingScoreTests(TestCase):
+    def setUp(self):
+        self.post = Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/p.jpg')
+        TrendingScore.objects.all().delete()
+        self.half_life = timedelta(seconds=trending.half_life_seconds())
+        self.when = trending.EPOCH + 10 * self.half_life
+
+    def score(self):
+        return TrendingScore.objects.get(post=self.post).score
+
+    def test_event_score_and_decay(self):
+        self.assertAlmostEqual(trending.event_score('like', trending.EPOCH), 0)
+        self.assertAlmostEqual(trending.event_score('save', trending.EPOCH), math.log2(3))
+        # One half-life later an event is worth twice as much in stored terms...
+        self.assertAlmostEqual(trending.event_score('like', trending.EPOCH + self.half_life), 1)
+        # ...and an old score's heat has halved
+        score = trending.event_score('comment', self.when)
+        self.assertAlmostEqual(trending.heat(score, self.when), 2)
+        self.assertAlmostEqual(trending.heat(score, self.when + self.half_life), 1)
+        self.assertAlmostEqual(trending.log_add(3, 1), math.log2(10))
+        self.assertAlmostEqual(trending.log_add(1000, 1000), 1001)
+
+    def test_events_add_up_and_retract(self):
+        trending.record_event(self.post.pk, 'like', self.when)
+        trending.record_event(self.post.pk, 'comment', self.when)
+        trending.record_event(self.post.pk, 'save', self.when + self.half_life)
+        # 1 + 2 now, plus 3 worth twice as much a half-life on
+        self.assertAlmostEqual(trending.heat(self.score(), self.when), 1 + 2 + 3 * 2)
+        trending.record_event(self.post.pk, 'comment', self.when, retract=True)
+        self.assertAlmostEqual(trending.heat(self.score(), self.when), 1 + 3 * 2)
+
+    def test_first_event_race_adds_to_the_winner(self):
+        trending.record_event(self.post.pk, 'like', self.when)
+        real_update = QuerySet.update
+        calls = []
+
+        def first_update_misses(queryset, **kwargs):
+            # As if a concurrent first event inserted the row after this UPDATE
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else real_update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', first_update_misses):
+            trending.record_event(self.post.pk, 'like', self.when)
+        self.assertEqual(len(calls), 2)
+        self.assertAlmostEqual(trending.heat(self.score(), self.when), 2)
+
+
+class GcMediaTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.media = override_settings(MEDIA_ROOT=self.directory.name)
+        self.media.enable()
+        self.addCleanup(self.media.disable)
+        Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/POST-1/photo.JPG')
+        self.files = [
+            'users/ana/POST-1/photo.JPG',
+            'thumbs/users/ana/POST-1/photo.jpg',
+            'users/ana/POST-2/gone.png',
+            'thumbs/users/ana/POST-2/gone.jpg',
+        ]
+        self.write(self.files)
+
+    def write(self, names):
+        old = time.time() - 48 * 3600
+        for name in names:
+            path = os.path.join(self.directory.name, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as fh:
+                fh.write(b'x')
+            os.utime(path, (old, old))
+
+    def exists(self, name):
+        return os.path.exists(os.path.join(self.directory.name, name))
+
+    def test_deletes_orphans_and_keeps_thumbnail_of_upper_case_source(self):
+        call_command('gc_media', stdout=StringIO())
+        self.assertEqual([self.exists(name) for name in self.files], [True, True, False, False])
+
+    def test_dry_run_deletes_nothing(self):
+        out = StringIO()
+        call_command('gc_media', '--dry-run', '-v', '2', stdout=out)
+        self.assertTrue(all(self.exists(name) for name in self.files))
+        self.assertIn('would delete thumbs/users/ana/POST-2/gone.jpg', out.getvalue())
+
+    def test_full_batch_of_thumbnails(self):
+        # More stems than SQLite allows OR terms in one query
+        Post.objects.bulk_create([
+            Post(post_id=f'POST-k{index}', username='bo', email='bo@example.com',
+                 media_file=f'users/bo/POST-k{index}/p.PNG')
+            for index in range(600)
+        ])
+        kept = [f'thumbs/users/bo/POST-k{index}/p.jpg' for index in range(600)]
+        orphans = [f'thumbs/users/bo/POST-o{index}/p.jpg' for index in range(600)]
+        self.write(kept + orphans)
+        call_command('gc_media', '--dir', 'thumbs', stdout=StringIO())
+        self.assertTrue(all(self.exists(name) for name in kept))
+        self.assertFalse(any(self.exists(name) for name in orphans))
+
+
+class BatchIsolationTests(TestCase):
+    def setUp(self):
+        self.post = Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/p.jpg')
+
+    def fail_on_save(self, model, exc):
+        def receiver(**kwargs):
+            raise exc
+        post_save.connect(receiver, sender=model, weak=False)
+        self.addCleanup(post_save.disconnect, receiver, sender=model)
+
+    def batch(self, *requests):
+        response = self.client.post('/api/batch/', {'requests': list(requests)}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return [entry['status'] for entry in response.json()['responses']]
+
+    def comment(self, text):
+        return {'method': 'POST', 'path': '/api/comments/',
+                'body': {'post': self.post.post_id, 'username': 'ben', 'text': text}}
+
+    def test_raising_subrequest_is_rolled_back_alone(self):
+        self.fail_on_save(Follow, RuntimeError('boom'))
+        with self.assertLogs('home.views', 'ERROR'):
+            statuses = self.batch(
+                self.comment('kept'),
+                {'method': 'POST', 'path': '/api/toggle-follow/', 'body': {'follower': 'ben', 'following': 'ana'}},
+                {'path': '/api/followers/ana/'},
+            )
+        self.assertEqual(statuses, [201, 500, 200])
+        self.assertTrue(Comment.objects.filter(text='kept').exists())
+        self.assertFalse(Follow.objects.exists())
+
+    def test_server_error_response_is_rolled_back(self):
+        # toggle_follow turns IntegrityError into a 500 response itself
+        self.fail_on_save(Follow, IntegrityError('duplicate'))
+        statuses = self.batch(
+            {'method': 'POST', 'path': '/api/toggle-follow/', 'body': {'follower': 'ben', 'following': 'ana'}},
+            self.comment('after'),
+        )
+        self.assertEqual(statuses, [500, 201])
+        self.assertFalse(Follow.objects.exists())
+        self.assertTrue(Comment.objects.filter(text='after').exists())
+
+
+class ProfileThumbnailTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.media = override_settings(MEDIA_ROOT=self.directory.name)
+        self.media.enable()
+        self.addCleanup(self.media.disable)
+        for name in ('users/ana/POST-1/ready.jpg', 'users/ana/POST-2/pending.PNG', 'users/ana/POST-3/clip.mp4'):
+            Post.objects.create(username='ana', email='ana@example.com', media_file=name)
+        thumbnail = os.path.join(self.directory.name, 'thumbs/users/ana/POST-1/ready.jpg')
+        os.makedirs(os.path.dirname(thumbnail))
+        open(thumbnail, 'wb').close()
+
+    def grid(self):
+        return [item['thumbnail_url'] for item in self.client.get('/api/users/ana/posts/').json()['results']]
+
+    def test_grid_reads_the_flag_not_storage(self):
+        Post.objects.filter(media_file='users/ana/POST-1/ready.jpg').update(has_thumbnail=True)
+        with mock.patch('django.core.files.storage.FileSystemStorage.exists', side_effect=AssertionError):
+            self.assertEqual(self.grid(), [
+                None,
+                'http://testserver/media/users/ana/POST-2/pending.PNG',
+                'http://testserver/media/thumbs/users/ana/POST-1/ready.jpg',
+            ])
+
+    def test_make_thumbnail_sets_the_flag(self):
+        from PIL import Image
+
+        source = os.path.join(self.directory.name, 'users/ana/POST-2/pending.PNG')
+        os.makedirs(os.path.dirname(source))
+        Image.new('RGB', (640, 480)).save(source, 'PNG')
+        make_thumbnail('users/ana/POST-2/pending.PNG')
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'thumbs/users/ana/POST-2/pending.jpg')))
+        self.assertEqual(self.grid()[1], 'http://testserver/media/thumbs/users/ana/POST-2/pending.jpg')
+
+    def test_backfill_flags_written_and_queues_missing_thumbnails(self):
+        call_command('backfill_thumbnails', stdout=StringIO())
+        self.assertEqual(
+            list(Job.objects.values_list('task', 'args')),
+            [(make_thumbnail.name, ['users/ana/POST-2/pending.PNG'])],
+        )
+        self.assertEqual(self.grid()[2], 'http://testserver/media/thumbs/users/ana/POST-1/ready.jpg')
+        # Flagged posts are not looked at again
+        Job.objects.all().delete()
+        Post.objects.filter(media_file='users/ana/POST-2/pending.PNG').update(has_thumbnail=True)
+        call_command('backfill_thumbnails', stdout=StringIO())
+        self.assertFalse(Job.objects.exists())
+
+
+class IdempotentStateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/p.jpg')
+
+    def send(self, method, path, **extra):
+        response = getattr(self.client, method)(path, content_type='application/json', **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_repeated_like_put_and_delete(self):
+        path = f'/api/posts/{self.post.post_id}/likes/ben/'
+        self.assertEqual([self.send('put', path)['changed'] for _ in range(2)], [True, False])
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes, 1)
+        results = [self.send('delete', path) for _ in range(2)]
+        self.assertEqual([(r['changed'], r['likes']) for r in results], [(True, 0), (False, 0)])
+        self.assertFalse(Like.objects.exists())
+
+    def test_repeated_follow_and_save(self):
+        follow = '/api/follows/ben/ana/'
+        self.assertEqual([self.send('put', follow)['changed'] for _ in range(2)], [True, False])
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual([self.send('delete', follow)['changed'] for _ in range(2)], [True, False])
+        save = f'/api/posts/{self.post.post_id}/saves/ben/'
+        self.assertEqual([self.send('put', save)['changed'] for _ in range(2)], [True, False])
+        self.assertEqual(SavedPost.objects.count(), 1)
+
+    def test_state_of_missing_post_is_404(self):
+        self.assertEqual(self.client.put('/api/posts/POST-none/saves/ben/').status_code, 404)
+        self.assertEqual(self.client.delete('/api/posts/POST-none/likes/ben/').status_code, 404)
+
+    def test_follow_returns_the_counter_it_wrote(self):
+        counts = [self.send(method, f'/api/follows/{follower}/ana/')['followers_count']
+                  for method, follower in [('put', 'ben'), ('put', 'ben'), ('put', 'cy'), ('delete', 'ben')]]
+        self.assertEqual(counts, [1, 1, 2, 1])
+        self.assertEqual(UserIndex.objects.get(username='ana').followers, 1)
+        # Nobody has indexed zoe yet: she is indexed from her Follow rows
+        Follow.objects.bulk_create([Follow(follower='cy', following='zoe')])
+        self.assertEqual(self.send('put', '/api/follows/ben/zoe/')['followers_count'], 2)
+        self.assertEqual(self.send('delete', '/api/follows/dee/zoe/')['followers_count'], 2)
+
+    def test_unchanged_save_is_a_single_statement(self):
+        self.assertTrue(set_saved(self.post.post_id, 'ben', True))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(set_saved(self.post.post_id, 'ben', True))
+        statements = [query['sql'] for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+        self.assertEqual(len(statements), 1, statements)
+        self.assertEqual(SavedPost.objects.count(), 1)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/p.jpg')
+        self.path = f'/api/posts/{self.post.post_id}/like/'
+
+    def like(self, username='ben', key='key-1'):
+        return self.client.post(
+            self.path, {'username': username}, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_is_replayed_without_running_again(self):
+        first, retry = self.like(), self.like()
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', first)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes, 1)
+
+    def test_new_key_runs_again(self):
+        self.like(key='key-1')
+        self.like(key='key-2')
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes, 0)
+
+    def test_key_reused_with_other_body_is_rejected(self):
+        self.like()
+        self.assertEqual(self.like(username='cy').status_code, 422)
+
+    def test_retry_while_in_flight_conflicts(self):
+        with mock.patch.object(idempotency.cache, 'add', return_value=False):
+            self.assertEqual(self.like().status_code, 409)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).likes, 0)
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        post = Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/p.jpg')
+        Comment.objects.create(post=post, username='ben', text='nice')
+        Story.objects.create(username='ana', email='ana@example.com', media_file='users/ana/s.jpg',
+                             expires_at=timezone.now() + timedelta(hours=1))
+
+    def get(self, path, **params):
+        return self.client.get(path, params)
+
+    def test_post_fields_and_expand(self):
+        default = self.get('/api/posts/').json()[0]
+        self.assertEqual(len(default['comments']), 1)
+        self.assertNotIn('media_file', default)
+        self.assertEqual(set(self.get('/api/posts/', fields='post_id,likes').json()[0]), {'post_id', 'likes'})
+        expanded = self.get('/api/posts/', fields='post_id', expand='comments').json()[0]
+        self.assertEqual(set(expanded), {'post_id', 'comments'})
+        self.assertEqual(expanded['comments'][0]['text'], 'nice')
+
+    def test_story_fields(self):
+        for path in ('/api/stories/', '/api/async/stories/'):
+            self.assertEqual(set(self.get(path, fields='story_id,seen').json()[0]), {'story_id', 'seen'})
+            self.assertIn('media_url', self.get(path).json()[0])
+
+    def test_unknown_expansion_is_rejected(self):
+        for path, name in [('/api/posts/', 'author'), ('/api/stories/', 'comments'),
+                           ('/api/async/posts/', 'author'), ('/api/async/stories/', 'comments')]:
+            response = self.get(path, expand=name)
+            self.assertEqual(response.status_code, 400, path)
+            self.assertIn(f'Cannot expand {name}', response.json()['expand'][0])
+
+
+class AsyncViewParityTests(TestCase):
+    def setUp(self):
+        author = GoogleUser.objects.create(name='Ana', email='ana@example.com')
+        for title, ingredients in [('lentil soup', '200 g lentils'), ('spinach salad', '100 g spinach')]:
+            Recipe.objects.create(title=title, ingredients=ingredients, instructions='Cook.', author=author)
+        for index in range(3):
+            post = Post.objects.create(username='ana', email='ana@example.com', media_file=f'users/ana/{index}.jpg')
+            Comment.objects.create(post=post, username='ben', text=f'comment {index}')
+        Like.objects.create(post=post, username='ben')
+        Follow.objects.create(follower='ben', following='ana')
+        Story.objects.create(username='ana', email='ana@example.com', media_file='users/ana/s.jpg',
+                             expires_at=timezone.now() + timedelta(hours=1))
+
+    async def assertSameAsSync(self, path, params=None):
+        sync = await sync_to_async(self.client.get)(f'/api/{path}', params or {})
+        response = await self.async_client.get(f'/api/async/{path}', params or {})
+        self.assertEqual(response.status_code, sync.status_code, path)
+        self.assertEqual(response.json(), sync.json(), path)
+        return response.json()
+
+    async def test_feed_matches_sync(self):
+        self.assertEqual(len(await self.assertSameAsSync('posts/')), 3)
+        feed = await self.assertSameAsSync('posts/', {'username': 'ben'})
+        self.assertEqual([post['liked_by_user'] for post in feed], [True, False, False])
+        await self.assertSameAsSync('posts/', {'fields': 'post_id,liked_by_user', 'username': 'ben'})
+        await self.assertSameAsSync('stories/')
+        await self.assertSameAsSync('user-stats/ana/', {'current_user': 'ben'})
+        await self.assertSameAsSync('followers/ana/')
+
+    async def test_search_matches_sync(self):
+        self.assertEqual([r['title'] for r in await self.assertSameAsSync('recipes/search/', {'q': 'lentil'})],
+                         ['lentil soup'])
+        await self.assertSameAsSync('recipes/search/', {'q': 'SPINACH', 'fields': 'id,title'})
+        await self.assertSameAsSync('recipes/search/', {'max_kcal': '100000'})
+        await self.assertSameAsSync('recipes/search/', {'max_kcal': 'lots'})
+
+
+class EventStreamTests(TestCase):
+    async def test_published_event_reaches_the_stream(self):
+        layer = realtime.get_channel_layer()
+        group = realtime.post_group('POST-abc123')
+        response = await self.async_client.get('/api/events/', {'posts': 'POST-abc123'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertTrue(layer.has_subscribers(group))
+
+        # Sync views publish from a worker thread
+        await sync_to_async(layer.publish, thread_sensitive=False)(group, {'type': 'post.like', 'likes': 3})
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        lines = chunk.decode().split('\n')
+        self.assertEqual(lines[1], 'event: post.like')
+        event = json.loads(lines[2][len('data: '):])
+        self.assertEqual((event['type'], event['likes']), ('post.like', 3))
+        self.assertEqual(lines[0], f"id: {event['id']}")
+
+        # A client disconnect cancels the pending read; the subscription goes with it
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertFalse(layer.has_subscribers(group))
+
+    async def test_subscription_is_required(self):
+        self.assertEqual((await self.async_client.get('/api/events/')).status_code, 400)
+
+
+class ActivityFeedTests(TestCase):
+    def setUp(self):
+        self.post = Post.objects.create(username='ana', email='ana@example.com', media_file='users/ana/p.jpg')
+
+    def feed(self, **params):
+        return self.client.get('/api/activity/ana/', params).json()
+
+    def test_likes_comments_and_follows_fan_in(self):
+        for username in ('ben', 'cy'):
+            Like.objects.create(post=self.post, username=username)
+        # Through the raw-SQL mutation, whose post carries only its ids
+        self.client.put(f'/api/posts/{self.post.post_id}/likes/dee/')
+        Like.objects.create(post=self.post, username='ana')  # Own actions are not activity
+        Comment.objects.create(post=self.post, username='ben', text='first!')
+        Comment.objects.create(post=self.post, username='cy', text='so good')
+        Follow.objects.create(follower='eve', following='ana')
+
+        feed = self.feed()
+        self.assertEqual(feed['unread_count'], 3)
+        groups = {group['verb']: group for group in feed['results']}
+        self.assertEqual(set(groups), {'like', 'comment', 'follow'})
+        self.assertEqual((groups['like']['actor_count'], groups['like']['actors']), (3, ['dee', 'cy', 'ben']))
+        self.assertEqual(groups['like']['text'], 'dee, cy and 1 other liked your post')
+        self.assertEqual(groups['like']['target'], self.post.post_id)
+        self.assertEqual((groups['comment']['text'], groups['comment']['preview']),
+                         ('cy and ben commented on your post', 'so good'))
+        self.assertEqual((groups['follow']['text'], groups['follow']['target']), ('eve started following you', None))
+
+    def test_feed_is_latest_first_and_reads_reset(self):
+        start = activity.window_start(timezone.now())
+        at = [start + timedelta(minutes=minute) for minute in range(4)]
+        activity.record('like', 'ana', 'ben', self.post.post_id, at[0])
+        activity.record('comment', 'ana', 'cy', self.post.post_id, at[1], 'hi')
+        activity.record('follow', 'ana', 'dee', '', at[2])
+        self.assertEqual([group['verb'] for group in self.feed()['results']], ['follow', 'comment', 'like'])
+
+        self.client.post('/api/activity/ana/read/')
+        # New activity moves its group to the top and makes it unread again
+        activity.record('like', 'ana', 'eve', self.post.post_id, at[3])
+        page = self.feed(limit=2)
+        self.assertEqual([(group['verb'], group['unread']) for group in page['results']],
+                         [('like', True), ('follow', False)])
+        self.assertEqual(page['unread_count'], 1)
+        rest = self.feed(limit=2, cursor=page['next_cursor'])
+        self.assertEqual(([group['verb'] for group in rest['results']], rest['next_cursor']), (['comment'], None))
+
+        # The next window starts a new group
+        activity.record('like', 'ana', 'ben', self.post.post_id, start + timedelta(seconds=activity.window_seconds()))
+        self.assertEqual(ActivityGroup.objects.filter(verb='like').count(), 2)
+        self.assertEqual(activity.unread_count('ana'), 2)
+
+
+class StorySeenTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.stories = {}
+        # Authors' stories interleave, as they do in a real tray
+        for name in ('ana-1', 'ben-1', 'ana-2', 'ben-2'):
+            self.stories[name] = Story.objects.create(
+                username=name.split('-')[0], email='x@example.com', media_file=f'users/{name}.jpg',
+                expires_at=now + timedelta(hours=20),
+            )
+
+    def tray(self):
+        response = self.client.get('/api/stories/', {'username': 'cy'})
+        return [(story['username'], story['seen']) for story in response.json()]
+
+    def test_unseen_authors_come_first(self):
+        storyseen.mark_seen('cy', [self.stories['ana-1'].story_id, self.stories['ana-2'].story_id])
+        self.assertEqual(self.tray(), [('ben', False), ('ben', False), ('ana', True), ('ana', True)])
+        self.assertEqual(
+            StorySeen.objects.get(username='cy').story_pks,
+            sorted([self.stories['ana-1'].pk, self.stories['ana-2'].pk]),
+        )
+
+    def test_expired_stories_are_pruned_on_write(self):
+        storyseen.mark_seen('cy', [self.stories['ana-1'].story_id])
+        Story.objects.filter(pk=self.stories['ana-1'].pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(storyseen.mark_seen('cy', [self.stories['ana-1'].story_id, 'STORY-none']), 0)
+        storyseen.mark_seen('cy', [self.stories['ben-2'].story_id])
+        self.assertEqual(StorySeen.objects.get(username='cy').story_pks, [self.stories['ben-2'].pk])
+
+    def test_large_seen_set_round_trips(self):
+        expires_at = timezone.now() + timedelta(hours=20)
+        stories = Story.objects.bulk_create(
+            Story(username=f'author{index % 400}', email='x@example.com', media_file=f'users/{index}.jpg',
+                  story_id=f'STORY-{index:06d}', expires_at=expires_at)
+            for index in range(2400)
+        )
+        # Two writes, so the second prunes a set already past the SQLite variable limit
+        self.assertEqual(storyseen.mark_seen('cy', [story.story_id for story in stories[:1200]]), 1200)
+        self.assertEqual(storyseen.mark_seen('cy', [story.story_id for story in stories[1200:]]), 1200)
+        pks = {story.pk for story in Story.objects.filter(username__startswith='author')}
+        self.assertEqual(len(pks), 2400)
+        self.assertEqual(storyseen.seen_story_pks('cy'), pks)
+        self.assertEqual(StorySeen.objects.get(username='cy').story_pks, sorted(pks))
+
+
+class SeedDataTests(TestCase):
+    def test_small_seed(self):
+        out = StringIO()
+        call_command('seed_data', '--users', '20', '--posts', '50', '--seed', '1', stdout=out)
+        self.assertEqual(GoogleUser.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 50)
+        self.assertEqual(Story.objects.count(), 500)
+        self.assertEqual(Recipe.objects.count(), 1000)
+        self.assertIn('  Post: 50', out.getvalue())
+        # Denormalized like counts match the Like rows
+        likes = dict(Like.objects.values_list('post').annotate(n=Count('id')).order_by())
+        self.assertEqual({pk: n for pk, n in Post.objects.values_list('pk', 'likes') if n}, likes)
+        usernames = set(GoogleUser.objects.values_list('name', flat=True))
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(follower=F('following')).exists())
+        self.assertTrue(set(Follow.objects.values_list('follower', flat=True)) <= usernames)
+        self.assertTrue(set(Post.objects.values_list('username', flat=True)) <= usernames)
+
+
+class RecipeSimilarityTests(TestCase):
+    GROUPS = {
+        'soup': ['lentil soup', 'carrot lentil soup', 'spicy lentil soup', 'lentil soup with cumin'],
+        'salad': ['spinach salad', 'spinach feta salad', 'warm spinach salad', 'spinach salad with walnuts'],
+    }
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        index = override_settings(RECIPE_SIMILARITY_INDEX=os.path.join(self.directory.name, 'index.npz'))
+        index.enable()
+        self.addCleanup(index.disable)
+        self.author = GoogleUser.objects.create(name='Ana', email='ana@example.com')
+
+    def add(self, titles):
+        return [
+            Recipe.objects.create(title=title, ingredients=title, instructions='Cook.', author=self.author).pk
+            for title in titles
+        ]
+
+    def neighbours(self):
+        lists = {}
+        for recipe_id, similar_id in RecipeSimilar.objects.values_list('recipe_id', 'similar_id'):
+            lists.setdefault(recipe_id, set()).add(similar_id)
+        return lists
+
+    def test_burst_of_recipes_queues_one_update(self):
+        self.add(self.GROUPS['soup'])
+        self.assertEqual(Job.objects.filter(task=update_recipe_similarity.name, status=Job.QUEUED).count(), 1)
+
+    def test_fold_in_matches_rebuild(self):
+        self.add([titles[0] for titles in self.GROUPS.values()] + [titles[1] for titles in self.GROUPS.values()])
+        similarity.rebuild(k=3)
+        self.add([titles[2] for titles in self.GROUPS.values()] + [titles[3] for titles in self.GROUPS.values()])
+        self.assertEqual(similarity.update(k=3)['added'], 4)
+        folded = self.neighbours()
+        similarity.rebuild(k=3)
+        self.assertEqual(folded, self.neighbours())
+        self.assertEqual(len(folded), 8)
+        self.assertTrue(all(len(similar) == 3 for similar in folded.values()))
+
+
+class NutritionTests(TestCase):
+    def test_parse_line(self):
+        cases = {
+            '1 1/2 cups rolled oats': (1.5, 'cup', 'oats', 121.5),
+            '200g chicken breast': (200, 'g', 'chicken breast', 200),
+            '2 cloves garlic, minced': (2, 'clove', 'garlic', 10),
+            'salt to taste': (None, None, 'salt', None),
+            'a splash of love': (None, None, None, None),
+        }
+        for line, expected in cases.items():
+            with self.subTest(line=line):
+                self.assertEqual(tuple(nutrition.parse_line(line)), expected)
+
+    def test_recipe_without_known_amounts_is_null(self):
+        author = GoogleUser.objects.create(name='Ana', email='ana@example.com')
+        unknown = Recipe.objects.create(
+            title='Mystery', ingredients='salt to taste\na splash of love', instructions='Stir.', author=author,
+        )
+        rice = Recipe.objects.create(title='Rice', ingredients='100 g rice', instructions='Boil.', author=author)
+        self.assertEqual([getattr(unknown, name) for name in nutrition.NUTRIENTS], [None] * 5)
+        self.assertEqual(Recipe.objects.get(pk=rice.pk).kcal, 365)
+        self.assertEqual(list(Recipe.objects.filter(**nutrition.filters({'max_kcal': '400'}))), [rice])
+
+    def test_filters_reject_non_finite_values(self):
+        self.assertEqual(nutrition.filters({'max_kcal': '500', 'min_fiber': ''}), {'kcal__lte': 500})
+        for value in ('nan', 'inf', '-Infinity', 'lots'):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                nutrition.filters({'min_protein': value})
+        self.assertEqual(self.client.get('/api/recipes/search/', {'max_kcal': 'nan'}).status_code, 400)
@@ -0,0 +1,102 @@
+# home/transfer.py
+"""
+Record formats for the streaming JSONL export/import commands.
+
+Each line is {"model": <name>, "fields": {...}}. Relations are written as
+natural keys (post_id, author email) rather than database ids, so a dump can
+be loaded into a database with different primary keys. Models are listed in
+dependency order: posts before anything that points at them.
+"""
+from django.utils.dateparse import parse_datetime
+
+from .models import Post, Comment, Like, Follow, SavedPost, Recipe
+
+EXPORT_FIELDS = {
+    'post': (Post, ['post_id', 'username', 'email', 'caption', 'media_file', 'likes', 'created_at']),
+    'comment': (Comment, ['post__post_id', 'username', 'text', 'created_at']),
+    'like': (Like, ['post__post_id', 'username', 'created_at']),
+    'follow': (Follow, ['follower', 'following', 'created_at']),
+    'savedpost': (SavedPost, ['post__post_id', 'username', 'created_at']),
+    'recipe': (Recipe, [
+        'title', 'ingredients', 'instructions', 'cuisine', 'total_time_mins',
+        'image', 'author__email', 'created_at',
+    ]),
+}
+
+MODEL_ORDER = list(EXPORT_FIELDS)
+
+# Fields that identify a row across databases. Comments and recipes have no
+# unique constraint, so their key is who wrote them, where, and when.
+NATURAL_KEYS = {
+    'post': ('post_id',),
+    'comment': ('post_id', 'username', 'created_at'),
+    'like': ('post_id', 'username'),
+    'follow': ('follower', 'following'),
+    'savedpost': ('post_id', 'username'),
+    'recipe': ('author_id', 'title', 'created_at'),
+}
+
+
+def to_record(name, values):
+    fields = dict(values)
+    if fields.get('created_at') is not None:
+        fields['created_at'] = fields['created_at'].isoformat()
+    return {'model': name, 'fields': fields}
+
+
+def build_objects(name, records):
+    """
+    Turn one batch of records for a single model into unsaved instances.
+    Returns (objects, skipped) where skipped counts records whose post or
+    author does not exist in this database.
+    """
+    from authentication.models import GoogleUser
+
+    model, _ = EXPORT_FIELDS[name]
+    posts = authors = {}
+    if any('post__post_id' in r for r in records):
+        post_ids = {r['post__post_id'] for r in records}
+        posts = dict(Post.objects.filter(post_id__in=post_ids).values_list('post_id', 'pk'))
+    if name == 'recipe':
+        emails = {r['author__email'] for r in records}
+        authors = dict(GoogleUser.objects.filter(email__in=emails).values_list('email', 'pk'))
+
+    objects, skipped = [], 0
+    for fields in records:
+        fields = dict(fields)
+        if 'post__post_id' in fields:
+            post_pk = posts.get(fields.pop('post__post_id'))
+            if post_pk is None:
+                skipped += 1
+                continue
+            fields['post_id'] = post_pk
+        if 'author__email' in fields:
+            author_pk = authors.get(fields.pop('author__email'))
+            if author_pk is None:
+                skipped += 1
+                continue
+            fields['author_id'] = author_pk
+        if fields.get('created_at'):
+            fields['created_at'] = parse_datetime(fields['created_at'])
+        objects.append(model(**fields))
+    return objects, skipped
+
+
+def drop_existing(name, objects):
+    """
+    Remove the objects whose natural key is already in the database (or
+    earlier in the batch), so replaying a batch inserts nothing twice.
+    Returns (new objects, number dropped).
+    """
+    model, _ = EXPORT_FIELDS[name]
+    fields = NATURAL_KEYS[name]
+    keys = [tuple(getattr(obj, field) for field in fields) for obj in objects]
+    # Superset of the matching rows; exact keys are compared below
+    lookups = {f'{field}__in': {key[i] for key in keys} for i, field in enumerate(fields)}
+    seen = set(model.objects.filter(**lookups).values_list(*fields)) if keys else set()
+    fresh = []
+    for obj, key in zip(objects, keys):
+        if key not in seen:
+            seen.add(key)
+            fresh.append(obj)
+    return fresh, len(objects) - len(fresh)
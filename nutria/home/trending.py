@@ -0,0 +1,88 @@
+# home/trending.py
+"""
+Time-decayed trending score.
+
+Every engagement event adds ``weight * 2 ** ((t - EPOCH) / HALF_LIFE)`` to a
+post's total, which is the classic exponentially decayed sum scaled by a
+factor that is the same for every post at any moment. Ranking by the stored
+total is therefore ranking by decayed engagement *now*, and nothing has to
+be rescored as time passes; each event is a single UPDATE.
+
+Scores are kept in log2 space (``score = log2(total)``) so they never
+overflow; adding an event is a log-add-exp done in SQL, so concurrent
+updates don't lose increments. A post's first event inserts its row; if a
+concurrent event got there first the insert fails and the event is added
+to that row instead.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Value, FloatField
+from django.db.models.functions import Greatest, Least, Log, Power
+from django.utils import timezone
+
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+WEIGHTS = {
+    'post': 1.0,  # Every new post starts with a little heat
+    'like': 1.0,
+    'comment': 2.0,
+    'save': 3.0,
+}
+
+# Smallest fraction kept when an event is retracted, avoids log2(0)
+_FLOOR = 1e-9
+
+
+def half_life_seconds():
+    return getattr(settings, 'TRENDING_HALF_LIFE_HOURS', 12) * 3600
+
+
+def event_score(kind, when):
+    """log2 of one event's contribution"""
+    return math.log2(WEIGHTS[kind]) + (when - EPOCH).total_seconds() / half_life_seconds()
+
+
+def heat(score, now=None):
+    """Decayed weighted engagement at ``now`` for a stored score"""
+    now = now or timezone.now()
+    return 2 ** (score - (now - EPOCH).total_seconds() / half_life_seconds())
+
+
+def log_add(a, b):
+    """log2(2**a + 2**b) without overflow"""
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def _added(x):
+    x = Value(x, output_field=FloatField())
+    high = Greatest(F('score'), x)
+    low = Least(F('score'), x)
+    return high + Log(2, 1 + Power(2, low - high))
+
+
+def _removed(x):
+    x = Value(x, output_field=FloatField())
+    return F('score') + Log(2, Greatest(1 - Power(2, x - F('score')), _FLOOR))
+
+
+def record_event(post_id, kind, when=None, retract=False):
+    """Apply one engagement event (or undo it) to a post's score"""
+    from .models import TrendingScore
+
+    x = event_score(kind, when or timezone.now())
+    rows = TrendingScore.objects.filter(post_id=post_id)
+    if retract:
+        rows.update(score=_removed(x))
+        return
+    if rows.update(score=_added(x)):
+        return
+    try:
+        with transaction.atomic():
+            TrendingScore.objects.create(post_id=post_id, score=x)
+    except IntegrityError:
+        # Another event inserted the row between our UPDATE and INSERT
+        rows.update(score=_added(x))
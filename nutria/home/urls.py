@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
     path('posts/', views.post_list_create, name='post-list-create'),
@@ -8,6 +8,7 @@ urlpatterns = [
     path('stories/', views.story_list_create, name='story-list-create'), 
     path('recipes/add/', views.add_recipe, name='add_recipe'),
     path('recipes/search/', views.search_recipes, name='search_recipes'),
+    path('recipes/<int:recipe_id>/similar/', views.similar_recipes, name='similar_recipes'),
      # home/urls.py - Add these URL patterns to your existing urls
 
 
@@ -20,4 +21,28 @@ urlpatterns = [
     path('toggle-save/', views.toggle_save_post, name='toggle_save_post'),
     path('saved-posts/<str:username>/', views.get_saved_posts, name='saved_posts'),
     path('check-saved/', views.check_saved_status, name='check_saved_status'),
+    path('sync/', views.sync_changes, name='sync_changes'),
+    path('trending/', views.trending_posts, name='trending_posts'),
+    path('posts/<str:post_id>/analytics/', views.post_analytics, name='post_analytics'),
+    path('analytics/<str:username>/', views.author_analytics, name='author_analytics'),
+    path('tags/<str:tag>/posts/', views.tag_feed, name='tag_feed'),
+    path('mentions/<str:username>/', views.mention_feed, name='mention_feed'),
+    path('users/search/', views.search_users, name='search_users'),
+    path('users/<str:username>/posts/', views.profile_posts, name='profile_posts'),
+    path('batch/', views.batch, name='batch'),
+    path('stories/seen/', views.mark_stories_seen, name='mark_stories_seen'),
+    path('activity/<str:username>/', views.activity_feed, name='activity_feed'),
+    path('activity/<str:username>/unread/', views.activity_unread, name='activity_unread'),
+    path('activity/<str:username>/read/', views.activity_mark_read, name='activity_mark_read'),
+    path('posts/<str:post_id>/likes/<str:username>/', views.like_state, name='like_state'),
+    path('posts/<str:post_id>/saves/<str:username>/', views.save_state, name='save_state'),
+    path('follows/<str:follower>/<str:following>/', views.follow_state, name='follow_state'),
+
+    # Async read endpoints (run natively under nutria.asgi)
+    path('async/posts/', async_views.post_list, name='async_post_list'),
+    path('async/stories/', async_views.story_list, name='async_story_list'),
+    path('async/user-stats/<str:username>/', async_views.user_stats, name='async_user_stats'),
+    path('async/followers/<str:username>/', async_views.followers_list, name='async_followers_list'),
+    path('async/recipes/search/', async_views.search_recipes, name='async_search_recipes'),
+    path('events/', async_views.event_stream, name='event_stream'),
 ] # ← NEW
\ No newline at end of file
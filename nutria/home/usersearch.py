@@ -0,0 +1,305 @@
+# home/usersearch.py
+"""
+User search over usernames, names and emails.
+
+Every account has a UserIndex row and one UserSearchToken per normalized
+word of its username, name and email (accents stripped, case folded). A
+query word matches a token it is a prefix of, which is a range scan on the
+token index (``token >= 'oli' AND token < 'oli' || U+10FFFF``), so a lookup
+reads only the tokens that match.
+
+Results are ranked by match quality (exact word > prefix, username/name >
+email), then follower count, then account age. A single-word query is
+ranked over every user it matches without reading them all: each token
+carries its user's follower count, so each score level is read from an
+index already in rank order and reading stops once the page is full (see
+_ranked_single). For multi-word queries
+the most selective word is scanned (at most SCAN_LIMIT tokens) for up to
+CANDIDATE_LIMIT users that also match the other words; only those are
+scored.
+"""
+import heapq
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from .models import Follow, UserIndex, UserSearchToken
+
+CANDIDATE_LIMIT = 200
+SCAN_LIMIT = 1000
+
+# Prefix matches of one weight up to this many are sorted by the database;
+# past it, walking the followers index finds a page sooner (see _prefix_rows)
+RANGE_SORT_LIMIT = 5000
+
+USERNAME_WEIGHT = 3
+NAME_WEIGHT = 3
+EMAIL_WEIGHT = 2  # Whole address, so "ann@" or "ann@example.com" find it
+EMAIL_WORD_WEIGHT = 1  # Words of the local part; domains would match everyone
+
+_WORD_RE = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def words(text):
+    return _WORD_RE.findall(normalize(text))
+
+
+def user_tokens(username, name='', email=''):
+    """{token: weight} for one account, keeping the best weight per token"""
+    tokens = {}
+
+    def add(token, weight):
+        if token and weight > tokens.get(token, 0):
+            tokens[token] = weight
+
+    username_words = words(username)
+    for word in username_words:
+        add(word, USERNAME_WEIGHT)
+    add(''.join(username_words), USERNAME_WEIGHT)  # "oliviahaddad13"
+    for word in words(name):
+        add(word, NAME_WEIGHT)
+    if email:
+        add(normalize(email), EMAIL_WEIGHT)
+        for word in words(email.split('@', 1)[0]):
+            add(word, EMAIL_WORD_WEIGHT)
+    return tokens
+
+
+def index_user(username, name='', email='', photo_url=None):
+    """Create or refresh one account's index row and tokens"""
+    user, created = UserIndex.objects.get_or_create(
+        username=username, defaults={'name': name, 'email': email, 'photo_url': photo_url}
+    )
+    if not created:
+        changed = {
+            field: value for field, value in (('name', name), ('email', email), ('photo_url', photo_url))
+            if value and getattr(user, field) != value
+        }
+        if not changed:
+            return user
+        for field, value in changed.items():
+            setattr(user, field, value)
+        user.save(update_fields=[*changed, 'updated_at'])
+
+    wanted = user_tokens(user.username, user.name, user.email)
+    existing = dict(UserSearchToken.objects.filter(user=user).values_list('token', 'weight'))
+    stale = [token for token, weight in existing.items() if wanted.get(token) != weight]
+    if stale:
+        UserSearchToken.objects.filter(user=user, token__in=stale).delete()
+    UserSearchToken.objects.bulk_create([
+        UserSearchToken(user=user, token=token, weight=weight, followers=user.followers)
+        for token, weight in wanted.items() if existing.get(token) != weight
+    ])
+    return user
+
+
+def adjust_followers(username, delta):
+    """
+    Add ``delta`` to a user's follower count, and the copy on their tokens;
+    returns the new count. An account nobody has indexed yet is indexed
+    here, starting from its Follow rows (which already include this change).
+    """
+    qn = connection.ops.quote_name
+    table, tokens = qn(UserIndex._meta.db_table), qn(UserSearchToken._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {qn('followers')} = MAX({qn('followers')} + %s, 0) WHERE {qn('username')} = %s "
+            f"RETURNING {qn('id')}, {qn('followers')}",
+            [delta, username],
+        )
+        row = cursor.fetchone()
+        if row is None:
+            user = index_user(username)
+            follows = Follow._meta
+            cursor.execute(
+                f"UPDATE {table} SET {qn('followers')} = (SELECT COUNT(*) FROM {qn(follows.db_table)} "
+                f"WHERE {qn(follows.get_field('following').column)} = %s) WHERE {qn('id')} = %s "
+                f"RETURNING {qn('id')}, {qn('followers')}",
+                [username, user.pk],
+            )
+            row = cursor.fetchone()
+        elif not delta:
+            return row[1]
+        cursor.execute(f"UPDATE {tokens} SET {qn('followers')} = %s WHERE {qn('user_id')} = %s", [row[1], row[0]])
+    return row[1]
+
+
+def query_terms(query):
+    query = (query or '').strip()
+    if '@' in query:
+        return [normalize(query)]
+    return list(dict.fromkeys(words(query)))
+
+
+def _prefix(term):
+    return {'token__gte': term, 'token__lt': term + '\U0010ffff'}
+
+
+def _matches(term):
+    return UserSearchToken.objects.filter(**_prefix(term)).order_by('token')
+
+
+def _selectivity(term):
+    """Tokens starting with ``term``, counted up to SCAN_LIMIT"""
+    return _matches(term)[:SCAN_LIMIT].count()
+
+
+def _prefix_scan(term, also=()):
+    """
+    (user_id, token, weight) for tokens starting with ``term``, in index
+    order, of users who also have a token starting with each of ``also``.
+    Only the first SCAN_LIMIT tokens are checked against ``also`` (an index
+    seek on (user, token) each), so no query scans an unbounded range.
+    """
+    queryset = _matches(term)
+    if also:
+        queryset = queryset.filter(pk__in=_matches(term).values('pk')[:SCAN_LIMIT])
+    for other in also:
+        queryset = queryset.filter(
+            Exists(UserSearchToken.objects.filter(user=OuterRef('user'), **_prefix(other)))
+        )
+    return list(queryset.values_list('user_id', 'token', 'weight')[:CANDIDATE_LIMIT])
+
+
+def _rows(sql, params):
+    """(followers, user_id) rows of ``sql``, fetched as they are consumed"""
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(100):
+            yield from rows
+
+
+def _exact_rows(term, weight):
+    qn = connection.ops.quote_name
+    return _rows(
+        f"SELECT {qn('followers')}, {qn('user_id')} FROM {qn(UserSearchToken._meta.db_table)} "
+        f"WHERE {qn('weight')} = %s AND {qn('token')} = %s ORDER BY {qn('followers')} DESC, {qn('user_id')}",
+        [weight, term],
+    )
+
+
+def _prefix_rows(term, weight):
+    """
+    Tokens of ``weight`` that ``term`` is a proper prefix of, most followed
+    first. A few thousand matches are read through the rank index and
+    sorted; more than that means the prefix is common, and walking the walk
+    index (already in followers order) reaches a page of them sooner than
+    sorting them all would.
+    """
+    qn = connection.ops.quote_name
+    table = qn(UserSearchToken._meta.db_table)
+    where = f"{qn('weight')} = %s AND {qn('token')} > %s AND {qn('token')} < %s"
+    params = [weight, term, term + '\U0010ffff']
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE {where} LIMIT {RANGE_SORT_LIMIT + 1}) matched",
+            params,
+        )
+        common = cursor.fetchone()[0] > RANGE_SORT_LIMIT
+    if connection.vendor == 'sqlite':
+        # Without ANALYZE stats SQLite guesses the other way round for both
+        table += f" INDEXED BY {'home_usersearch_walk_idx' if common else 'home_usersearch_rank_idx'}"
+    return _rows(
+        f"SELECT {qn('followers')}, {qn('user_id')} FROM {table} WHERE {where} "
+        f"ORDER BY {qn('followers')} DESC, {qn('user_id')}",
+        params,
+    )
+
+
+def _score_levels():
+    """
+    [[(exact, weight), ...], ...] from the best score down. An exact match
+    scores twice its weight, a prefix match its weight, so with weights
+    3, 2, 1 the levels are 6, 4, 3, then 2 (exact 1 or prefix 2), then 1.
+    """
+    weights = {USERNAME_WEIGHT, NAME_WEIGHT, EMAIL_WEIGHT, EMAIL_WORD_WEIGHT}
+    levels = {}
+    for weight in weights:
+        levels.setdefault(2 * weight, []).append((True, weight))
+        levels.setdefault(weight, []).append((False, weight))
+    return [levels[score] for score in sorted(levels, reverse=True)]
+
+
+def _ranked_single(term, offset, limit):
+    """
+    One page of users matching one word. A user's score is their best
+    token's, so users are taken level by level, each level's tokens merged
+    in (followers desc, user) order, skipping users already taken. Every
+    stream comes out of an index in that order, so only about
+    offset + limit rows per level are read, not every match.
+    """
+    wanted = offset + limit + 1
+    ranked, taken = [], set()
+    for level in _score_levels():
+        streams = [_exact_rows(term, weight) if exact else _prefix_rows(term, weight) for exact, weight in level]
+        for _, user_id in heapq.merge(*streams, key=lambda row: (-row[0], row[1])):
+            if user_id not in taken:
+                taken.add(user_id)
+                ranked.append(user_id)
+                if len(ranked) == wanted:
+                    break
+        for stream in streams:
+            stream.close()
+        if len(ranked) == wanted:
+            break
+    page = ranked[offset:offset + limit]
+    users = UserIndex.objects.in_bulk(page)
+    return [users[pk] for pk in page], len(ranked) > offset + limit
+
+
+def search_users(query, offset=0, limit=20):
+    """
+    (page of UserIndex rows in rank order, has_more). Multi-word queries
+    first take users whose joined username starts with the joined query
+    ("liam smith 5" finds liam-smith-5 however common "liam" is), then, if
+    that leaves room, users matching every word anywhere. At most
+    CANDIDATE_LIMIT candidates from each are ranked. Single words are
+    ranked over all matches.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return [], False
+    if len(terms) == 1:
+        return _ranked_single(terms[0], offset, limit)
+
+    rows = _prefix_scan(''.join(terms))
+    if len(rows) < CANDIDATE_LIMIT:
+        driver = min(terms, key=_selectivity)
+        rows += _prefix_scan(driver, also=[term for term in terms if term != driver])
+    # Scoring needs each candidate's best token for every word
+    rows = UserSearchToken.objects.filter(
+        user__in={user_id for user_id, _, _ in rows}
+    ).values_list('user_id', 'token', 'weight')
+
+    tokens = {}
+    for user_id, token, weight in rows:
+        tokens.setdefault(user_id, []).append((token, weight))
+
+    scores = {}
+    for user_id, owned in tokens.items():
+        score = 0
+        for term in terms:
+            best = max(
+                (weight * (2 if token == term else 1) for token, weight in owned if token.startswith(term)),
+                default=0,
+            )
+            if not best:
+                break
+            score += best
+        else:
+            scores[user_id] = score
+    if not scores:
+        return [], False
+
+    followers = dict(UserIndex.objects.filter(pk__in=scores).values_list('pk', 'followers'))
+    ranked = sorted(followers, key=lambda pk: (-scores[pk], -followers[pk], pk))
+    page = ranked[offset:offset + limit]
+    users = UserIndex.objects.in_bulk(page)
+    return [users[pk] for pk in page], len(ranked) > offset + limit
@@ -5,29 +5,58 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import Post, Comment, Story, Like
 from .serializers import PostSerializer, CommentSerializer, StorySerializer
+from .realtime import publish_post_event, publish_new_post
+from .tasks import make_thumbnail
+from nutria.renderers import stream_json, streamed, wants_stream
+from .idempotency import idempotent
+from .storyseen import mark_seen, seen_story_pks, tray_order
+from django.utils import timezone
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per round trip when streaming large lists
+STREAM_CHUNK_SIZE = 500
+
+
 @api_view(['GET', 'POST'])
 @parser_classes([MultiPartParser, FormParser])
 def post_list_create(request):
     if request.method == 'GET':
-        posts = Post.objects.all().order_by('-created_at')
-        serializer = PostSerializer(posts, many=True, context={'request': request})
+        # ?fields= / ?expand= decide which prefetches and lookups are needed
+        selected = PostSerializer.selected_fields({'request': request})
+        posts = PostSerializer.setup_queryset(Post.objects.order_by('-created_at'), selected)
+
+        # One query for the user's likes instead of one per post
+        username = request.query_params.get('username')
+        liked_post_ids = set()
+        if username and 'liked_by_user' in selected:
+            liked_post_ids = set(Like.objects.filter(username=username).values_list('post_id', flat=True))
+        context = {'request': request, 'liked_post_ids': liked_post_ids}
+
+        if wants_stream(request, posts):
+            serializer = PostSerializer(context=context)
+            return stream_json(
+                streamed(posts, STREAM_CHUNK_SIZE),
+                serialize=serializer.to_representation,
+            )
+        serializer = PostSerializer(posts, many=True, context=context)
         return Response(serializer.data)
     
     elif request.method == 'POST':
         serializer = PostSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             post = serializer.save()
+            make_thumbnail.enqueue(post.media_file.name)
             # Re-serialize the saved instance with context
             output_serializer = PostSerializer(post, context={'request': request})
+            publish_new_post(post, output_serializer.data)
             return Response(output_serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['POST'])
+@idempotent
 def post_like(request, post_id):
     try:
         post = Post.objects.get(post_id=post_id)
@@ -39,8 +68,6 @@ def post_like(request, post_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from .models import Like
-        
         # Check if user already liked this post
         like_exists = Like.objects.filter(post=post, username=username).exists()
         
@@ -48,7 +75,11 @@ def post_like(request, post_id):
             # Unlike: Remove the like
             Like.objects.filter(post=post, username=username).delete()
             post.likes = max(0, post.likes - 1)  # Prevent negative likes
-            post.save()
+            post.save(update_fields=['likes'])
+            publish_post_event(post.post_id, {
+                'type': 'post.like', 'post_id': post.post_id,
+                'likes': post.likes, 'username': username, 'liked': False,
+            })
             return Response({
                 'likes': post.likes,
                 'liked': False,
@@ -58,7 +89,11 @@ def post_like(request, post_id):
             # Like: Add the like
             Like.objects.create(post=post, username=username)
             post.likes += 1
-            post.save()
+            post.save(update_fields=['likes'])
+            publish_post_event(post.post_id, {
+                'type': 'post.like', 'post_id': post.post_id,
+                'likes': post.likes, 'username': username, 'liked': True,
+            })
             return Response({
                 'likes': post.likes,
                 'liked': True,
@@ -83,6 +118,10 @@ def comment_list_create(request):
             try:
                 post = Post.objects.get(post_id=post_id)
                 serializer.save(post=post)
+                publish_post_event(post.post_id, {
+                    'type': 'post.comment', 'post_id': post.post_id,
+                    'comment': serializer.data,
+                })
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             except Post.DoesNotExist:
                 return Response(
@@ -96,11 +135,14 @@ def comment_list_create(request):
 @api_view(['GET', 'POST'])
 @parser_classes([MultiPartParser, FormParser])
 def story_list_create(request):
-    from django.utils import timezone
-
     if request.method == 'GET':
         # Include both current user's story and others' active stories
-        stories = Story.objects.filter(expires_at__gt=timezone.now()).order_by('-created_at')
+        now = timezone.now()
+        stories = Story.objects.filter(expires_at__gt=now).order_by('-created_at')
+        # ?username= puts authors with stories the user hasn't watched first
+        username = request.query_params.get('username')
+        if username:
+            stories = tray_order(list(stories), seen_story_pks(username, now))
         serializer = StorySerializer(stories, many=True, context={'request': request})
         return Response(serializer.data)
     
@@ -108,6 +150,7 @@ def story_list_create(request):
         serializer = StorySerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             story = serializer.save()
+            make_thumbnail.enqueue(story.media_file.name)
             output_serializer = StorySerializer(story, context={'request': request})
             return Response(output_serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -126,6 +169,7 @@ from rest_framework import status
 from .models import Recipe
 from .serializers import RecipeSerializer
 from authentication.models import GoogleUser
+from .nutrition import filters as nutrition_filters
 import os
 
 # Optional: restrict image types and size
@@ -194,10 +238,17 @@ def search_recipes(request):
     """
     Search recipes by query string (in title or ingredients).
     Returns list of recipes with author info and image URL.
+    Nutrition filters: ?max_kcal=, min_kcal, min_protein, max_carbs,
+    max_fat, min_fiber (whole-recipe totals).
     """
     query = request.GET.get('q', '').strip()
+    try:
+        nutrition_lookups = nutrition_filters(request.GET)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-    recipes = Recipe.objects.select_related('author').all()
+    selected = RecipeSerializer.selected_fields({'request': request})
+    recipes = RecipeSerializer.setup_queryset(Recipe.objects.all(), selected)
 
     if query:
         recipes = recipes.filter(
@@ -205,10 +256,18 @@ def search_recipes(request):
         ) | recipes.filter(
             ingredients__icontains=query
         )
+    if nutrition_lookups:
+        recipes = recipes.filter(**nutrition_lookups)
 
     # Optional: order by newest first
     recipes = recipes.order_by('-created_at')
 
+    if wants_stream(request, recipes):
+        serializer = RecipeSerializer(context={'request': request})
+        return stream_json(
+            streamed(recipes, STREAM_CHUNK_SIZE),
+            serialize=serializer.to_representation,
+        )
     serializer = RecipeSerializer(recipes, many=True, context={'request': request})
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -223,6 +282,7 @@ from .models import Follow
 from django.db import IntegrityError
 
 @api_view(['POST'])
+@idempotent
 def toggle_follow(request):
     """
     Toggle follow/unfollow a user
@@ -298,7 +358,6 @@ def get_user_stats(request, username):
         is_following = Follow.is_following(current_user, username)
 
     # Optional: Get post count (if you want to include it)
-    from .models import Post
     posts_count = Post.objects.filter(username=username).count()
 
     return Response({
@@ -317,6 +376,14 @@ def get_followers_list(request, username):
     Get list of followers for a user
     GET /api/followers/<username>/
     """
+    followers = Follow.objects.filter(following=username).values_list('follower', flat=True)
+    if wants_stream(request, followers):
+        return stream_json(
+            streamed(followers, STREAM_CHUNK_SIZE),
+            envelope={'username': username},
+            key='followers',
+        )
+
     followers = Follow.get_followers_list(username)
     
     return Response({
@@ -375,6 +442,7 @@ from .models import SavedPost, Post
 from django.db import IntegrityError
 
 @api_view(['POST'])
+@idempotent
 def toggle_save_post(request):
     """
     Toggle save/unsave a post
@@ -429,6 +497,15 @@ def toggle_save_post(request):
         )
 
 
+def author_avatars(usernames):
+    """{username: GoogleUser.photo_url} in one query, for users that have one"""
+    return dict(
+        GoogleUser.objects.filter(name__in=set(usernames))
+        .exclude(photo_url__isnull=True).exclude(photo_url='')
+        .values_list('name', 'photo_url')
+    )
+
+
 @api_view(['GET'])
 def get_saved_posts(request, username):
     """
@@ -436,8 +513,9 @@ def get_saved_posts(request, username):
     GET /api/saved-posts/<username>/
     """
     try:
-        saved_posts = SavedPost.get_saved_posts(username)
-        
+        saved_posts = list(SavedPost.get_saved_posts(username))
+        avatars = author_avatars(saved.post.username for saved in saved_posts)
+
         posts_data = []
         for saved in saved_posts:
             post = saved.post
@@ -447,15 +525,8 @@ def get_saved_posts(request, username):
             if post.media_file:
                 media_url = request.build_absolute_uri(post.media_file.url)
             
-            # Get avatar URL from authentication.GoogleUser if exists
-            avatar_url = None
-            try:
-                from authentication.models import GoogleUser
-                google_user = GoogleUser.objects.filter(name=post.username).first()
-                if google_user and google_user.photo_url:
-                    avatar_url = google_user.photo_url
-            except:
-                pass
+            # Avatar URL from authentication.GoogleUser if exists
+            avatar_url = avatars.get(post.username)
             
             # Get comments
             comments = []
@@ -529,7 +600,8 @@ def get_posts(request):
     """
     username = request.query_params.get('username')
     
-    posts = Post.objects.all().order_by('-created_at')
+    posts = list(Post.objects.all().order_by('-created_at'))
+    avatars = author_avatars(post.username for post in posts)
     posts_data = []
     
     for post in posts:
@@ -539,14 +611,7 @@ def get_posts(request):
             media_url = request.build_absolute_uri(post.media_file.url)
         
         # Get avatar URL
-        avatar_url = None
-        try:
-            from authentication.models import GoogleUser
-            google_user = GoogleUser.objects.filter(name=post.username).first()
-            if google_user and google_user.photo_url:
-                avatar_url = google_user.photo_url
-        except:
-            pass
+        avatar_url = avatars.get(post.username)
         
         # Get comments
         comments = []
@@ -578,4 +643,627 @@ def get_posts(request):
             'comments': comments,
         })
     
-    return Response(posts_data, status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response(posts_data, status=status.HTTP_200_OK)
+
+
+# home/views.py - Delta sync
+
+from .models import ChangeLog
+
+SYNC_PAGE_SIZE = 1000
+SYNC_PAGE_MAX = 5000
+
+# Post fields sent by /api/sync/; comments and likes sync as their own entities
+SYNC_POST_FIELDS = ['post_id', 'username', 'email', 'caption', 'media_url', 'avatar_url', 'likes', 'created_at']
+
+
+@api_view(['GET'])
+def sync_changes(request):
+    """
+    Incremental sync: everything that changed after the client's token.
+    GET /api/sync/?since=<token>&username=<username>&limit=<n>
+
+    Returns the current state of changed posts and comments, changed likes,
+    saves and follows, and tombstones for deleted entities. Keep the returned
+    ``token`` and call again while ``has_more`` is true. ``reset: true``
+    means the token is missing or older than the last compaction: refetch
+    the feed in full and continue from the returned token.
+    """
+    username = request.query_params.get('username')
+    try:
+        since = int(request.query_params.get('since', ''))
+        limit = min(int(request.query_params.get('limit', SYNC_PAGE_SIZE)), SYNC_PAGE_MAX)
+    except ValueError:
+        since, limit = None, SYNC_PAGE_SIZE
+
+    horizon = ChangeLog.horizon()
+    latest = max(ChangeLog.objects.order_by('-id').values_list('id', flat=True).first() or 0, horizon)
+    if since is None or since < horizon or since > latest:
+        return Response({'reset': True, 'token': str(latest), 'has_more': False})
+
+    entries = list(ChangeLog.objects.filter(id__gt=since).order_by('id')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    token = entries[-1].id if entries else since
+
+    # Only the last change per entity matters
+    final = {}
+    for entry in entries:
+        final[(entry.entity, entry.entity_key)] = entry
+
+    upserts, deleted = {}, {}
+    for (entity, _), entry in final.items():
+        if username and entity in ('like', 'savedpost') and entry.ref.get('username') != username:
+            continue
+        if username and entity == 'follow' and username not in (entry.ref.get('follower'), entry.ref.get('following')):
+            continue
+        bucket = upserts if entry.action == ChangeLog.UPSERT else deleted
+        bucket.setdefault(entity, []).append(entry.ref)
+
+    changes = {
+        'posts': [],
+        'comments': [],
+        'likes': upserts.get('like', []),
+        'saved_posts': upserts.get('savedpost', []),
+        'follows': upserts.get('follow', []),
+    }
+
+    post_ids = [ref['post_id'] for ref in upserts.get('post', [])]
+    if post_ids:
+        posts = Post.objects.filter(post_id__in=post_ids)
+        context = {'request': request, 'fields': SYNC_POST_FIELDS}
+        changes['posts'] = PostSerializer(posts, many=True, context=context).data
+        # Changed but gone without a tombstone (e.g. bulk delete)
+        missing = set(post_ids) - {post['post_id'] for post in changes['posts']}
+        deleted.setdefault('post', []).extend({'post_id': post_id} for post_id in missing)
+
+    comment_ids = [ref['id'] for ref in upserts.get('comment', [])]
+    if comment_ids:
+        comments = Comment.objects.filter(pk__in=comment_ids).select_related('post')
+        changes['comments'] = CommentSerializer(comments, many=True).data
+
+    return Response({
+        'reset': False,
+        'token': str(token),
+        'has_more': has_more,
+        'changes': changes,
+        'deleted': {
+            'posts': deleted.get('post', []),
+            'comments': deleted.get('comment', []),
+            'likes': deleted.get('like', []),
+            'saved_posts': deleted.get('savedpost', []),
+            'follows': deleted.get('follow', []),
+        },
+    }, status=status.HTTP_200_OK)
+
+
+
+# home/views.py - Trending
+
+from .models import TrendingScore
+from .trending import heat
+
+TRENDING_DEFAULT = 20
+TRENDING_MAX = 100
+
+
+@api_view(['GET'])
+def trending_posts(request):
+    """
+    Top posts by time-decayed engagement.
+    GET /api/trending/?limit=20&username=<username>
+
+    Reads the top K from the trending index; supports ?fields=/?expand=.
+    """
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', TRENDING_DEFAULT)), TRENDING_MAX))
+    except ValueError:
+        limit = TRENDING_DEFAULT
+
+    top = list(TrendingScore.objects.order_by('-score').values_list('post_id', 'score')[:limit])
+    scores = dict(top)
+
+    selected = PostSerializer.selected_fields({'request': request})
+    posts = PostSerializer.setup_queryset(Post.objects.filter(pk__in=scores), selected)
+    posts = sorted(posts, key=lambda post: scores[post.pk], reverse=True)
+
+    username = request.query_params.get('username')
+    liked_post_ids = set()
+    if username and 'liked_by_user' in selected:
+        liked_post_ids = set(
+            Like.objects.filter(username=username, post__in=scores).values_list('post_id', flat=True)
+        )
+
+    serializer = PostSerializer(
+        posts, many=True, context={'request': request, 'liked_post_ids': liked_post_ids}
+    )
+    data = serializer.data
+    for item, post in zip(data, posts):
+        item['heat'] = round(heat(scores[post.pk]), 4)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+
+# home/views.py - Engagement analytics (served from the rollups, see home/rollups.py)
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
+from .models import PostEngagement, AuthorEngagement
+from .rollups import series, truncate, step, last_rolled_up
+
+# period -> (default span, longest span one request may cover)
+ANALYTICS_SPANS = {
+    'hour': (timedelta(hours=48), timedelta(days=31)),
+    'day': (timedelta(days=30), timedelta(days=366)),
+}
+
+
+def _parse_when(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(value)
+        parsed = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+def _analytics_response(request, queryset, **identity):
+    period = request.query_params.get('period', 'hour')
+    if period not in ANALYTICS_SPANS:
+        return Response({'error': 'period must be hour or day'}, status=status.HTTP_400_BAD_REQUEST)
+    default_span, max_span = ANALYTICS_SPANS[period]
+
+    try:
+        end = request.query_params.get('end')
+        end = _parse_when(end) if end else timezone.now()
+        start = request.query_params.get('start')
+        start = _parse_when(start) if start else end - default_span
+    except ValueError:
+        return Response({'error': 'start and end must be ISO dates or datetimes'}, status=status.HTTP_400_BAD_REQUEST)
+    if start >= end:
+        return Response({'error': 'start must be before end'}, status=status.HTTP_400_BAD_REQUEST)
+    if end - start > max_span:
+        return Response(
+            {'error': f'At most {max_span.days} days per request for period={period}'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    # Include the bucket that contains ``end``
+    start, end = truncate(start, period), truncate(end, period) + step(period)
+    points, totals = series(queryset, period, start, end)
+    return Response({
+        **identity,
+        'period': period,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'buckets': points,
+        'totals': totals,
+        'as_of': last_rolled_up(),
+    })
+
+
+@api_view(['GET'])
+def post_analytics(request, post_id):
+    """
+    Likes, comments and saves a post received over time.
+    GET /api/posts/<post_id>/analytics/?period=hour|day&start=<iso>&end=<iso>
+
+    Buckets are UTC hours/days and include empty ones. ``as_of`` is when the
+    rollup job last caught up; engagement after it is not counted yet.
+    """
+    post = Post.objects.filter(post_id=post_id).values_list('pk', flat=True).first()
+    if post is None:
+        return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
+    return _analytics_response(request, PostEngagement.objects.filter(post_id=post), post_id=post_id)
+
+
+@api_view(['GET'])
+def author_analytics(request, username):
+    """
+    Engagement across all of a user's posts over time.
+    GET /api/analytics/<username>/?period=hour|day&start=<iso>&end=<iso>
+    """
+    return _analytics_response(request, AuthorEngagement.objects.filter(username=username), username=username)
+
+
+
+# home/views.py - Hashtag and mention feeds
+
+from .models import PostTag, PostMention
+from .pagination import keyset_page, page_size
+from .tags import normalize_tag
+
+
+def _indexed_post_feed(request, index):
+    """
+    Serialize one cursor page of posts from a PostTag/PostMention queryset,
+    newest first: {"results": [...], "next_cursor": "..." | null}
+    """
+    try:
+        entries, next_cursor = keyset_page(
+            index.values('post_id', 'created_at'),
+            request.query_params.get('cursor'),
+            page_size(request),
+            pk_field='post_id',
+        )
+    except ValueError:
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+    post_pks = [entry['post_id'] for entry in entries]
+    selected = PostSerializer.selected_fields({'request': request})
+    posts = PostSerializer.setup_queryset(Post.objects.filter(pk__in=post_pks), selected)
+    by_pk = {post.pk: post for post in posts}
+    posts = [by_pk[pk] for pk in post_pks if pk in by_pk]
+
+    username = request.query_params.get('username')
+    liked_post_ids = set()
+    if username and 'liked_by_user' in selected:
+        liked_post_ids = set(
+            Like.objects.filter(username=username, post__in=post_pks).values_list('post_id', flat=True)
+        )
+    serializer = PostSerializer(
+        posts, many=True, context={'request': request, 'liked_post_ids': liked_post_ids}
+    )
+    return Response({'results': serializer.data, 'next_cursor': next_cursor})
+
+
+@api_view(['GET'])
+def tag_feed(request, tag):
+    """
+    Posts tagged #<tag>, newest first.
+    GET /api/tags/<tag>/posts/?cursor=<next_cursor>&limit=20&username=<username>
+    """
+    return _indexed_post_feed(request, PostTag.objects.filter(tag=normalize_tag(tag.lstrip('#'))))
+
+
+@api_view(['GET'])
+def mention_feed(request, username):
+    """
+    Posts that mention @<username>, newest first.
+    GET /api/mentions/<username>/?cursor=<next_cursor>&limit=20
+    """
+    return _indexed_post_feed(request, PostMention.objects.filter(username=username.lstrip('@')))
+
+
+
+# home/views.py - User search
+
+from .usersearch import search_users as run_user_search
+
+USER_SEARCH_PAGE_SIZE = 20
+
+
+@api_view(['GET'])
+def search_users(request):
+    """
+    Find users by username, name or email (prefixes of words match).
+    GET /api/users/search/?q=<query>&page=1&limit=20
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        page = max(1, int(request.query_params.get('page', 1)))
+        limit = max(1, min(int(request.query_params.get('limit', USER_SEARCH_PAGE_SIZE)), 50))
+    except ValueError:
+        page, limit = 1, USER_SEARCH_PAGE_SIZE
+
+    users, has_more = run_user_search(query, offset=(page - 1) * limit, limit=limit)
+    return Response({
+        'results': [
+            {
+                'username': user.username,
+                'name': user.name,
+                'photo_url': user.photo_url,
+                'followers_count': user.followers,
+            }
+            for user in users
+        ],
+        'page': page,
+        'has_more': has_more,
+    }, status=status.HTTP_200_OK)
+
+
+
+# home/views.py - Batch requests
+
+from django.db import transaction
+from nutria.db_router import PRIMARY_DB, pick_read_database, read_from, read_snapshot, recently_wrote
+from .batch import MAX_SUBREQUESTS, SubrequestError, dispatch
+
+
+@api_view(['POST'])
+def batch(request):
+    """
+    Run several API calls in one round trip.
+    POST /api/batch/
+    {"requests": [{"id": "stats", "method": "GET", "path": "/api/user-stats/bob/",
+                   "params": {"current_user": "alice"}}, ...]}
+
+    Sub-requests run in order, in process, inside one transaction, so every
+    read sees the same snapshot of the database. A batch of only GETs reads
+    from one replica (or the primary) in a read-only snapshot that doesn't
+    take SQLite's write lock; any POST moves the whole batch to the primary
+    and its writes are visible to later sub-requests. Each
+    sub-request gets its own savepoint: one that raises or answers 5xx has
+    its writes rolled back (a raise is reported as a 500) while the rest of
+    the batch carries on. Returns
+    {"responses": [{"id", "status", "body"}, ...]} in request order.
+    """
+    specs = request.data.get('requests') if isinstance(request.data, dict) else None
+    if not isinstance(specs, list) or not specs:
+        return Response({'error': 'requests must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(specs) > MAX_SUBREQUESTS:
+        return Response(
+            {'error': f'At most {MAX_SUBREQUESTS} requests per batch'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    writes = any(isinstance(spec, dict) and str(spec.get('method', 'GET')).upper() != 'GET' for spec in specs)
+    # POST pins the batch itself to the primary; a read-only batch may
+    # still use a replica unless the client wrote recently
+    alias = PRIMARY_DB if writes or recently_wrote(request) else pick_read_database(ignore_pin=True)
+
+    responses = []
+    snapshot = transaction.atomic(using=alias) if writes else read_snapshot(alias)
+    with read_from(alias), snapshot:
+        for index, spec in enumerate(specs):
+            entry_id = spec.get('id', index) if isinstance(spec, dict) else index
+            try:
+                # A savepoint per sub-request: a failure rolls back only its own writes
+                with transaction.atomic(using=alias):
+                    sub_status, body = dispatch(request._request, spec)
+                    if sub_status >= 500:
+                        transaction.set_rollback(True, using=alias)
+            except SubrequestError as exc:
+                sub_status, body = exc.status, {'error': str(exc)}
+            except Exception:
+                logger.exception("Batch sub-request %r failed", entry_id)
+                sub_status, body = 500, {'error': 'Internal server error'}
+            responses.append({'id': entry_id, 'status': sub_status, 'body': body})
+    return Response({'responses': responses}, status=status.HTTP_200_OK)
+
+
+
+# home/views.py - Profile grid
+
+import os
+from django.core.files.storage import default_storage
+from django.db.models import Count
+from .tasks import thumbnail_name, THUMBNAIL_EXTENSIONS
+
+
+@api_view(['GET'])
+def profile_posts(request, username):
+    """
+    A user's posts for the profile grid, newest first.
+    GET /api/users/<username>/posts/?cursor=<next_cursor>&limit=20
+
+    Each item is only {post_id, thumbnail_url, likes, comments}; open the
+    post for the rest. thumbnail_url is null for videos, and is the full
+    image until the worker has written its thumbnail and set
+    Post.has_thumbnail (backfill_thumbnails does both for older posts).
+    """
+    try:
+        posts, next_cursor = keyset_page(
+            Post.objects.filter(username=username)
+            .only('pk', 'post_id', 'media_file', 'has_thumbnail', 'likes', 'created_at'),
+            request.query_params.get('cursor'),
+            page_size(request),
+        )
+    except ValueError:
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+
+    comment_counts = dict(
+        Comment.objects.filter(post__in=[post.pk for post in posts])
+        .values_list('post').annotate(n=Count('id')).order_by()
+    )
+    results = []
+    for post in posts:
+        thumbnail_url = None
+        if os.path.splitext(post.media_file.name)[1].lower() in THUMBNAIL_EXTENSIONS:
+            thumbnail = thumbnail_name(post.media_file.name) if post.has_thumbnail else post.media_file.name
+            thumbnail_url = request.build_absolute_uri(default_storage.url(thumbnail))
+        results.append({
+            'post_id': post.post_id,
+            'thumbnail_url': thumbnail_url,
+            'likes': post.likes,
+            'comments': comment_counts.get(post.pk, 0),
+        })
+    return Response({'results': results, 'next_cursor': next_cursor}, status=status.HTTP_200_OK)
+
+
+
+# home/views.py - Idempotent like/follow/save state (see home/mutations.py)
+
+from .mutations import set_like, set_follow, set_saved
+
+
+@api_view(['PUT', 'DELETE'])
+@idempotent
+def like_state(request, post_id, username):
+    """
+    Set (PUT) or clear (DELETE) a user's like on a post.
+    PUT|DELETE /api/posts/<post_id>/likes/<username>/
+
+    Unlike POST /like/, repeating the call leaves the state as is;
+    "changed" says whether this call did anything.
+    """
+    liked = request.method == 'PUT'
+    try:
+        likes, changed = set_like(post_id, username, liked)
+    except Post.DoesNotExist:
+        return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
+    if changed:
+        publish_post_event(post_id, {
+            'type': 'post.like', 'post_id': post_id,
+            'likes': likes, 'username': username, 'liked': liked,
+        })
+    return Response({
+        'post_id': post_id,
+        'username': username,
+        'liked': liked,
+        'likes': likes,
+        'changed': changed,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['PUT', 'DELETE'])
+@idempotent
+def follow_state(request, follower, following):
+    """
+    Follow (PUT) or unfollow (DELETE) a user.
+    PUT|DELETE /api/follows/<follower>/<following>/
+    """
+    if follower == following:
+        return Response({'error': 'Cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
+    is_following = request.method == 'PUT'
+    followers_count, changed = set_follow(follower, following, is_following)
+    return Response({
+        'follower': follower,
+        'following': following,
+        'is_following': is_following,
+        'followers_count': followers_count,
+        'changed': changed,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['PUT', 'DELETE'])
+@idempotent
+def save_state(request, post_id, username):
+    """
+    Save (PUT) or unsave (DELETE) a post.
+    PUT|DELETE /api/posts/<post_id>/saves/<username>/
+
+    Saving a missing post is a 404; unsaving one is a no-op.
+    """
+    is_saved = request.method == 'PUT'
+    try:
+        changed = set_saved(post_id, username, is_saved)
+    except Post.DoesNotExist:
+        return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'post_id': post_id,
+        'username': username,
+        'is_saved': is_saved,
+        'changed': changed,
+    }, status=status.HTTP_200_OK)
+
+
+
+# home/views.py - Story seen-state (see home/storyseen.py)
+
+@api_view(['POST'])
+def mark_stories_seen(request):
+    """
+    Record stories as watched.
+    POST /api/stories/seen/
+    Body: {
+        "username": "current_username",
+        "story_ids": ["STORY-abc123", ...]
+    }
+    """
+    username = request.data.get('username')
+    story_ids = request.data.get('story_ids')
+    if isinstance(story_ids, str):
+        story_ids = [story_ids]
+    if not username or not story_ids or not isinstance(story_ids, list):
+        return Response(
+            {'error': 'username and a list of story_ids are required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    marked = mark_seen(username, [str(story_id) for story_id in story_ids])
+    return Response({'username': username, 'marked': marked}, status=status.HTTP_200_OK)
+
+
+
+# home/views.py - Activity feed (see home/activity.py)
+
+from .models import ActivityGroup
+from .activity import describe, unread_count, mark_read
+
+
+@api_view(['GET'])
+def activity_feed(request, username):
+    """
+    A user's grouped likes, comments, saves and new followers, latest first.
+    GET /api/activity/<username>/?cursor=<next_cursor>&limit=20
+    """
+    try:
+        groups, next_cursor = keyset_page(
+            ActivityGroup.objects.filter(recipient=username),
+            request.query_params.get('cursor'),
+            page_size(request),
+            time_field='updated_at',
+        )
+    except ValueError:
+        return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+    results = [{
+        'verb': group.verb,
+        'target': group.target or None,
+        'text': describe(group),
+        'actors': group.actors,
+        'actor_count': group.actor_count,
+        'preview': group.preview,
+        'unread': group.unread,
+        'updated_at': group.updated_at,
+    } for group in groups]
+    return Response({
+        'results': results,
+        'next_cursor': next_cursor,
+        'unread_count': unread_count(username),
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def activity_unread(request, username):
+    """
+    Unread activity badge count.
+    GET /api/activity/<username>/unread/
+    """
+    return Response({'username': username, 'unread_count': unread_count(username)}, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+def activity_mark_read(request, username):
+    """
+    Mark all of a user's activity as read.
+    POST /api/activity/<username>/read/
+    """
+    mark_read(username)
+    return Response({'username': username, 'unread_count': 0}, status=status.HTTP_200_OK)
+
+
+
+# home/views.py - Similar recipes (precomputed, see home/similarity.py)
+
+from .models import RecipeSimilar
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def similar_recipes(request, recipe_id):
+    """
+    Recipes most like this one, best first.
+    GET /api/recipes/<recipe_id>/similar/?limit=10
+
+    Served from the lists kept by the similarity index; a recipe added
+    moments ago may have none until the background update has run.
+    """
+    rows = RecipeSimilar.objects.filter(recipe_id=recipe_id).select_related('similar').order_by('rank')
+    if RecipeSerializer.selected_fields({'request': request}) & {'author', 'author_name', 'author_email'}:
+        rows = rows.select_related('similar__author')
+    rows = list(rows[:page_size(request)])
+    if not rows and not Recipe.objects.filter(pk=recipe_id).exists():
+        return Response({'error': 'Recipe not found'}, status=status.HTTP_404_NOT_FOUND)
+    serializer = RecipeSerializer(context={'request': request})
+    results = []
+    for row in rows:
+        item = serializer.to_representation(row.similar)
+        item['score'] = round(row.score, 4)
+        results.append(item)
+    return Response({'recipe_id': recipe_id, 'results': results}, status=status.HTTP_200_OK)
@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nutria.settings')
 
 application = get_asgi_application()
+
+# Compile URLs and serializers before the first request (before the fork
+# when gunicorn preloads the app); see nutria/warmup.py
+from nutria.warmup import enabled, warm_up  # noqa: E402
+
+if enabled():
+    warm_up(databases=False)
@@ -0,0 +1,183 @@
+"""
+Primary/replica database routing for nutria.
+
+Reads for the ``home`` and ``authentication`` apps are spread over the
+aliases listed in ``settings.DATABASE_REPLICAS``; every write goes to the
+``default`` (primary) database.
+
+Replicas lag behind the primary, so a client that has just written must not
+read from them straight away. ``PrimaryStickinessMiddleware`` pins a request
+to the primary as soon as it writes (or if it is an unsafe method), and sets
+a short-lived cookie so the same client keeps reading from the primary for
+``settings.DATABASE_STICKY_SECONDS`` afterwards.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections, transaction
+
+PRIMARY_DB = 'default'
+ROUTED_APPS = {'home', 'authentication'}
+STICKY_COOKIE = 'nutria_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Per-request state. ContextVars work for both WSGI threads and ASGI tasks;
+# the middleware resets them so nothing leaks between requests.
+_pinned = ContextVar('nutria_db_pinned', default=False)
+_wrote = ContextVar('nutria_db_wrote', default=False)
+_read_alias = ContextVar('nutria_db_read_alias', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_to_primary():
+    """Send all further reads in the current request to the primary."""
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def pick_read_database(ignore_pin=False):
+    """The alias a read would go to right now (a random replica unless pinned)."""
+    replicas = get_replicas()
+    if not replicas or (_pinned.get() and not ignore_pin):
+        return PRIMARY_DB
+    return random.choice(replicas)
+
+
+def recently_wrote(request):
+    """Whether the client's sticky cookie says it wrote within the window."""
+    try:
+        return float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def read_from(alias):
+    """Send every routed read in the block to ``alias`` (e.g. to read one snapshot)."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def read_snapshot(alias):
+    """
+    transaction.atomic(using=alias) for a block that only reads. SQLite in
+    concurrent mode begins every transaction IMMEDIATE, which takes the
+    write lock; this one is begun DEFERRED, so it holds a read snapshot
+    without blocking writers.
+    """
+    connection = connections[alias]
+    connection.ensure_connection()
+    mode = getattr(connection, 'transaction_mode', None)
+    if mode:
+        connection.transaction_mode = None
+    try:
+        with transaction.atomic(using=alias):
+            yield
+    finally:
+        if mode:
+            connection.transaction_mode = mode
+
+
+class PrimaryReplicaRouter:
+    """Reads from a random replica unless pinned; writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        return _read_alias.get() or pick_read_database()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in ROUTED_APPS:
+            return None
+        _wrote.set(True)
+        _pinned.set(True)
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary, so objects loaded from
+        # any of them may be related to each other.
+        pool = {PRIMARY_DB, *get_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema through replication, never migrate.
+        if db in get_replicas():
+            return False
+        return None
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Pins requests to the primary for a window after the client's last write.
+
+    Works in both WSGI and ASGI stacks, so async views are not forced onto
+    the single thread-sensitive executor. The pin is a ContextVar: sync views
+    run by sync_to_async (and the async ORM) get a copy of it, and a write
+    they make is copied back before the response is handled here.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        tokens = self._pin(request)
+        try:
+            response = self.get_response(request)
+            self._stick(response)
+        finally:
+            self._reset(tokens)
+        return response
+
+    async def __acall__(self, request):
+        tokens = self._pin(request)
+        try:
+            response = await self.get_response(request)
+            self._stick(response)
+        finally:
+            self._reset(tokens)
+        return response
+
+    def _pin(self, request):
+        pinned_token = _pinned.set(
+            request.method not in SAFE_METHODS or recently_wrote(request)
+        )
+        return pinned_token, _wrote.set(False)
+
+    def _stick(self, response):
+        if _wrote.get() and get_replicas():
+            window = getattr(settings, 'DATABASE_STICKY_SECONDS', 5)
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(time.time() + window),
+                max_age=window,
+                httponly=True,
+                samesite='Lax',
+            )
+
+    def _reset(self, tokens):
+        pinned_token, wrote_token = tokens
+        _pinned.reset(pinned_token)
+        _wrote.reset(wrote_token)
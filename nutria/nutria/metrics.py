@@ -0,0 +1,230 @@
+"""
+Per-request instrumentation for nutria.
+
+RequestMetricsMiddleware records, for every resolved route, the request
+latency, number of SQL queries, total SQL time, serialization time and
+response size into in-process histograms. ``metrics_view`` exposes them in
+the Prometheus text format at /metrics. Clients that send
+``X-Server-Timing: 1`` get the same numbers back as a ``Server-Timing``
+header (settings.METRICS_SERVER_TIMING = True sends it on every response).
+
+Histograms live in the worker process; with several workers, scrape each
+one or aggregate on the Prometheus side.
+
+SQL is counted by a wrapper installed once on every connection, which
+charges each query to the request in the ``_current`` ContextVar. Under
+ASGI the queries of async and sync views run in executor threads with a
+copy of that context, so they are attributed like they are under WSGI.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by (route, method)."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {labels: (list(s[0]), s[1], s[2]) for labels, s in self._series.items()}
+        for (route, method), (counts, total, count) in sorted(snapshot.items()):
+            base = f'route="{_escape(route)}",method="{method}"'
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{base}}} {total}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram(
+    'nutria_request_duration_seconds', 'Time spent handling the request.', LATENCY_BUCKETS)
+SQL_QUERIES = Histogram(
+    'nutria_sql_queries', 'SQL queries executed per request.', QUERY_COUNT_BUCKETS)
+SQL_SECONDS = Histogram(
+    'nutria_sql_duration_seconds', 'Total SQL time per request.', LATENCY_BUCKETS)
+SERIALIZE_SECONDS = Histogram(
+    'nutria_serialize_duration_seconds', 'Serializer and renderer time per request.', LATENCY_BUCKETS)
+RESPONSE_BYTES = Histogram(
+    'nutria_response_size_bytes', 'Response body size.', SIZE_BUCKETS)
+
+HISTOGRAMS = (REQUEST_SECONDS, SQL_QUERIES, SQL_SECONDS, SERIALIZE_SECONDS, RESPONSE_BYTES)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'sql_seconds', 'serialize_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as a connection execute_wrapper
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_seconds += time.perf_counter() - started
+            self.queries += 1
+
+
+_current = ContextVar('nutria_request_stats', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    """Add the per-request query recorder to a connection (once)"""
+    if _record_query not in connection.execute_wrappers:
+        # First in the list: execute_wrapper() blocks pop from the end
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+@contextmanager
+def serialization_timer():
+    """Attribute the enclosed block to the current request's serialize time."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialize_seconds += time.perf_counter() - started
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, stats, started)
+
+    def _finish(self, request, response, stats, started):
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        labels = (match.route if match else 'unmatched', request.method)
+
+        if getattr(settings, 'METRICS_SERVER_TIMING', False) or request.headers.get('X-Server-Timing'):
+            # For streamed responses this covers the view only, not the body
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.queries} queries"',
+                f'serialize;dur={stats.serialize_seconds * 1000:.2f}',
+                f'total;dur={elapsed * 1000:.2f}',
+            ])
+
+        if not response.streaming:
+            self._observe(labels, stats, elapsed, len(response.content))
+        elif not response.is_async:
+            response.streaming_content = self._measure_stream(
+                response.streaming_content, labels, stats, started
+            )
+        else:
+            # Async streams are event streams (SSE) that stay open
+            self._observe(labels, stats, elapsed, None)
+        return response
+
+    def _measure_stream(self, content, labels, stats, started):
+        # Streamed bodies run their queries and serialization while being
+        # consumed, after __call__ has returned; account for them here.
+        size = 0
+        _current.set(stats)
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            _current.set(None)
+            self._observe(labels, stats, time.perf_counter() - started, size)
+
+    def _observe(self, labels, stats, elapsed, size):
+        REQUEST_SECONDS.observe(labels, elapsed)
+        SQL_QUERIES.observe(labels, stats.queries)
+        SQL_SECONDS.observe(labels, stats.sql_seconds)
+        SERIALIZE_SECONDS.observe(labels, stats.serialize_seconds)
+        if size is not None:
+            RESPONSE_BYTES.observe(labels, size)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint.
+    GET /metrics
+    """
+    body = '\n\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,118 @@
+"""
+Response renderers for the API.
+
+FastJSONRenderer encodes with orjson when it is installed and falls back to
+DRF's JSONRenderer otherwise. MessagePackRenderer serves
+``Accept: application/msgpack`` for mobile clients when msgpack is
+installed. ``stream_json`` turns a (lazy) iterable of objects into a
+StreamingHttpResponse so large lists never exist in memory all at once.
+
+A streamed body is read after the view (and PrimaryStickinessMiddleware)
+has returned, so ``streamed()`` fixes the queryset's database alias while
+the request's replica/primary choice is still in effect.
+"""
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+from nutria.db_router import pick_read_database
+from nutria.metrics import serialization_timer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depends on the environment
+    msgpack = None
+
+_fallback_encoder = JSONEncoder()
+
+
+def _default(obj):
+    # Types orjson/msgpack don't know natively (Decimal, lazy strings, ...)
+    return _fallback_encoder.default(obj)
+
+
+def dumps(data):
+    """Encode ``data`` as compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default)
+    return renderers.JSONRenderer().render(data)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serialization_timer():
+            if data is None:
+                return b''
+            if orjson is None:
+                return super().render(data, accepted_media_type, renderer_context)
+            return orjson.dumps(data, default=_default)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serialization_timer():
+            if data is None:
+                return b''
+            return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+def wants_stream(request, queryset):
+    """
+    Stream when the client negotiated plain JSON (never inside /api/batch/)
+    and either asked for it with ?stream=1 or the list is longer than
+    settings.STREAM_MIN_ROWS.
+    """
+    if getattr(request, 'batched', False):
+        return False
+    if not isinstance(getattr(request, 'accepted_renderer', None), renderers.JSONRenderer):
+        return False
+    if request.query_params.get('stream') in ('1', 'true'):
+        return True
+    threshold = getattr(settings, 'STREAM_MIN_ROWS', 1000)
+    return queryset.order_by()[threshold:].exists()
+
+
+def streamed(queryset, chunk_size):
+    """``queryset.iterator()`` pinned to the database the request reads from now"""
+    return queryset.using(pick_read_database()).iterator(chunk_size=chunk_size)
+
+
+def stream_json(items, serialize=None, envelope=None, key=None, chunk_size=100, status=200):
+    """
+    Stream a JSON array built from ``items`` (any iterable, typically a
+    QuerySet.iterator()), or an object ``{**envelope, key: [...], "count": n}``
+    when ``envelope`` is given. ``serialize`` turns each item into JSON-ready
+    data (e.g. a serializer's to_representation). Items are encoded in
+    groups of ``chunk_size``.
+    """
+    def generate():
+        if envelope is not None:
+            head = dumps(envelope)
+            yield head[:-1] + (b',' if envelope else b'') + b'"' + key.encode() + b'":['
+        else:
+            yield b'['
+        count = 0
+        chunk = []
+        for item in items:
+            with serialization_timer():
+                chunk.append(dumps(serialize(item) if serialize else item))
+            count += 1
+            if len(chunk) >= chunk_size:
+                yield (b',' if count > len(chunk) else b'') + b','.join(chunk)
+                chunk = []
+        if chunk:
+            yield (b',' if count > len(chunk) else b'') + b','.join(chunk)
+        yield b'],"count":' + str(count).encode() + b'}' if envelope is not None else b']'
+
+    return StreamingHttpResponse(generate(), content_type='application/json', status=status)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import importlib.util
 import os
 from pathlib import Path
 
@@ -45,7 +46,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'nutria.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'nutria.db_router.PrimaryStickinessMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,13 +80,60 @@ WSGI_APPLICATION = 'nutria.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Concurrent-writer mode for SQLite: WAL lets readers run alongside a writer,
+# the busy timeout makes writers queue instead of failing with "database is
+# locked", and BEGIN IMMEDIATE takes the write lock up front so transactions
+# that read before writing cannot deadlock on lock upgrade. Opt in with
+# NUTRIA_SQLITE_CONCURRENT=1: switching to WAL is persistent and rewrites the
+# database header, which would modify the committed db.sqlite3.
+SQLITE_CONCURRENT = os.environ.get('NUTRIA_SQLITE_CONCURRENT', '0') == '1'
+
+SQLITE_CONCURRENT_OPTIONS = {
+    'timeout': 20,
+    'transaction_mode': 'IMMEDIATE',
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-20000;'
+        'PRAGMA temp_store=MEMORY;'
+        'PRAGMA mmap_size=134217728'
+    ),
+}
+
+SQLITE_OPTIONS = SQLITE_CONCURRENT_OPTIONS if SQLITE_CONCURRENT else {}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': 600 if SQLITE_CONCURRENT else 0,
+        'CONN_HEALTH_CHECKS': SQLITE_CONCURRENT,
     }
 }
 
+# Read replicas: a comma-separated list of SQLite files in NUTRIA_DB_REPLICAS
+# becomes aliases replica1, replica2, ... Reads from home/authentication are
+# routed to them and writes to 'default' (see nutria/db_router.py). Locally,
+# `manage.py replicate_db` copies the primary onto the replicas.
+DATABASE_REPLICAS = []
+for _index, _path in enumerate(filter(None, os.environ.get('NUTRIA_DB_REPLICAS', '').split(','))):
+    _alias = f'replica{_index + 1}'
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _path.strip(),
+        'OPTIONS': SQLITE_OPTIONS,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': SQLITE_CONCURRENT,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(_alias)
+
+DATABASE_ROUTERS = ['nutria.db_router.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after it writes.
+DATABASE_STICKY_SECONDS = int(os.environ.get('NUTRIA_DB_STICKY_SECONDS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -130,4 +180,37 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Real-time push (home/realtime.py). The in-memory layer only reaches clients
+# connected to the same ASGI process.
+NUTRIA_CHANNEL_LAYER = 'home.realtime.InMemoryChannelLayer'
+
+# orjson-backed JSON, plus MessagePack (Accept: application/msgpack) when the
+# msgpack package is installed. See nutria/renderers.py.
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'nutria.renderers.FastJSONRenderer',
+        *(['nutria.renderers.MessagePackRenderer'] if importlib.util.find_spec('msgpack') else []),
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Plain-JSON lists longer than this are streamed instead of built in memory
+# (?stream=1 streams any length). See nutria/renderers.py.
+STREAM_MIN_ROWS = 1000
+
+# Send Server-Timing on every response, not only when the client asks for it
+# with an X-Server-Timing header (see nutria/metrics.py).
+METRICS_SERVER_TIMING = False
+
+# Trending posts lose half their heat every this many hours (home/trending.py)
+TRENDING_HALF_LIFE_HOURS = 12
+
+# Activity on the same target within a window of this many hours is grouped
+# into one feed entry (home/activity.py)
+ACTIVITY_WINDOW_HOURS = 24
+
+# Term matrix behind the similar-recipe lists, updated as recipes are added
+# (home/similarity.py). Needs NumPy and SciPy.
+RECIPE_SIMILARITY_INDEX = os.path.join(BASE_DIR, 'recipe_similarity.npz')
@@ -19,11 +19,13 @@ from django.urls import path
 from django.urls import include
 from django.conf.urls.static import static
 from django.conf import settings
+from nutria.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('authentication.urls')),
     path('api/', include('home.urls')),
+    path('metrics', metrics_view, name='metrics'),
    
 ]
 
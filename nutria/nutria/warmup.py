@@ -0,0 +1,147 @@
+"""
+Worker warm-up.
+
+A fresh worker pays on its first requests for importing view modules,
+compiling the URL resolver, DRF serializer field introspection and
+opening database connections. ``warm_up()`` does that work up front:
+
+* ``warm_up(databases=False)`` before forking (gunicorn master with
+  ``preload_app``), so the compiled state is shared by every worker;
+* ``warm_up()`` in each worker after the fork, which also opens the
+  database connections and pulls the hot tables into SQLite's page cache.
+  Connections must not be opened before the fork: children would share
+  the parent's file handles.
+
+Trending, the post feed and user search keep no cache of their own; they
+are primed by running their first-page queries once, which loads the
+indexes they read into the page cache and compiles their query paths. The
+nutrition reference table, the one in-process cache, is loaded before the
+fork.
+
+See gunicorn.conf.py. Set NUTRIA_WARMUP=0 to skip (e.g. to measure cold
+starts with ``manage.py benchmark_coldstart``).
+"""
+import importlib
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver, reverse, NoReverseMatch, Resolver404
+
+logger = logging.getLogger(__name__)
+
+# Imported lazily by URL resolution or by the first request otherwise
+MODULES = (
+    'home.views',
+    'home.async_views',
+    'home.serializers',
+    'authentication.views',
+    'nutria.renderers',
+    'nutria.metrics',
+    'rest_framework.negotiation',
+    'rest_framework.parsers',
+)
+
+# Rows read per primed query, as on a first page
+PAGE = 20
+# A one-letter query walks the busiest part of the user search indexes
+SEARCH_PRIMER = 'a'
+
+
+def enabled():
+    return os.environ.get('NUTRIA_WARMUP', '1') != '0'
+
+
+def import_modules():
+    for name in MODULES:
+        importlib.import_module(name)
+
+
+def compile_urls():
+    """Populate the resolver, then reverse and resolve every named route once"""
+    resolver = get_resolver()
+    for name, entries in list(resolver.reverse_dict.lists()):
+        if not isinstance(name, str):
+            continue
+        for _, _, _, converters in entries:
+            try:
+                path = reverse(name, kwargs={key: '1' for key in converters})
+            except NoReverseMatch:
+                continue
+            try:
+                resolver.resolve(path)
+            except Resolver404:
+                continue
+
+
+def build_serializers():
+    """Run DRF's ModelSerializer field introspection for every serializer"""
+    from rest_framework import serializers
+
+    from authentication import serializers as auth_serializers
+    from home import serializers as home_serializers
+
+    for module in (home_serializers, auth_serializers):
+        for value in vars(module).values():
+            if (
+                isinstance(value, type)
+                and issubclass(value, serializers.ModelSerializer)
+                and getattr(getattr(value, 'Meta', None), 'model', None) is not None
+            ):
+                value().fields
+
+
+def load_reference_data():
+    """Fill the per-process caches that don't touch the database"""
+    from home import nutrition
+
+    nutrition.table()
+
+
+def open_connections():
+    """Connect every database and touch the hot tables"""
+    from home.models import Post, Story, Follow, TrendingScore
+
+    for alias in connections:
+        connection = connections[alias]
+        connection.ensure_connection()
+        # One cheap index read per hot table loads its root pages
+        for model in (Post, Story, Follow, TrendingScore):
+            model.objects.using(alias).order_by().values_list('pk', flat=True)[:1].exists()
+
+
+def prime_queries():
+    """Run the first page of trending, the post feed and user search"""
+    from home import usersearch
+    from home.models import Post, TrendingScore
+
+    for alias in connections:
+        top = list(TrendingScore.objects.using(alias).order_by('-score').values_list('post_id', flat=True)[:PAGE])
+        list(Post.objects.using(alias).filter(pk__in=top))
+        list(Post.objects.using(alias).order_by('-created_at')[:PAGE])
+    # Raw SQL on the default connection, like the search endpoint
+    usersearch.search_users(SEARCH_PRIMER, 0, PAGE)
+
+
+def warm_up(databases=True):
+    """Prime the worker; returns {step: seconds}"""
+    timings = {}
+    steps = [
+        ('imports', import_modules), ('urls', compile_urls), ('serializers', build_serializers),
+        ('reference', load_reference_data),
+    ]
+    if databases:
+        steps += [('databases', open_connections), ('queries', prime_queries)]
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # A failed warm-up must never keep a worker from serving
+            logger.exception("Warm-up step %s failed", name)
+        timings[name] = time.perf_counter() - started
+    if settings.DEBUG:
+        logger.info("Warm-up: %s", ', '.join(f'{k} {v * 1000:.1f} ms' for k, v in timings.items()))
+    return timings